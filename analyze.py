@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 命令行工具
+# 不依赖PyQt5，用于脚本和批处理，例如：
+#   python analyze.py run.csv --start "20250727 15:41:15.100" --end-runtime 600 --json
+#   python analyze.py run.csv --windows windows.csv --output charges.csv
+#   python analyze.py huge.csv --stream --start-runtime 3600 --end-runtime 7200
+#   python analyze.py huge.csv --index --start "20250727 15:41:15" --end "20250727 16:41:15"
+#   python analyze.py run.csv --bin 1min --output per_minute.csv
+#   python analyze.py run.csv --beam 0.05 --release 0.03 --merge-gap 10s --min-duration 1min --output beams.csv
+#   python analyze.py run.csv --export run.parquet
+#   python analyze.py run.parquet --start "20250727 15:41:15" --end-runtime 600
+#   python analyze.py "/data/campaign/run_*.csv" --start "20250727 00:00:00" --end "20250803 00:00:00"
+
+import os
+import sys
+import glob
+import json
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from record_core import (RecordFileError, load_record, index_sessions, parse_time_string, read_window_file,
+                         resolve_window_times, write_window_results, query_window_charges)
+from record_cache import load_record_cached
+from record_stream import read_record_start, scan_record
+from record_index import open_time_index
+from record_aggregate import aggregate_bins, parse_duration, write_bin_results
+from record_archive import ARCHIVE_SUFFIXES, RecordArchive, export_record, is_archive, load_archive
+from record_beam import BEAM_CHANNELS, beam_labels, detect_beam_on
+from record_run import RecordRun
+from batch_analyze import expand_inputs
+
+
+def parse_time_argument(text):
+    """解析命令行时间参数：UTC时间戳或时间格式"""
+    dt = parse_time_string(text)
+    if dt is not None:
+        return dt.timestamp()
+    try:
+        return float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time: {text}") from None
+
+
+def parse_duration_argument(text):
+    """解析命令行时间宽度参数"""
+    try:
+        return parse_duration(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def build_parser():
+    """命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="Calculate charge from current monitoring record files.")
+    parser.add_argument('file', nargs='+',
+                        help="record file (.csv, or .csv.gz/.csv.xz/.csv.bz2), or a .parquet/.feather archive; "
+                             "several files, a directory or a glob pattern form one run ordered by start time")
+    parser.add_argument('--start', type=parse_time_argument,
+                        help="window start: UTC timestamp or time (e.g. '20250727 15:41:15.100')")
+    parser.add_argument('--end', type=parse_time_argument,
+                        help="window end: UTC timestamp or time")
+    parser.add_argument('--start-runtime', type=float, help="window start as runtime (seconds)")
+    parser.add_argument('--end-runtime', type=float, help="window end as runtime (seconds)")
+    parser.add_argument('--session', type=int,
+                        help="analyze only this session (1-based) of an Append-mode file")
+    parser.add_argument('--windows', help="batch window list (CSV or JSON)")
+    parser.add_argument('--bin', type=parse_duration_argument, metavar='WIDTH',
+                        help="per-bin current mean/min/max and charge over the window, with this bin width "
+                             "(seconds, or e.g. 10s, 1min, 1h, 1d)")
+    parser.add_argument('--beam', type=float, metavar='THRESHOLD',
+                        help="list the beam-on periods within the window: the --beam-channel current is at or "
+                             "above THRESHOLD (mA), with the charge of both channels in each period")
+    parser.add_argument('--beam-channel', choices=sorted(BEAM_CHANNELS), default='ch1',
+                        help="channel whose current detects the beam (default: ch1)")
+    parser.add_argument('--release', type=float, metavar='LEVEL',
+                        help="beam-off level (mA) below the threshold: in between, the beam keeps its state "
+                             "(default: the threshold)")
+    parser.add_argument('--merge-gap', type=parse_duration_argument, default=0.0, metavar='DURATION',
+                        help="merge beam-on periods separated by at most this long (e.g. 5s)")
+    parser.add_argument('--min-duration', type=parse_duration_argument, default=0.0, metavar='DURATION',
+                        help="drop beam-on periods shorter than this (after merging, e.g. 1min)")
+    parser.add_argument('--output', help="batch, per-bin or beam-on results file (CSV or JSON, default: stdout)")
+    parser.add_argument('--json', action='store_true', help="print the result as JSON")
+    parser.add_argument('--no-cache', action='store_true', help="do not read or write the column cache")
+    parser.add_argument('--stream', action='store_true',
+                        help="stream the file with bounded memory instead of loading it (for files larger than RAM)")
+    parser.add_argument('--index', action='store_true',
+                        help="use (and build on first use) the sparse time index to read only the rows "
+                             "around the window boundaries")
+    parser.add_argument('--export', metavar='ARCHIVE',
+                        help="convert the record (or the --session) into a Parquet (.parquet) or "
+                             "Feather (.feather/.arrow) archive and exit")
+    return parser
+
+
+def summarize(file_path, data, sessions=None):
+    """文件信息摘要；data 为流式扫描的稀疏数据时由 sessions 给出实际的会话和行数
+
+    完整加载时包含完整性扫描摘要（稀疏数据无法检测，不包含）。
+    """
+    sessions = data.sessions if sessions is None else sessions
+    summary = {
+        'file': file_path,
+        'channels': 2 if data.is_dual_channel else 1,
+        'rows': sum(session.rows for session in sessions),
+        'start_utc': float(data['utc_timestamp'][0]),
+        'end_utc': float(data['utc_timestamp'][-1]),
+        'total_runtime': data.total_runtime(),
+        'sessions': [session.to_dict() for session in sessions],
+    }
+    if not data.sparse:
+        summary['integrity'] = data.integrity().summary()
+    return summary
+
+
+def format_utc(utc):
+    """UTC时间戳的可读形式"""
+    return f"{datetime.fromtimestamp(utc).strftime('%Y-%m-%d %H:%M:%S')} (UTC: {utc:.1f})"
+
+
+def check_session(args, sessions):
+    """检查 --session 指定的会话是否存在"""
+    if not 1 <= args.session <= len(sessions):
+        raise ValueError(f"Session {args.session} does not exist "
+                         f"(file contains {len(sessions)} sessions)")
+
+
+def open_stream(args):
+    """流式模式：不加载数据，返回 (记录开始UTC, 扫描函数)"""
+    if args.session is None:
+        return read_record_start(args.file), lambda targets: scan_record(args.file, targets)
+    sessions = index_sessions(args.file)
+    check_session(args, sessions)
+    session = sessions[args.session - 1]
+    byte_range = (session.byte_offset, session.byte_end)
+    return session.first_utc, lambda targets: scan_record(args.file, targets, byte_range=byte_range)
+
+
+def open_index(args):
+    """索引模式：打开（或建立）稀疏时间索引，返回 (记录开始UTC, 扫描函数)"""
+    index = open_time_index(args.file)
+    if args.session is None:
+        return index.sessions[0].first_utc, index.scan
+    check_session(args, index.sessions)
+    session = args.session - 1
+    return index.sessions[session].first_utc, lambda targets: index.scan(targets, session)
+
+
+def load_data(args):
+    """完整加载记录文件或归档文件"""
+    if is_archive(args.file):
+        return load_archive(args.file)
+    return load_record(args.file) if args.no_cache else load_record_cached(args.file)
+
+
+def open_archive(args):
+    """归档文件：按行组的时间范围统计只读取需要的行组，返回 (记录开始UTC, 扫描函数)"""
+    archive = RecordArchive(args.file)
+    if args.session is None:
+        return archive.sessions[0].first_utc, archive.scan
+    check_session(args, archive.sessions)
+    session = args.session - 1
+    return archive.sessions[session].first_utc, lambda targets: archive.scan(targets, session)
+
+
+def export(args):
+    """将记录（或指定的会话）导出为列式归档文件，返回退出码"""
+    data = load_data(args)
+    if args.session is not None:
+        check_session(args, data.sessions)
+        data = data.select_session(args.session - 1)
+    export_record(data, args.export, source=os.path.basename(args.file))
+    print(f"Exported {len(data):,} rows ({len(data.sessions)} sessions) to {args.export}")
+    return 0
+
+
+def read_windows(args, record_start_utc):
+    """读取批量窗口文件，返回 (标签, 开始UTC数组, 结束UTC数组)"""
+    table = read_window_file(args.windows)
+    start_utc = resolve_window_times(table, 'start', record_start_utc)
+    end_utc = resolve_window_times(table, 'end', record_start_utc)
+    invalid = (start_utc >= end_utc).nonzero()[0]
+    if len(invalid):
+        raise ValueError(f"Window {invalid[0] + 1}: start time must be less than end time")
+    labels = [label or str(i + 1) for i, label in enumerate(table.get('label', [''] * len(start_utc)))]
+    return labels, start_utc, end_utc
+
+
+def run_files(args):
+    """多个文件组成的运行：只加载与窗口有重叠的文件，返回退出码"""
+    run = RecordRun(args.files, use_cache=not args.no_cache)
+    record_start_utc = float(run.first_utc[0])
+    if args.windows:
+        labels, start_utc, end_utc = read_windows(args, record_start_utc)
+        ch1_charge, ch2_charge = run.window_charges(start_utc, end_utc)
+        write_window_results(args.output or sys.stdout, labels, start_utc, end_utc,
+                             ch1_charge, ch2_charge, as_json=args.json or None)
+        return 0
+
+    # 运行时间相对于第一个文件的开始时间
+    start_utc = args.start
+    if start_utc is None:
+        start_utc = record_start_utc + (args.start_runtime or 0.0)
+    end_utc = args.end
+    if end_utc is None:
+        end_utc = (record_start_utc + args.end_runtime if args.end_runtime is not None
+                   else run.last_utc(len(run) - 1))
+    if start_utc >= end_utc:
+        raise ValueError("Start time must be less than end time")
+    ch1_charge, ch2_charge = run.window_charges(start_utc, end_utc)
+
+    summary = {
+        'files': [{'file': file_path, 'start_utc': float(first)}
+                  for file_path, first in zip(run.files, run.first_utc)],
+        'start_utc': record_start_utc,
+        'window': {'start_utc': start_utc, 'end_utc': end_utc, 'duration': end_utc - start_utc},
+        'loaded_files': run.loads,
+        'ch1_charge': float(ch1_charge),
+        'ch2_charge': float(ch2_charge),
+    }
+    if args.json:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    else:
+        print(f"Files:          {len(run)} ({os.path.basename(run.files[0])} - {os.path.basename(run.files[-1])})")
+        print(f"Start Time:     {format_utc(record_start_utc)}")
+        print(f"Window:         {format_utc(start_utc)} - {format_utc(end_utc)} "
+              f"(duration {end_utc - start_utc:.1f}s)")
+        print(f"Loaded Files:   {run.loads}")
+        print(f"CH1 Charge:     {ch1_charge:.6f} mC")
+        print(f"CH2 Charge:     {ch2_charge:.6f} mC")
+    return 0
+
+
+def run(args):
+    """执行分析，返回退出码"""
+    if args.files is not None:
+        return run_files(args)
+    if args.export:
+        return export(args)
+    if is_archive(args.file) and args.bin is None and args.beam is None:
+        # 归档文件不需要完整加载
+        data = None
+        record_start_utc, scan = open_archive(args)
+    elif args.stream or args.index:
+        # 先确定窗口时间，再只读取窗口边界两侧的行
+        data = None
+        record_start_utc, scan = open_stream(args) if args.stream else open_index(args)
+    else:
+        data = load_data(args)
+        if args.session is not None:
+            check_session(args, data.sessions)
+            data = data.select_session(args.session - 1)
+        summary = summarize(args.file, data)
+        record_start_utc = summary['start_utc']
+
+    if args.windows:
+        # 批量窗口
+        labels, start_utc, end_utc = read_windows(args, record_start_utc)
+        if data is None:
+            data, _ = scan(np.concatenate((start_utc, end_utc)))
+        ch1_charge, ch2_charge = query_window_charges(data, start_utc, end_utc)
+        write_window_results(args.output or sys.stdout, labels, start_utc, end_utc,
+                             ch1_charge, ch2_charge, as_json=args.json or None)
+        return 0
+
+    # 单个窗口，未指定的边界使用文件的开始/结束时间
+    start_utc = args.start
+    if start_utc is None:
+        start_utc = (record_start_utc + args.start_runtime if args.start_runtime is not None
+                     else record_start_utc)
+    end_utc = args.end
+    if end_utc is None:
+        # 流式/索引模式下结束时间要读取后才知道，先用 +inf（插值时被钳位为最后一行）
+        end_utc = (record_start_utc + args.end_runtime if args.end_runtime is not None
+                   else np.inf if data is None else summary['end_utc'])
+    if start_utc >= end_utc:
+        raise ValueError("Start time must be less than end time")
+
+    if args.bin is not None:
+        # 分箱统计
+        table = aggregate_bins(data, args.bin, start_utc, end_utc)
+        write_bin_results(args.output or sys.stdout, table, as_json=args.json or None)
+        return 0
+
+    if args.beam is not None:
+        # 束流开启的时段
+        table = detect_beam_on(data, args.beam, args.beam_channel, args.release, args.min_duration,
+                               args.merge_gap, start_utc, end_utc)
+        write_window_results(args.output or sys.stdout, beam_labels(table), table['start_utc'],
+                             table['end_utc'], table['ch1_charge'], table['ch2_charge'],
+                             as_json=args.json or None)
+        return 0
+
+    if data is None:
+        data, sessions = scan([start_utc, end_utc])
+        summary = summarize(args.file, data, sessions)
+        if end_utc == np.inf:
+            end_utc = summary['end_utc']
+    ch1_charge, ch2_charge = query_window_charges(data, start_utc, end_utc)
+    summary['window'] = {'start_utc': start_utc, 'end_utc': end_utc, 'duration': end_utc - start_utc}
+    summary['ch1_charge'] = float(ch1_charge)
+    summary['ch2_charge'] = float(ch2_charge)
+
+    if args.json:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    else:
+        print(f"File:           {args.file}")
+        print(f"Start Time:     {format_utc(summary['start_utc'])}")
+        print(f"End Time:       {format_utc(summary['end_utc'])}")
+        print(f"Total Runtime:  {summary['total_runtime']:.3f} seconds")
+        print(f"Sessions:       {len(summary['sessions'])}")
+        if 'integrity' in summary:
+            print(f"Integrity:      {data.integrity().describe()}")
+        print(f"Window:         {format_utc(start_utc)} - {format_utc(end_utc)} "
+              f"(duration {end_utc - start_utc:.1f}s)")
+        print(f"CH1 Charge:     {ch1_charge:.6f} mC")
+        print(f"CH2 Charge:     {ch2_charge:.6f} mC")
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    # 多个文件、目录或通配符：按开始时间组成一次运行
+    files, args.file = args.file, args.file[0]
+    args.files = None
+    if len(files) > 1 or os.path.isdir(files[0]) or glob.has_magic(files[0]):
+        if (args.bin is not None or args.beam is not None or args.stream or args.index
+                or args.session is not None or args.export):
+            parser.error("--bin, --beam, --stream, --index, --session and --export apply to a single file")
+        args.files = expand_inputs(files)
+        if not args.files:
+            parser.error("no record files found")
+    if args.bin is not None and (args.stream or args.index or args.windows):
+        parser.error("--bin needs the loaded data and cannot be combined with --stream, --index or --windows")
+    if args.beam is not None and (args.bin is not None or args.stream or args.index or args.windows):
+        parser.error("--beam needs the loaded data and cannot be combined with --bin, --stream, --index "
+                     "or --windows")
+    if (args.stream or args.index) and (args.export or is_archive(args.file)):
+        parser.error("--stream and --index only apply to text record files")
+    if args.export and not is_archive(args.export):
+        parser.error(f"--export needs a file ending with {', '.join(ARCHIVE_SUFFIXES)}")
+    try:
+        return run(args)
+    except RecordFileError as e:
+        print(f"{e.title}: {e}", file=sys.stderr)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 多文件批量分析
+# 用进程池并行分析大量记录文件，按完成顺序流式写出汇总表，例如：
+#   python batch_analyze.py /data/campaign --output summary.csv
+#   python batch_analyze.py "/data/run_*.csv" --jobs 32 --output summary.parquet
+
+import os
+import sys
+import csv
+import glob
+import time
+import argparse
+from multiprocessing import Pool
+
+import numpy as np
+
+from record_core import RECORD_SUFFIXES, RecordFileError, load_record, query_window_charges
+from record_cache import load_record_cached
+from record_stream import scan_record
+from record_archive import RecordArchive, is_archive
+
+# 汇总表的列，每个文件的数值结果按 SUMMARY_FIELDS 的顺序放在一个float64数组中
+SUMMARY_FIELDS = ['channels', 'rows', 'sessions', 'start_utc', 'end_utc', 'total_runtime',
+                  'ch1_charge', 'ch2_charge']
+SUMMARY_HEADER = ["File", "Channels", "Rows", "Sessions", "Start UTC", "End UTC",
+                  "Total Runtime (Seconds)", "Channel 1 Charge (mC)", "Channel 2 Charge (mC)", "Error"]
+
+PARQUET_ROW_GROUP = 4096                # Parquet 每个行组最多的文件数
+PARQUET_FLUSH_SECONDS = 5.0             # 距上次写出超过该时间时，已完成的文件立即写为一个行组
+
+
+def expand_inputs(patterns, recursive=False):
+    """将目录、通配符和文件路径展开为去重后的记录文件列表（目录中包括压缩的记录文件）"""
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            folder = os.path.join(pattern, '**') if recursive else pattern
+            matches = [path for suffix in RECORD_SUFFIXES
+                       for path in glob.glob(os.path.join(folder, '*' + suffix), recursive=recursive)]
+        else:
+            matches = glob.glob(pattern, recursive=recursive) if glob.has_magic(pattern) else [pattern]
+        files.extend(sorted(matches))
+    return list(dict.fromkeys(files))
+
+
+def analyze_file(task):
+    """分析单个文件（在工作进程中运行），返回 (路径, 数值数组, 错误信息)
+
+    只返回紧凑的数值数组，避免在进程间传递整份数据。
+    """
+    file_path, use_cache, stream = task
+    values = np.full(len(SUMMARY_FIELDS), np.nan)
+    try:
+        if is_archive(file_path):
+            # 只读取每个连续段的首末行组
+            data, sessions = RecordArchive(file_path).scan([])
+        elif stream:
+            # 只保留每个会话的首末行
+            data, sessions = scan_record(file_path, [])
+        else:
+            data = load_record_cached(file_path) if use_cache else load_record(file_path)
+            sessions = data.sessions
+        utc = data['utc_timestamp']
+        rows = sum(session.rows for session in sessions)
+        ch1_charge, ch2_charge = query_window_charges(data, utc[0], utc[-1])
+        values[:] = [2 if data.is_dual_channel else 1, rows, len(sessions),
+                     utc[0], utc[-1], data.total_runtime(), ch1_charge, ch2_charge]
+        return file_path, values, ""
+    except RecordFileError as e:
+        return file_path, values, f"{e.title}: {e}".replace('\n', ' ')
+    except Exception as e:
+        return file_path, values, str(e).replace('\n', ' ')
+
+
+class CsvSummaryWriter:
+    """逐行写出CSV汇总表（每行立即刷新）"""
+
+    def __init__(self, output):
+        self.file = open(output, 'w', encoding='utf-8', newline='') if isinstance(output, str) else output
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(SUMMARY_HEADER)
+
+    def write(self, file_path, values, error):
+        if error:
+            self.writer.writerow([file_path] + [''] * len(SUMMARY_FIELDS) + [error])
+        else:
+            channels, rows, sessions, start_utc, end_utc, runtime, ch1_charge, ch2_charge = values.tolist()
+            self.writer.writerow([file_path, int(channels), int(rows), int(sessions),
+                                  f"{start_utc:.3f}", f"{end_utc:.3f}", f"{runtime:.3f}",
+                                  f"{ch1_charge:.6f}", f"{ch2_charge:.6f}", ""])
+        self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+class ParquetSummaryWriter:
+    """按行组写出Parquet汇总表（需要 pyarrow）
+
+    每 PARQUET_ROW_GROUP 个文件或每 PARQUET_FLUSH_SECONDS 秒写出一个行组，文件完成后很快写入磁盘；
+    Parquet 的文件尾在 close 时写出，中断（Ctrl+C）时同样会关闭。
+    """
+
+    def __init__(self, output):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)") from None
+        self.pa = pa
+        self.schema = pa.schema([('file', pa.string())]
+                                + [(name, pa.float64()) for name in SUMMARY_FIELDS]
+                                + [('error', pa.string())])
+        self.writer = pq.ParquetWriter(output, self.schema)
+        self.paths, self.values, self.errors = [], [], []
+        self.flushed = time.perf_counter()
+
+    def write(self, file_path, values, error):
+        self.paths.append(file_path)
+        self.values.append(values)
+        self.errors.append(error)
+        if (len(self.paths) >= PARQUET_ROW_GROUP
+                or time.perf_counter() - self.flushed >= PARQUET_FLUSH_SECONDS):
+            self.flush()
+
+    def flush(self):
+        if not self.paths:
+            return
+        values = np.vstack(self.values)
+        columns = ([self.pa.array(self.paths)]
+                   + [self.pa.array(values[:, i]) for i in range(len(SUMMARY_FIELDS))]
+                   + [self.pa.array(self.errors)])
+        self.writer.write_table(self.pa.Table.from_arrays(columns, schema=self.schema))
+        self.paths, self.values, self.errors = [], [], []
+        self.flushed = time.perf_counter()
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def run_batch(files, writer, jobs=None, use_cache=True, progress=None, stream=False):
+    """用进程池并行分析文件，按完成顺序写入汇总表，返回失败的文件数"""
+    tasks = [(file_path, use_cache, stream) for file_path in files]
+    jobs = min(jobs or os.cpu_count() or 1, max(len(tasks), 1))
+    # 每次分发少量文件，兼顾调度开销和负载均衡
+    chunksize = max(1, min(16, len(tasks) // (jobs * 8)))
+    failed = 0
+    with Pool(jobs) as pool:
+        for done, (file_path, values, error) in enumerate(
+                pool.imap_unordered(analyze_file, tasks, chunksize), 1):
+            writer.write(file_path, values, error)
+            failed += bool(error)
+            if progress is not None:
+                progress(done, len(tasks), file_path, error)
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Summarize many current monitoring record files in parallel.")
+    parser.add_argument('inputs', nargs='+', help="record files, directories or glob patterns")
+    parser.add_argument('--output', help="summary table (.csv or .parquet, default: CSV to stdout)")
+    parser.add_argument('--jobs', type=int, help="worker processes (default: number of CPUs)")
+    parser.add_argument('--recursive', action='store_true', help="search directories recursively")
+    parser.add_argument('--no-cache', action='store_true', help="do not read or write the column cache")
+    parser.add_argument('--stream', action='store_true',
+                        help="stream each file with bounded memory instead of loading it")
+    parser.add_argument('--quiet', action='store_true', help="do not report progress")
+    args = parser.parse_args(argv)
+
+    files = expand_inputs(args.inputs, args.recursive)
+    if not files:
+        print("Error: no record files found", file=sys.stderr)
+        return 1
+
+    try:
+        if args.output and args.output.lower().endswith('.parquet'):
+            writer = ParquetSummaryWriter(args.output)
+        else:
+            writer = CsvSummaryWriter(args.output or sys.stdout)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    def report(done, total, file_path, error):
+        status = f"failed: {error}" if error else "ok"
+        print(f"[{done}/{total}] {file_path} {status}", file=sys.stderr)
+
+    started = time.perf_counter()
+    try:
+        failed = run_batch(files, writer, args.jobs, not args.no_cache, None if args.quiet else report,
+                           args.stream)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - started
+    print(f"Processed {len(files)} files ({failed} failed) in {elapsed:.2f}s "
+          f"({len(files) / max(elapsed, 1e-9):.1f} files/s)", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 性能基准
+# 生成合成记录文件并测量校验、加载、查询各阶段的耗时和峰值内存，结果写为JSON以便比较版本间的变化，例如：
+#   python benchmark.py run --sizes 1k,100k,1M --output bench.json
+#   python benchmark.py run --sizes 10M --single --sessions 3 --comments --gaps
+#   python benchmark.py generate sample.csv --rows 1M --sessions 2
+#   python benchmark.py compare old.json new.json
+#   python benchmark.py startup --repeat 10 --output startup.json
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from record_core import (DUAL_CHANNEL_HEADER, SINGLE_CHANNEL_HEADER, SESSION_MARKER, _read_header,
+                         index_sessions, load_record, query_window_charges)
+from record_cache import COLUMN_CACHE_SUFFIX, load_record_cached
+from record_index import TIME_INDEX_SUFFIX, open_time_index
+from record_stream import stream_window_charges
+
+GENERATE_CHUNK_ROWS = 1_000_000         # 生成文件时每次格式化的行数
+SAMPLE_INTERVAL = 0.1                   # 采样间隔（秒），与监控程序的10Hz一致
+COMMENT_EVERY = 10_000                  # 注释行间隔的数据行数
+GAP_EVERY = 50_000                      # 时间戳间断的平均间隔行数
+START_UTC = 1752638106.8
+
+SIZE_SUFFIXES = {'k': 1_000, 'm': 1_000_000, 'g': 1_000_000_000}
+
+# 界面启动时延迟导入的模块，"eager" 模式在导入 main 之前先导入它们，相当于延迟导入之前的启动过程
+EAGER_MODULES = ('numpy', 'record_core', 'record_cache', 'record_pyramid', 'record_aggregate', 'record_archive',
+                 'record_beam')
+
+# 在子进程中测量从导入 main 到主窗口显示的耗时（秒），输出为一行JSON
+STARTUP_SCRIPT = """
+import sys, json, time, importlib
+started = time.perf_counter()
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+import main
+imported = time.perf_counter()
+app = main.QApplication(sys.argv[:1])
+window = main.CurrentRecordAnalyzer()
+window.show()
+app.processEvents()
+shown = time.perf_counter()
+print(json.dumps({'import_main': imported - started, 'window_shown': shown - started,
+                  'numpy_loaded': 'numpy' in sys.modules}))
+"""
+
+
+def parse_size(text):
+    """解析行数，如 1k、2.5M、100000"""
+    text = text.strip().lower()
+    if text and text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def format_size(rows):
+    """行数的简写形式"""
+    for suffix, scale in (('M', 1_000_000), ('k', 1_000)):
+        if rows >= scale and rows % scale == 0:
+            return f"{rows // scale}{suffix}"
+    return str(rows)
+
+
+def generate_record(path, rows, dual=True, sessions=1, comments=False, gaps=False, seed=0):
+    """生成合成记录文件：表头与监控程序一致，可选注释行、Append模式的多个会话和时间戳间断"""
+    rng = np.random.default_rng(seed)
+    header = DUAL_CHANNEL_HEADER if dual else SINGLE_CHANNEL_HEADER
+    fmt = "%.1f, %.3f, %.6f, %.6f, %.6f, %.6f" if dual else "%.1f, %.3f, %.6f, %.6f"
+    utc = START_UTC
+
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(header + '\n')
+        for session in range(sessions):
+            session_rows = rows // sessions + (1 if session < rows % sessions else 0)
+            if sessions > 1:
+                started = datetime.fromtimestamp(utc).strftime('%Y-%m-%d %H:%M:%S')
+                f.write(f"# {SESSION_MARKER} {started}\n")
+            session_start = utc
+            integrals = (0.0, 0.0)      # 积分值在会话开始时归零
+            for start in range(0, session_rows, GENERATE_CHUNK_ROWS):
+                count = min(GENERATE_CHUNK_ROWS, session_rows - start)
+                steps = np.full(count, SAMPLE_INTERVAL)
+                if start == 0:
+                    steps[0] = 0.0
+                if gaps:
+                    # 随机的记录中断（5-60秒）
+                    gap_rows = rng.random(count) < 1 / GAP_EVERY
+                    steps[gap_rows] += rng.uniform(5, 60, gap_rows.sum())
+                times = utc + np.cumsum(steps)
+                utc = float(times[-1])
+                ch1 = 0.5 + 0.1 * rng.random(count)
+                ch2 = 0.3 + 0.01 * rng.standard_normal(count)
+                # 每行记录的是累加本行电流之前的积分值
+                ch1_integral = integrals[0] + np.concatenate(([0.0], np.cumsum(ch1[:-1]) * SAMPLE_INTERVAL))
+                ch2_integral = integrals[1] + np.concatenate(([0.0], np.cumsum(ch2[:-1]) * SAMPLE_INTERVAL))
+                integrals = (ch1_integral[-1] + ch1[-1] * SAMPLE_INTERVAL,
+                             ch2_integral[-1] + ch2[-1] * SAMPLE_INTERVAL)
+                columns = ((times, times - session_start, ch1, ch2, ch1_integral, ch2_integral) if dual
+                           else (times, times - session_start, ch1, ch1_integral))
+                lines = list(map(fmt.__mod__, zip(*(column.tolist() for column in columns))))
+                step = COMMENT_EVERY if comments else len(lines)
+                for i in range(0, len(lines), step):
+                    f.write('\n'.join(lines[i:i + step]) + '\n')
+                    if comments:
+                        f.write("# operator note: beam check\n")
+            utc += 100.0            # 会话之间的间隔
+    return path
+
+
+def dataset_path(data_dir, rows, dual, sessions, comments, gaps):
+    """生成文件的路径，相同参数的文件在多次运行之间复用"""
+    name = (f"bench_{format_size(rows)}_{'dual' if dual else 'single'}_s{sessions}"
+            f"{'_comments' if comments else ''}{'_gaps' if gaps else ''}.csv")
+    return os.path.join(data_dir, name)
+
+
+def remove_sidecars(path):
+    """删除列缓存和时间索引，保证每次测量的是冷启动"""
+    shutil.rmtree(path + COLUMN_CACHE_SUFFIX, ignore_errors=True)
+    if os.path.exists(path + TIME_INDEX_SUFFIX):
+        os.remove(path + TIME_INDEX_SUFFIX)
+
+
+def timed(func, repeat=1):
+    """运行 repeat 次，返回 (最短耗时, 最后一次的结果)"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def stage(seconds, rows=None, size=None, **extra):
+    """单个阶段的结果"""
+    result = {'seconds': seconds}
+    if rows is not None:
+        result['rows_per_s'] = rows / max(seconds, 1e-12)
+    if size is not None:
+        result['mb_per_s'] = size / 1e6 / max(seconds, 1e-12)
+    result.update(extra)
+    return result
+
+
+def peak_memory(func):
+    """用 tracemalloc 测量 func 的峰值内存分配（字节），单独运行以免影响计时"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_file(path, windows=10_000, memory=True, seed=0):
+    """测量一个文件的各阶段，返回 {阶段: 结果}"""
+    size = os.path.getsize(path)
+    remove_sidecars(path)
+    stages = {}
+
+    def validate():
+        with open(path, 'rb') as f:
+            return _read_header(f)
+    seconds, _ = timed(validate, repeat=5)
+    stages['validate'] = stage(seconds)
+
+    seconds, sessions = timed(lambda: index_sessions(path))
+    rows = sum(session.rows for session in sessions)
+    stages['index_sessions'] = stage(seconds, rows, size)
+
+    seconds, data = timed(lambda: load_record(path))
+    stages['load'] = stage(seconds, rows, size, bytes_per_row=data.nbytes() / rows)
+    if memory:
+        peak = peak_memory(lambda: load_record(path))
+        stages['load']['peak_mb'] = peak / 1e6
+        stages['load']['peak_bytes_per_row'] = peak / rows
+
+    seconds, _ = timed(lambda: load_record_cached(path))
+    stages['cache_build'] = stage(seconds, rows, size)
+    seconds, _ = timed(lambda: load_record_cached(path), repeat=5)
+    stages['cache_hit'] = stage(seconds, rows)
+
+    # 查询：单个窗口取中间一半的时间范围，批量窗口在数据范围内随机选取
+    utc = data['utc_timestamp']
+    first, last = float(utc[0]), float(utc[-1])
+    start, end = first + (last - first) / 4, last - (last - first) / 4
+    repeat = 200
+    seconds, _ = timed(lambda: [query_window_charges(data, start, end) for _ in range(repeat)], repeat=3)
+    stages['single_query'] = stage(seconds / repeat)
+
+    rng = np.random.default_rng(seed)
+    bounds = np.sort(rng.uniform(first, last, (windows, 2)), axis=1)
+    seconds, _ = timed(lambda: query_window_charges(data, bounds[:, 0], bounds[:, 1]), repeat=3)
+    stages['batch_query'] = stage(seconds, windows=windows, windows_per_s=windows / max(seconds, 1e-12))
+    data = None             # 释放后再测流式查询的内存
+
+    seconds, _ = timed(lambda: stream_window_charges(path, start, end))
+    stages['stream_query'] = stage(seconds, rows, size)
+    if memory:
+        stages['stream_query']['peak_mb'] = peak_memory(lambda: stream_window_charges(path, start, end)) / 1e6
+
+    seconds, index = timed(lambda: open_time_index(path))
+    stages['time_index_build'] = stage(seconds, rows, size)
+    seconds, _ = timed(lambda: index.window_charges(start, end), repeat=20)
+    stages['time_index_query'] = stage(seconds)
+
+    remove_sidecars(path)
+    return {'rows': rows, 'file_bytes': size, 'sessions': len(sessions), 'stages': stages}
+
+
+def environment():
+    """运行环境信息，用于区分不同版本和机器的结果"""
+    try:
+        revision = subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        revision = ""
+    return {
+        'revision': revision,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_benchmarks(args):
+    """生成（或复用）各规模的文件并逐个测量"""
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = []
+    for rows in [parse_size(size) for size in args.sizes.split(',')]:
+        path = dataset_path(args.data_dir, rows, not args.single, args.sessions, args.comments, args.gaps)
+        if not os.path.exists(path):
+            print(f"Generating {os.path.basename(path)}...", file=sys.stderr)
+            seconds, _ = timed(lambda: generate_record(path + '.tmp', rows, not args.single, args.sessions,
+                                                       args.comments, args.gaps, args.seed))
+            os.replace(path + '.tmp', path)
+            print(f"  {os.path.getsize(path) / 1e6:.1f} MB in {seconds:.1f}s", file=sys.stderr)
+        print(f"Benchmarking {os.path.basename(path)}...", file=sys.stderr)
+        result = benchmark_file(path, args.windows, not args.no_memory, args.seed)
+        result.update({'size': format_size(rows), 'channels': 1 if args.single else 2,
+                       'comments': args.comments, 'gaps': args.gaps})
+        for name, values in result['stages'].items():
+            print(f"  {name:<18}{values['seconds'] * 1e3:>12.3f} ms", file=sys.stderr)
+        results.append(result)
+        if not args.keep_data:
+            os.remove(path)
+    return {'environment': environment(), 'results': results}
+
+
+def measure_startup(modules=(), platform_name='offscreen'):
+    """在新的解释器中启动一次界面，返回各阶段耗时和进程的总耗时（含解释器启动和退出）"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, QT_QPA_PLATFORM=platform_name)
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, *modules], capture_output=True,
+                               text=True, cwd=root, env=env, timeout=120)
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"Startup measurement failed: {completed.stderr.strip()}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['process'] = elapsed
+    return result
+
+
+def run_startup(args):
+    """比较延迟导入（当前启动方式）和预先导入全部分析模块时的界面启动耗时，取 repeat 次中的最短值"""
+    modes = {'lazy': (), 'eager': EAGER_MODULES}
+    results = {}
+    for mode, modules in modes.items():
+        runs = [measure_startup(modules, args.platform) for _ in range(args.repeat)]
+        results[mode] = {key: min(run[key] for run in runs)
+                         for key in ('import_main', 'window_shown', 'process')}
+        results[mode]['numpy_loaded'] = runs[-1]['numpy_loaded']
+        times = results[mode]
+        print(f"  {mode:<8}import {times['import_main'] * 1e3:>8.1f} ms   window shown "
+              f"{times['window_shown'] * 1e3:>8.1f} ms   process {times['process'] * 1e3:>8.1f} ms", file=sys.stderr)
+    results['speedup'] = results['eager']['window_shown'] / max(results['lazy']['window_shown'], 1e-12)
+    return {'environment': environment(), 'startup': results}
+
+
+def compare_results(old_path, new_path):
+    """按文件规模和阶段比较两次运行的耗时"""
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    def key(result):
+        return (result['size'], result['channels'], result['sessions'], result['comments'], result['gaps'])
+
+    old_results = {key(result): result for result in old['results']}
+    print(f"{'Dataset':<28}{'Stage':<20}{'Old (ms)':>12}{'New (ms)':>12}{'Ratio':>8}")
+    for result in new['results']:
+        previous = old_results.get(key(result))
+        if previous is None:
+            continue
+        label = "{}/{}ch/s{}".format(*key(result)[:3])
+        for name, values in result['stages'].items():
+            if name in previous['stages']:
+                before, after = previous['stages'][name]['seconds'], values['seconds']
+                print(f"{label:<28}{name:<20}{before * 1e3:>12.3f}{after * 1e3:>12.3f}"
+                      f"{after / max(before, 1e-12):>8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark loading and charge queries on synthetic records.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="generate records and measure each stage")
+    run.add_argument('--sizes', default='1k,100k,1M', help="comma-separated row counts (e.g. 1k,1M,100M)")
+    run.add_argument('--single', action='store_true', help="single-channel records (default: dual-channel)")
+    run.add_argument('--sessions', type=int, default=1, help="Append-mode sessions per file")
+    run.add_argument('--comments', action='store_true', help=f"add a comment line every {COMMENT_EVERY} rows")
+    run.add_argument('--gaps', action='store_true', help="add random timestamp gaps")
+    run.add_argument('--windows', type=int, default=10_000, help="windows in the batch query")
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--no-memory', action='store_true', help="skip the (slower) peak memory measurements")
+    run.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'record_benchmarks'),
+                     help="where generated records are stored")
+    run.add_argument('--keep-data', action='store_true', help="keep generated records for later runs")
+    run.add_argument('--output', help="results file (JSON, default: stdout)")
+
+    generate = commands.add_parser('generate', help="write a synthetic record file")
+    generate.add_argument('output')
+    generate.add_argument('--rows', default='100k')
+    generate.add_argument('--single', action='store_true')
+    generate.add_argument('--sessions', type=int, default=1)
+    generate.add_argument('--comments', action='store_true')
+    generate.add_argument('--gaps', action='store_true')
+    generate.add_argument('--seed', type=int, default=0)
+
+    compare = commands.add_parser('compare', help="compare two result files")
+    compare.add_argument('old')
+    compare.add_argument('new')
+
+    startup = commands.add_parser('startup', help="measure the time from launch to the first window")
+    startup.add_argument('--repeat', type=int, default=5, help="launches per mode (the fastest is reported)")
+    startup.add_argument('--platform', default='offscreen', help="Qt platform plugin (default: offscreen)")
+    startup.add_argument('--output', help="results file (JSON, default: stdout)")
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        generate_record(args.output, parse_size(args.rows), not args.single, args.sessions,
+                        args.comments, args.gaps, args.seed)
+    elif args.command == 'compare':
+        compare_results(args.old, args.new)
+    else:
+        results = run_startup(args) if args.command == 'startup' else run_benchmarks(args)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+        else:
+            json.dump(results, sys.stdout, indent=2)
+            print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 电流曲线
+# 基于最小/最大值金字塔绘制电流-时间曲线：任意缩放级别下只绘制与像素数相当的点，
+# 滚轮缩放、右键拖动平移、左键拖动选择时间范围、双击恢复全范围
+
+from datetime import datetime
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+from PyQt5.QtCore import Qt
+
+from deferred_import import DeferredModule
+
+# 创建空白曲线时不需要 numpy，第一次显示数据时才导入
+np = DeferredModule('numpy')
+record_pyramid = DeferredModule('record_pyramid')
+
+# 各通道的曲线颜色，与结果框的边框颜色一致
+CHANNEL_COLORS = {'ch1_current': "#4CAF50", 'ch2_current': "#FF9800"}
+CHANNEL_LABELS = {'ch1_current': "CH1", 'ch2_current': "CH2"}
+
+POINTS_PER_PIXEL = 4                    # 每个像素最多绘制的点数（原始行或每箱的最小/最大值）
+ZOOM_STEP = 0.8                         # 滚轮每格的缩放比例
+MIN_SELECTION_PIXELS = 4                # 拖动超过该距离才视为选择时间范围
+
+
+def build_pyramids(data):
+    """各通道电流的最小/最大值金字塔（可在工作线程中调用），传给 CurrentPlot.set_data"""
+    return {name: record_pyramid.MinMaxPyramid(data[name]) for name in CHANNEL_COLORS if name in data}
+
+
+class CurrentPlot(QtWidgets.QWidget):
+    """电流-时间曲线，拖动选择的时间范围通过 region_selected(开始UTC, 结束UTC) 发出"""
+
+    region_selected = QtCore.pyqtSignal(float, float)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMinimumHeight(180)
+        self.setMouseTracking(False)
+        self.setToolTip("Wheel: zoom, right-drag: pan, left-drag: select time range, double-click: full range")
+        self.utc = None
+        self.pyramids = {}
+        self.view = None                # 显示的时间范围 (开始UTC, 结束UTC)
+        self.selection = None           # 选中的时间范围
+        self.drag = None                # 拖动状态：('select' | 'pan', 起点x, 起点时的显示范围)
+
+    def set_data(self, data, pyramids=None, appended=False):
+        """显示新的数据
+
+        pyramids 为在工作线程中用 build_pyramids 建好的金字塔，为None时在这里建立（或增量更新）。
+        appended 时数据为之前数据追加新行后的结果，保持缩放。
+        """
+        utc = data['utc_timestamp']
+        names = [name for name in CHANNEL_COLORS if name in data]
+        appended = appended and self.utc is not None and len(utc) >= len(self.utc)
+        full_view = not appended or (self.view[0] <= self.utc[0] and self.view[1] >= self.utc[-1] - 1e-6)
+        if pyramids is not None:
+            self.pyramids = pyramids
+        elif appended and list(self.pyramids) == names:
+            # 已有部分不变，只重算新增行所在的箱
+            for name in names:
+                self.pyramids[name].update(data[name])
+        else:
+            self.pyramids = build_pyramids(data)
+        if not appended:
+            self.selection = None
+        self.utc = utc
+        if full_view or self.view is None:
+            self.view = (float(utc[0]), float(utc[-1]))
+        self.update()
+
+    def clear(self):
+        self.utc = None
+        self.pyramids = {}
+        self.view = self.selection = None
+        self.update()
+
+    def plot_rect(self):
+        """绘图区域（留出坐标轴标签的位置）"""
+        return QtCore.QRectF(self.rect()).adjusted(72, 12, -12, -24)
+
+    def to_x(self, utc, rect):
+        start, end = self.view
+        return rect.left() + (utc - start) / max(end - start, 1e-9) * rect.width()
+
+    def to_utc(self, x):
+        rect = self.plot_rect()
+        start, end = self.view
+        return start + (x - rect.left()) / max(rect.width(), 1) * (end - start)
+
+    def set_view(self, start, end):
+        """设置显示范围，限制在数据范围内"""
+        first, last = float(self.utc[0]), float(self.utc[-1])
+        span = min(max(end - start, 1e-3), max(last - first, 1e-3))
+        start = min(max(start, first), last - span) if last - first > span else first
+        self.view = (start, start + span)
+        self.update()
+
+    def visible_points(self, rect):
+        """可见范围内各通道的抽样：{列名: (UTC数组, 最小值, 最大值)}"""
+        start = max(int(np.searchsorted(self.utc, self.view[0], side='left')) - 1, 0)
+        stop = min(int(np.searchsorted(self.utc, self.view[1], side='right')) + 1, len(self.utc))
+        max_points = max(int(rect.width()), 1) * POINTS_PER_PIXEL
+        points = {}
+        for name, pyramid in self.pyramids.items():
+            rows, mins, maxs = pyramid.select(start, stop, max_points)
+            points[name] = (self.utc[rows], mins, maxs)
+        return points
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), Qt.white)
+        rect = self.plot_rect()
+        painter.setPen(QtGui.QPen(QtGui.QColor("#999999")))
+        painter.drawRect(rect)
+        if self.utc is None or not self.pyramids:
+            painter.drawText(rect, Qt.AlignCenter, "No data")
+            return
+
+        points = self.visible_points(rect)
+        low = min((float(np.nanmin(mins)) for _, mins, _ in points.values() if len(mins)), default=0.0)
+        high = max((float(np.nanmax(maxs)) for _, _, maxs in points.values() if len(maxs)), default=1.0)
+        if not high > low:
+            low, high = low - 0.5, high + 0.5
+        pad = (high - low) * 0.05
+        low, high = low - pad, high + pad
+
+        def to_y(values):
+            return rect.bottom() - (values - low) / (high - low) * rect.height()
+
+        self.draw_axes(painter, rect, low, high)
+
+        # 选中的时间范围
+        if self.selection is not None:
+            x1, x2 = sorted(self.to_x(t, rect) for t in self.selection)
+            painter.fillRect(QtCore.QRectF(x1, rect.top(), max(x2 - x1, 1), rect.height()),
+                             QtGui.QColor(33, 150, 243, 50))
+
+        painter.setClipRect(rect)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, False)
+        for name, (utc, mins, maxs) in points.items():
+            xs = self.to_x(utc, rect)
+            if mins is maxs:
+                x, y = xs, to_y(mins.astype(np.float64))
+            else:
+                # 每箱从最小值到最大值画一条竖线，相邻的箱首尾相连
+                x = np.repeat(xs, 2)
+                y = to_y(np.column_stack((mins, maxs)).astype(np.float64).ravel())
+            polygon = QtGui.QPolygonF([QtCore.QPointF(px, py) for px, py in zip(x.tolist(), y.tolist())])
+            painter.setPen(QtGui.QPen(QtGui.QColor(CHANNEL_COLORS[name]), 1))
+            painter.drawPolyline(polygon)
+        painter.setClipping(False)
+
+        # 图例
+        x = rect.right() - 8
+        for name in reversed(list(points)):
+            label = CHANNEL_LABELS[name]
+            width = painter.fontMetrics().horizontalAdvance(label)
+            x -= width
+            painter.setPen(QtGui.QColor(CHANNEL_COLORS[name]))
+            painter.drawText(QtCore.QPointF(x, rect.top() + 14), label)
+            x -= 12
+
+    def draw_axes(self, painter, rect, low, high):
+        """坐标轴刻度：左侧电流值，下方时间"""
+        painter.setPen(QtGui.QColor("#666666"))
+        metrics = painter.fontMetrics()
+        for i in range(5):
+            value = low + (high - low) * i / 4
+            y = rect.bottom() - rect.height() * i / 4
+            text = f"{value:.4g}"
+            painter.drawText(QtCore.QPointF(rect.left() - 6 - metrics.horizontalAdvance(text),
+                                            y + metrics.ascent() / 2), text)
+
+        start, end = self.view
+        fmt = "%H:%M:%S" if end - start > 10 else "%H:%M:%S.%f"
+        if end - start > 86400:
+            fmt = "%m-%d %H:%M"
+        for i in range(5):
+            utc = start + (end - start) * i / 4
+            text = datetime.fromtimestamp(utc).strftime(fmt)
+            if fmt.endswith("%f"):
+                text = text[:-3]
+            x = rect.left() + rect.width() * i / 4 - metrics.horizontalAdvance(text) * i / 4
+            painter.drawText(QtCore.QPointF(x, rect.bottom() + metrics.ascent() + 4), text)
+
+    def wheelEvent(self, event):
+        if self.utc is None:
+            return
+        # 以鼠标位置为中心缩放
+        factor = ZOOM_STEP ** (event.angleDelta().y() / 120)
+        center = self.to_utc(event.pos().x())
+        start, end = self.view
+        self.set_view(center - (center - start) * factor, center + (end - center) * factor)
+
+    def mousePressEvent(self, event):
+        if self.utc is None:
+            return
+        if event.button() == Qt.LeftButton:
+            self.drag = ('select', event.pos().x(), self.view)
+        elif event.button() == Qt.RightButton:
+            self.drag = ('pan', event.pos().x(), self.view)
+
+    def mouseMoveEvent(self, event):
+        if self.drag is None:
+            return
+        mode, x0, (start, end) = self.drag
+        if mode == 'pan':
+            shift = (x0 - event.pos().x()) / max(self.plot_rect().width(), 1) * (end - start)
+            self.set_view(start + shift, end + shift)
+        elif abs(event.pos().x() - x0) >= MIN_SELECTION_PIXELS:
+            self.selection = (self.to_utc(x0), self.to_utc(event.pos().x()))
+            self.update()
+
+    def mouseReleaseEvent(self, event):
+        if self.drag is None:
+            return
+        mode, x0, _ = self.drag
+        self.drag = None
+        if mode == 'select' and abs(event.pos().x() - x0) >= MIN_SELECTION_PIXELS:
+            # 限制在数据范围内
+            first, last = float(self.utc[0]), float(self.utc[-1])
+            start, end = sorted(min(max(t, first), last) for t in (self.to_utc(x0), self.to_utc(event.pos().x())))
+            self.selection = (start, end)
+            self.update()
+            if end > start:
+                self.region_selected.emit(start, end)
+
+    def mouseDoubleClickEvent(self, event):
+        if self.utc is not None:
+            self.set_view(float(self.utc[0]), float(self.utc[-1]))
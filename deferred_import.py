@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 延迟导入
+# 界面启动时只导入显示窗口所需的模块，numpy 和分析模块在第一次使用时（或窗口显示后在后台线程中）导入
+
+import sys
+import threading
+import importlib
+
+
+class DeferredModule:
+    """第一次访问属性时才导入的模块
+
+    用法与模块相同（module.name），导入由 importlib 完成，可在多个线程中同时触发。
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._name in sys.modules else "deferred"
+        return f"<deferred module '{self._name}' ({state})>"
+
+
+def preload(names):
+    """在后台守护线程中依次导入模块，返回线程；导入失败留到第一次使用时再报告"""
+    def run():
+        for name in names:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                pass
+
+    thread = threading.Thread(target=run, name="preload", daemon=True)
+    thread.start()
+    return thread
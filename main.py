@@ -6,25 +6,82 @@
 
 import sys
 import os
-import csv
+import argparse
+import tracemalloc
 import time
-import re
 from datetime import datetime
-import pandas as pd
-import numpy as np
 from PyQt5 import QtWidgets, QtCore, QtGui
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QWidget, QLabel, 
                              QPushButton, QHBoxLayout, QGridLayout, QLineEdit, QFileDialog,
-                             QMessageBox, QComboBox, QDialog, QTextBrowser, QTextEdit,
-                             QGroupBox, QRadioButton, QButtonGroup)
+                             QMessageBox, QDialog, QTextBrowser,
+                             QGroupBox, QRadioButton, QButtonGroup, QProgressDialog,
+                             QInputDialog)
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont
 
+from deferred_import import DeferredModule, preload
+from record_trace import OperationTrace, append_trace, format_seconds
+from record_pool import DATASET_CACHE_MB, DatasetCache, stat_key
+from current_plot import CurrentPlot, build_pyramids
+
+# numpy 和分析模块在第一次使用时导入，窗口显示后在后台线程中预先导入，不拖慢启动
+np = DeferredModule('numpy')
+record_core = DeferredModule('record_core')
+record_cache = DeferredModule('record_cache')
+record_aggregate = DeferredModule('record_aggregate')
+record_archive = DeferredModule('record_archive')
+record_beam = DeferredModule('record_beam')
+PRELOAD_MODULES = ('numpy', 'record_core', 'record_cache', 'record_pyramid', 'record_aggregate', 'record_archive',
+                   'record_beam')
+
+FOLLOW_INTERVAL_MS = 1000               # 跟踪模式的刷新间隔
+PREVIEW_DELAY_MS = 150                  # 编辑时间范围后刷新电荷量预览的延迟（防抖）
+CURRENT_DTYPE = 'float32'               # 电流列的存储精度（界面只用积分值计算电荷量，单精度足够）
+TRACED_OPERATIONS = ('open_file', 'calculate_charge')    # 记录性能追踪的操作
+RECENT_FILES = 8                        # "Recent Files" 菜单中保留的文件数
+
+
+class BackgroundTask(QtCore.QThread):
+    """在工作线程中运行耗时任务，报告进度并支持取消
+
+    任务函数接收一个进度回调 report(已处理字节, 总字节, 行数)，取消后回调抛出 LoadCancelled。
+    """
+    progress = QtCore.pyqtSignal('qint64', 'qint64', 'qint64')
+    succeeded = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(object)
+    cancelled = QtCore.pyqtSignal()
+
+    def __init__(self, func, parent=None):
+        super().__init__(parent)
+        self.func = func
+        self._cancel_requested = False
+
+    def cancel(self):
+        """请求取消任务（在下一次进度回调时生效）"""
+        self._cancel_requested = True
+
+    def report(self, done, total, rows):
+        """进度回调，在工作线程中调用"""
+        if self._cancel_requested:
+            raise record_core.LoadCancelled()
+        self.progress.emit(done, total, rows)
+
+    def run(self):
+        try:
+            result = self.func(self.report)
+        except record_core.LoadCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(e)
+        else:
+            self.succeeded.emit(result)
+
+
 class CurrentRecordAnalyzer(QMainWindow):
-    def __init__(self):
+    def __init__(self, trace_path=None, trace_memory=False, profile_operation=None, cache_mb=DATASET_CACHE_MB):
         super().__init__()
         self.setWindowTitle("Current Record File Analyzer")
-        self.setGeometry(100, 100, 800, 600)
+        self.setGeometry(100, 100, 800, 800)
         
         # 数据存储
         self.data = None
@@ -33,9 +90,43 @@ class CurrentRecordAnalyzer(QMainWindow):
         self.end_utc = None
         self.total_runtime = None
         
+        # 后台任务
+        self.task = None
+        self.progress_dialog = None
+        
+        # 跟踪模式（文件仍在写入时定时读取新增数据）
+        self.follower = None
+        self.follow_timer = QtCore.QTimer(self)
+        self.follow_timer.setInterval(FOLLOW_INTERVAL_MS)
+        self.follow_timer.timeout.connect(self.poll_follow)
+        
+        # 编辑时间范围时实时预览电荷量，连续输入时只在停顿后计算一次
+        self.preview_timer = QtCore.QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DELAY_MS)
+        self.preview_timer.timeout.connect(self.update_charge_preview)
+        
+        # 性能追踪：JSON追踪文件、是否记录内存峰值、下一次需要 cProfile 的操作
+        self.trace_path = trace_path
+        self.trace_memory = trace_memory
+        self.profile_operation = profile_operation
+        
+        self.bin_width_text = "1min"            # 上次使用的分箱宽度
+        # 上次使用的束流检测设置（输入框中的文本）
+        self.beam_settings = {'channel': 'ch1', 'threshold': "", 'release': "", 'merge_gap': "0",
+                              'min_duration': "0"}
+        
+        # 已解析数据集的LRU缓存，切换回最近打开的文件时不必重新解析；
+        # 最近打开的文件：[(路径, 会话序号, 会话数, 缓存中的部分)]，最近的在前
+        self.dataset_cache = DatasetCache(int(cache_mb * 1000 * 1000))
+        self.recent_files = []
+        
         self.init_ui()
         self.create_menu_bar()
         self.statusBar().showMessage("Ready")      # 状态栏
+        self.cache_label = QLabel()
+        self.statusBar().addPermanentWidget(self.cache_label)
+        self.update_cache_status()
 
         # 为结果文本框添加右键复制功能
         self.ch1_result_text.setContextMenuPolicy(Qt.ActionsContextMenu)
@@ -64,6 +155,35 @@ class CurrentRecordAnalyzer(QMainWindow):
         open_action.setShortcut('Ctrl+O')
         file_menu.addAction(open_action)
         
+        self.recent_menu = file_menu.addMenu('Recent Files')
+        self.recent_menu.aboutToShow.connect(self.update_recent_menu)
+        
+        batch_action = QtWidgets.QAction('Batch Windows...', self)
+        batch_action.triggered.connect(self.calculate_batch_windows)
+        batch_action.setShortcut('Ctrl+B')
+        file_menu.addAction(batch_action)
+        
+        bins_action = QtWidgets.QAction('Aggregate Bins...', self)
+        bins_action.triggered.connect(self.calculate_bins)
+        bins_action.setShortcut('Ctrl+G')
+        file_menu.addAction(bins_action)
+        
+        beam_action = QtWidgets.QAction('Detect Beam-On Periods...', self)
+        beam_action.triggered.connect(self.detect_beam_periods)
+        beam_action.setShortcut('Ctrl+D')
+        file_menu.addAction(beam_action)
+        
+        export_action = QtWidgets.QAction('Export Archive...', self)
+        export_action.triggered.connect(self.export_archive)
+        export_action.setShortcut('Ctrl+E')
+        file_menu.addAction(export_action)
+        
+        self.follow_action = QtWidgets.QAction('Follow File', self)
+        self.follow_action.setCheckable(True)
+        self.follow_action.toggled.connect(self.toggle_follow)
+        self.follow_action.setShortcut('Ctrl+F')
+        file_menu.addAction(self.follow_action)
+        
         file_menu.addSeparator()
         
         exit_action = QtWidgets.QAction('Exit', self)
@@ -111,15 +231,27 @@ class CurrentRecordAnalyzer(QMainWindow):
         self.start_time_label = QLabel("Start Time: --")
         self.end_time_label = QLabel("End Time: --")
         self.total_runtime_label = QLabel("Total Runtime: --")
+        self.session_label = QLabel("Sessions: --")
+        self.integrity_label = QLabel("Integrity: --")
         
         info_layout.addWidget(self.start_time_label, 0, 0)
         info_layout.addWidget(self.end_time_label, 0, 1)
-        info_layout.addWidget(self.total_runtime_label, 1, 0, 1, 2)
+        info_layout.addWidget(self.total_runtime_label, 1, 0)
+        info_layout.addWidget(self.session_label, 1, 1)
+        info_layout.addWidget(self.integrity_label, 2, 0, 1, 2)
         
         file_layout.addLayout(file_path_layout)
         file_layout.addLayout(info_layout)
         file_group.setLayout(file_layout)
         
+        # 电流曲线，拖动选择的范围填入自定义时间
+        plot_group = QGroupBox("Current (mA)")
+        plot_layout = QVBoxLayout()
+        self.current_plot = CurrentPlot()
+        self.current_plot.region_selected.connect(self.on_plot_region_selected)
+        plot_layout.addWidget(self.current_plot)
+        plot_group.setLayout(plot_layout)
+        
         # 时间范围选择区域
         time_range_group = QGroupBox("Time Range Selection")
         time_range_layout = QVBoxLayout()
@@ -188,6 +320,9 @@ class CurrentRecordAnalyzer(QMainWindow):
         self.end_utc_input.textChanged.connect(lambda: self.auto_convert_time('end', 'utc'))
         self.end_time_input.textChanged.connect(lambda: self.auto_convert_time('end', 'time'))
         self.end_runtime_input.textChanged.connect(lambda: self.auto_convert_time('end', 'runtime'))
+        for time_input in (self.start_utc_input, self.start_time_input, self.start_runtime_input,
+                           self.end_utc_input, self.end_time_input, self.end_runtime_input):
+            time_input.textChanged.connect(self.schedule_charge_preview)
         
         time_range_layout.addLayout(radio_layout)
         time_range_layout.addWidget(self.custom_time_widget)
@@ -198,7 +333,7 @@ class CurrentRecordAnalyzer(QMainWindow):
         calc_layout = QVBoxLayout()
 
         self.calculate_btn = QPushButton("Calculate")
-        self.calculate_btn.clicked.connect(self.calculate_charge)
+        self.calculate_btn.clicked.connect(lambda: self.calculate_charge())
         self.calculate_btn.setStyleSheet("background-color: #2196F3; color: white; font-weight: bold; padding: 10px; font-size: 14px;")
         self.calculate_btn.setEnabled(False)
 
@@ -258,13 +393,38 @@ class CurrentRecordAnalyzer(QMainWindow):
         
         # 添加到主布局
         main_layout.addWidget(file_group)
+        main_layout.addWidget(plot_group, 1)
         main_layout.addWidget(time_range_group)
         main_layout.addWidget(calc_group)
-        main_layout.addStretch()
     
     def on_time_range_changed(self):
         """时间范围选择改变时的处理"""
         self.custom_time_widget.setEnabled(self.custom_time_radio.isChecked())
+        self.schedule_charge_preview()
+    
+    def schedule_charge_preview(self):
+        """时间范围改变后延迟刷新电荷量预览（重新计时）"""
+        if self.data is not None:
+            self.preview_timer.start()
+    
+    def update_charge_preview(self):
+        """按当前时间范围实时计算电荷量：每个边界二分查找，与数据行数无关；范围无效时清空结果"""
+        if self.data is None:
+            return
+        time_range = self.get_time_range(warn=False)
+        if time_range is None:
+            self.ch1_result_text.clear()
+            self.ch2_result_text.clear()
+            return
+        ch1_total_charge, ch2_total_charge = record_core.query_window_charges(self.data, *time_range)
+        self.ch1_result_text.setText(f"{ch1_total_charge:.6f}")
+        self.ch2_result_text.setText(f"{ch2_total_charge:.6f}")
+    
+    def on_plot_region_selected(self, start_utc, end_utc):
+        """在曲线上拖动选择时间范围后填入自定义时间（其余格式自动转换）"""
+        self.custom_time_radio.setChecked(True)
+        self.start_utc_input.setText(f"{start_utc:.3f}")
+        self.end_utc_input.setText(f"{end_utc:.3f}")
     
     def auto_convert_time(self, position, input_type):
         """自动转换时间格式"""
@@ -331,165 +491,451 @@ class CurrentRecordAnalyzer(QMainWindow):
     
     def parse_time_string(self, time_str):
         """解析时间字符串"""
-        try:
-            # 尝试不同的时间格式
-            formats = [
-                "%Y%m%d %H:%M:%S.%f",
-                "%Y%m%d %H:%M:%S",
-                "%Y-%m-%d %H:%M:%S.%f",
-                "%Y-%m-%d %H:%M:%S",
-            ]
-            
-            for fmt in formats:
-                try:
-                    return datetime.strptime(time_str, fmt)
-                except ValueError:
-                    continue
-            return None
-        except:
-            return None
+        return record_core.parse_time_string(time_str)
     
     def open_file(self):
         """打开文件"""
+        if self.task is not None:
+            self.statusBar().showMessage("Another operation is still running", 3000)
+            return
+        
+        suffixes = record_core.RECORD_SUFFIXES + record_archive.ARCHIVE_SUFFIXES
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "Select Current Record File", "", "CSV Files (*.csv);;All Files (*)"
+            self, "Select Current Record File", "",
+            f"Record Files ({' '.join('*' + suffix for suffix in suffixes)});;"
+            "All Files (*)"
         )
         
         if not file_path:
             return
-            
-        try:
-            # 检查文件格式和内容
-            if not self.validate_file(file_path):
-                return
-                
-            # 读取文件数据
-            self.load_file_data(file_path)
-            
-            # 更新界面
-            self.file_path = file_path
-            self.file_path_label.setText(os.path.basename(file_path))
-            self.file_path_label.setToolTip(file_path)
-            
-            # 显示文件信息
-            self.update_file_info()
-            
-            # 启用计算按钮
-            self.calculate_btn.setEnabled(True)
-            
+        self.open_path(file_path)
+    
+    def open_path(self, file_path):
+        """打开指定的文件"""
+        # 检查文件类型
+        trace = self.start_trace('open_file', file=file_path)
+        with trace.stage('validate_file'):
+            valid = self.validate_file(file_path)
+        if not valid:
+            self.finish_trace(trace, "unsupported file type")
+            return
+        
+        # 在工作线程中建立会话索引（同时校验表头）
+        self.run_task(lambda report: self.scan_file(file_path, trace, report),
+                      f"Indexing {os.path.basename(file_path)}...",
+                      lambda result: self.on_file_scanned(file_path, result, trace),
+                      lambda error: self.on_file_load_failed(error, trace), trace)
+    
+    def on_file_scanned(self, file_path, result, trace):
+        """会话索引完成：多会话时由用户选择会话，再加载对应的数据"""
+        sessions = result.sessions if isinstance(result, record_core.RecordData) else result
+        index = self.choose_session(sessions) if len(sessions) > 1 else -1
+        if index is None:
+            self.finish_trace(trace, "cancelled")
+            return
+        
+        if isinstance(result, record_core.RecordData):
+            # 数据已在内存中（数据集缓存或列缓存），在工作线程中取出所选会话
+            self.run_task(lambda report: self.prepare_plot(result, trace, index),
+                          f"Loading {os.path.basename(file_path)}...",
+                          lambda loaded: self.on_file_loaded(file_path, loaded, trace, index, len(sessions)),
+                          lambda error: self.on_file_load_failed(error, trace), trace)
+            return
+        
+        # 只解析所选会话的字节范围
+        session = None if index < 0 else sessions[index]
+        part = None if session is None else (session.byte_offset, session.byte_end)
+        self.run_task(lambda report: self.prepare_plot(self.load_file_data(file_path, trace, report, session),
+                                                       trace),
+                      f"Loading {os.path.basename(file_path)}...",
+                      lambda loaded: self.on_file_loaded(file_path, loaded, trace, index, len(sessions), part),
+                      lambda error: self.on_file_load_failed(error, trace), trace)
+    
+    def add_recent_file(self, file_path, session_index, session_count, part):
+        """记录最近打开的文件（同一文件只保留最近一次）"""
+        self.recent_files = [entry for entry in self.recent_files if entry[0] != file_path]
+        self.recent_files.insert(0, (file_path, session_index, session_count, part))
+        del self.recent_files[RECENT_FILES:]
+    
+    def update_recent_menu(self):
+        """显示菜单前重建最近文件列表，标出仍在数据集缓存中（可立即打开）的文件"""
+        self.recent_menu.clear()
+        for entry in self.recent_files:
+            file_path, session_index, _, part = entry
+            text = os.path.basename(file_path)
+            if session_index >= 0:
+                text += f" (session {session_index + 1})"
+            if self.dataset_cache.contains(file_path, part):
+                text += " - cached"
+            action = self.recent_menu.addAction(text)
+            action.setToolTip(file_path)
+            action.triggered.connect(lambda checked=False, entry=entry: self.open_recent(entry))
+        if not self.recent_files:
+            self.recent_menu.addAction("No recent files").setEnabled(False)
+        self.recent_menu.addSeparator()
+        clear_action = self.recent_menu.addAction("Clear Dataset Cache")
+        clear_action.triggered.connect(self.clear_dataset_cache)
+    
+    def open_recent(self, entry):
+        """重新打开最近的文件：数据集仍在缓存中时直接切换，否则重新加载"""
+        if self.task is not None:
+            self.statusBar().showMessage("Another operation is still running", 3000)
+            return
+        file_path, session_index, session_count, part = entry
+        if not self.dataset_cache.contains(file_path, part):
+            self.open_path(file_path)
+            return
+        trace = self.start_trace('open_file', file=file_path)
+        with trace.stage('dataset_cache') as stage:
+            data = self.dataset_cache.get(file_path, part)
+            stage.update(rows=len(data), cache_hit=True)
+        index = session_index if part is None else -1
+        self.run_task(lambda report: self.prepare_plot(data, trace, index),
+                      f"Loading {os.path.basename(file_path)}...",
+                      lambda loaded: self.on_file_loaded(file_path, loaded, trace, session_index, session_count,
+                                                         part),
+                      lambda error: self.on_file_load_failed(error, trace), trace)
+    
+    def clear_dataset_cache(self):
+        """释放数据集缓存（当前显示的数据不受影响）"""
+        self.dataset_cache.clear()
+        self.update_cache_status()
+    
+    def update_cache_status(self):
+        """在状态栏右侧显示数据集缓存的命中统计"""
+        self.cache_label.setText(self.dataset_cache.describe())
+    
+    def choose_session(self, sessions):
+        """选择要分析的会话，返回会话序号，-1 表示全部会话，取消时返回None"""
+        items = ["All sessions (charge is summed per session)"]
+        items += [f"Session {i + 1}: {session.describe()}" for i, session in enumerate(sessions)]
+        item, ok = QInputDialog.getItem(
+            self, "Select Session",
+            f"This file contains {len(sessions)} monitoring sessions (Append mode).\n"
+            "Select the session to analyze:",
+            items, 0, False)
+        if not ok:
+            return None
+        return items.index(item) - 1
+    
+    def on_file_loaded(self, file_path, loaded, trace, session_index=-1, session_count=1, part=None):
+        """文件加载完成，切换到新数据
+
+        loaded 为 prepare_plot 的结果 (数据, 金字塔)；part 为缓存中只包含所选会话的数据集的字节范围。
+        """
+        data, pyramids = loaded
+        self.follow_action.setChecked(False)
+        with trace.stage('apply_record_data', rows=len(data)):
+            self.apply_record_data(file_path, data, pyramids)
+        if session_count > 1:
+            selected = "all" if session_index < 0 else f"{session_index + 1} selected"
+            self.session_label.setText(f"Sessions: {session_count} ({selected})")
+        self.add_recent_file(file_path, session_index, session_count, part)
+        self.update_cache_status()
+        self.statusBar().showMessage(self.finish_trace(trace))
+        integrity = data.integrity()
+        if integrity.is_clean():
             QMessageBox.information(self, "Success", "File loaded successfully!")
-            
+        else:
+            QMessageBox.information(self, "Success",
+                                    "File loaded successfully!\n\n"
+                                    f"Data integrity: {integrity.describe()}.\n"
+                                    "Charge is summed over the continuous segments.")
+    
+    def toggle_follow(self, checked):
+        """开启或关闭跟踪模式"""
+        if not checked:
+            self.follow_timer.stop()
+            self.follower = None
+            return
+        
+        if self.data is None or self.task is not None:
+            self.follow_action.setChecked(False)
+            if self.data is None:
+                QMessageBox.warning(self, "Warning", "Please open a file first!")
+            return
+        
+        if record_archive.is_archive(self.file_path):
+            self.follow_action.setChecked(False)
+            QMessageBox.warning(self, "Warning", "Archive files cannot be followed!")
+            return
+        
+        # 已完整加载的数据直接沿用，只读取之后追加的行
+        file_path = self.file_path
+        data = self.data
+        self.run_task(lambda report: self.start_follower(file_path, data),
+                      f"Following {os.path.basename(file_path)}...",
+                      self.on_follow_started,
+                      self.on_follow_failed)
+    
+    def start_follower(self, file_path, data):
+        """建立跟踪器并读取到当前的文件末尾（工作线程），返回 (跟踪器, 数据, 金字塔)
+
+        不能沿用已加载的数据时（例如只加载了一个会话）跟踪器从头解析整个文件，因此第一次读取
+        和金字塔都在这里完成，之后每次定时读取只增量更新。
+        """
+        follower = record_core.RecordFollower(file_path, data, current_dtype=CURRENT_DTYPE)
+        follower.poll()
+        data = follower.snapshot()
+        return follower, data, None if data is None else build_pyramids(data)
+    
+    def on_follow_started(self, result):
+        """跟踪器就绪，显示读取到的数据并开始定时读取"""
+        if not self.follow_action.isChecked():
+            return
+        self.follower, data, pyramids = result
+        if data is not None:
+            self.show_followed(data, pyramids, appended=True)
+        self.follow_timer.start()
+    
+    def on_follow_failed(self, error):
+        """跟踪模式出错时停止跟踪"""
+        self.follow_action.setChecked(False)
+        QMessageBox.critical(self, "Error", f"Follow mode stopped: {str(error)}")
+    
+    def poll_follow(self):
+        """读取新追加的行，更新文件信息和全时间范围的电荷量"""
+        if self.follower is None:
+            return
+        try:
+            added = self.follower.poll()
         except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to open file: {str(e)}")
+            self.on_follow_failed(e)
+            return
+        
+        if added:
+            data = self.follower.snapshot()
+            if data is None:
+                return
+            # 文件被截断或替换后（added 为 -1）重新读取的数据与之前无关，金字塔需要重建
+            self.show_followed(data, None, appended=added > 0)
+        self.statusBar().showMessage(
+            f"Following {os.path.basename(self.file_path)} - {len(self.data):,} rows"
+            + (f" (+{added:,})" if added > 0 else ""))
+    
+    def show_followed(self, data, pyramids, appended):
+        """显示跟踪读取的数据；全时间范围时重新计算电荷量"""
+        self.apply_record_data(self.file_path, data, pyramids, appended)
+        if self.full_time_radio.isChecked():
+            self.calculate_charge(traced=False)
+    
+    def on_file_load_failed(self, error, trace=None):
+        """文件加载失败"""
+        if trace is not None:
+            self.finish_trace(trace, error)
+        if isinstance(error, record_core.RecordFileError):
+            QMessageBox.warning(self, error.title, str(error))
+        else:
+            QMessageBox.critical(self, "Error", f"Failed to open file: {str(error)}")
+    
+    def run_task(self, func, label, on_success, on_failure, trace=None):
+        """在后台线程中运行任务，显示进度对话框；trace 为任务所属的追踪，任务取消时结束"""
+        self.progress_dialog = QProgressDialog(label, "Cancel", 0, 1000, self)
+        self.progress_dialog.setWindowTitle("Please Wait")
+        self.progress_dialog.setWindowModality(Qt.WindowModal)
+        self.progress_dialog.setMinimumDuration(0)
+        self.progress_dialog.setAutoClose(False)
+        self.progress_dialog.setAutoReset(False)
+        self.progress_dialog.setValue(0)
+        
+        self.task = BackgroundTask(func, self)
+        self.task_label = label
+        self.task_started = time.perf_counter()
+        self.task.progress.connect(self.on_task_progress)
+        self.task.succeeded.connect(lambda result: self.finish_task(on_success, result))
+        self.task.failed.connect(lambda error: self.finish_task(on_failure, error))
+        self.task.cancelled.connect(lambda: self.finish_task(self.on_task_cancelled, trace))
+        self.progress_dialog.canceled.connect(self.task.cancel)
+        self.task.start()
+    
+    def on_task_cancelled(self, trace):
+        """任务被取消：结束其追踪（--profile 的统计和 --trace-memory 的内存追踪随之结束）"""
+        if trace is not None:
+            self.finish_trace(trace, "cancelled")
+        self.statusBar().showMessage("Operation cancelled", 3000)
+    
+    def on_task_progress(self, done, total, rows):
+        """更新进度：已处理字节和解析速度"""
+        if self.progress_dialog is None:
+            return
+        elapsed = max(time.perf_counter() - self.task_started, 1e-6)
+        self.progress_dialog.setLabelText(
+            f"{self.task_label}\n{done / 1e6:.1f} / {total / 1e6:.1f} MB, "
+            f"{rows:,} rows ({rows / elapsed:,.0f} rows/s)")
+        # 模态进度框的 setValue 会处理事件，放在最后
+        self.progress_dialog.setValue(int(1000 * done / total) if total else 0)
+    
+    def finish_task(self, callback, *args):
+        """后台任务结束：关闭进度对话框并在界面线程中处理结果"""
+        self.progress_dialog.close()
+        self.progress_dialog.deleteLater()
+        self.progress_dialog = None
+        self.task.wait()
+        self.task.deleteLater()
+        self.task = None
+        callback(*args)
+    
+    def closeEvent(self, event):
+        """关闭窗口前停止后台任务"""
+        if self.task is not None:
+            self.task.cancel()
+            self.task.wait()
+        super().closeEvent(event)
     
     def validate_file(self, file_path):
-        """验证文件格式和内容"""
+        """验证文件类型（表头和会话在加载时校验）"""
+        # 检查是否为CSV文件（可以是压缩的）或列式归档文件
+        if not file_path.lower().endswith(record_core.RECORD_SUFFIXES + record_archive.ARCHIVE_SUFFIXES):
+            QMessageBox.warning(self, "Warning",
+                                "Please select a CSV format file (.csv, .csv.gz, .csv.xz or .csv.bz2) "
+                                "or an archive (.parquet, .feather or .arrow)!")
+            return False
+        return True
+    
+    def scan_file(self, file_path, trace, progress=None):
+        """读取会话信息（工作线程）：列缓存有效或只有一个会话时直接返回数据，否则返回会话列表"""
+        with trace.stage('dataset_cache') as stage:
+            data = self.dataset_cache.get(file_path)
+            if data is not None:
+                stage.update(rows=len(data), cache_hit=True)
+        if data is not None:
+            # 整个文件的数据集仍在缓存中
+            return data
+        if record_core.is_compressed(file_path) or record_archive.is_archive(file_path):
+            # 压缩文件只能顺序读取：一遍解压并解析全部会话，再在内存中选择会话；
+            # 归档文件读取很快，同样整体读取
+            return self.load_file_data(file_path, trace, progress)
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 检查是否为CSV文件
-            if not file_path.lower().endswith('.csv'):
-                QMessageBox.warning(self, "Warning", "Please select a CSV format file!")
-                return False
-            
-            # 检查是否包含多个会话（不支持Append模式的文件）
-            session_count = content.count("New dual-channel monitoring session started at")
-            if session_count > 1:
-                QMessageBox.warning(self, "Not Supported", 
-                    "Detected file contains multiple monitoring sessions (Append mode), "
-                    "this type of file is not currently supported.\n"
-                    "Please select a single monitoring session file.")
-                return False
-            
-            # 检查文件头格式
-            lines = content.strip().split('\n')
-            if len(lines) < 3:
-                QMessageBox.warning(self, "Format Error", "File content is incomplete!")
-                return False
-            
-            # 检查表头格式
-            header = lines[0].strip()
-            expected_headers = [
-                "UTC Timestamp, Run Time (Seconds), Channel 1 Current (mA), Channel 2 Current (mA), Channel 1 Integral (mC), Channel 2 Integral (mC)",
-                "UTC Timestamp, Run Time (Seconds), Current (mA), Integral Value (mC)"  # 兼容旧格式
-            ]
-            
-            if not any(header == expected for expected in expected_headers):
-                QMessageBox.warning(self, "Format Error", 
-                    "Incorrect file header format!\n"
-                    f"Current file header: {header}\n"
-                    "Please ensure this is a correct current monitoring record file.")
-                return False
-            
-            return True
-            
+            with trace.stage('scan_file', size=os.path.getsize(file_path)) as stage:
+                key = stat_key(file_path)
+                data = record_cache.load_column_cache(file_path, CURRENT_DTYPE)
+                if data is None:
+                    sessions = record_core.index_sessions(file_path, progress=progress)
+                    stage['rows'] = sum(session.rows for session in sessions)
+                else:
+                    stage.update(rows=len(data), bytes=data.nbytes(), cache_hit=True)
+            if data is not None:
+                self.check_integrity(data, trace)
+                self.dataset_cache.put(file_path, data, file_key=key)
+                return data
+        except (record_core.RecordFileError, record_core.LoadCancelled):
+            raise
         except Exception as e:
-            QMessageBox.critical(self, "Error", f"File validation failed: {str(e)}")
-            return False
+            raise Exception(f"Data loading failed: {str(e)}")
+        
+        if len(sessions) == 1:
+            return self.load_file_data(file_path, trace, progress)
+        return sessions
     
-    def load_file_data(self, file_path):
-        """加载文件数据"""
+    def load_file_data(self, file_path, trace, progress=None, session=None):
+        """加载文件数据（可在工作线程中调用，不修改界面状态）
+
+        session 为None时加载整个文件，否则只解析该会话的字节范围。各步骤耗时记录在 trace 中。
+        加载的数据集（含完整性扫描结果）保存在数据集缓存中。
+        """
+        part = None if session is None else (session.byte_offset, session.byte_end)
+        if part is not None:
+            # 整个文件已在 scan_file 中查找过，这里只查找所选会话
+            with trace.stage('dataset_cache') as stage:
+                data = self.dataset_cache.get(file_path, part)
+                if data is not None:
+                    stage.update(rows=len(data), cache_hit=True)
+            if data is not None:
+                return data
         try:
-            # 读取CSV文件
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            # 过滤掉注释行
-            data_lines = []
-            for line in lines:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    data_lines.append(line)
-            
-            # 解析数据
-            if len(data_lines) < 2:
-                raise ValueError("Insufficient data rows in file")
-            
-            # 检查是否为双通道格式
-            header = data_lines[0]
-            is_dual_channel = "Channel 1" in header and "Channel 2" in header
-            
-            # 解析数据行
-            data_rows = []
-            for line in data_lines[1:]:
-                parts = [part.strip() for part in line.split(',')]
-                if is_dual_channel and len(parts) >= 6:
-                    # 双通道格式: UTC, Runtime, Ch1_Current, Ch2_Current, Ch1_Integral, Ch2_Integral
-                    data_rows.append({
-                        'utc_timestamp': float(parts[0]),
-                        'runtime': float(parts[1]),
-                        'ch1_current': float(parts[2]),
-                        'ch2_current': float(parts[3]),
-                        'ch1_integral': float(parts[4]),
-                        'ch2_integral': float(parts[5])
-                    })
-                elif not is_dual_channel and len(parts) >= 4:
-                    # 单通道格式: UTC, Runtime, Current, Integral
-                    data_rows.append({
-                        'utc_timestamp': float(parts[0]),
-                        'runtime': float(parts[1]),
-                        'ch1_current': float(parts[2]),
-                        'ch2_current': 0.0,  # 单通道时设为0
-                        'ch1_integral': float(parts[3]),
-                        'ch2_integral': 0.0   # 单通道时设为0
-                    })
-            
-            if not data_rows:
-                raise ValueError("No valid data rows found in file")
-            
-            # 转换为DataFrame
-            self.data = pd.DataFrame(data_rows)
-            self.is_dual_channel = is_dual_channel
-            
-            # 计算文件信息
-            self.start_utc = self.data['utc_timestamp'].iloc[0]
-            self.end_utc = self.data['utc_timestamp'].iloc[-1]
-            self.total_runtime = self.data['runtime'].iloc[-1]
-            
+            key = stat_key(file_path)
+            with trace.stage('load_file_data') as stage:
+                timings = stage['parts'] = {}
+                if record_archive.is_archive(file_path):
+                    stage['bytes'] = os.path.getsize(file_path)
+                    data = record_archive.load_archive(file_path, CURRENT_DTYPE)
+                elif session is None:
+                    stage['bytes'] = os.path.getsize(file_path)
+                    data = record_cache.load_record_cached(file_path, progress=progress,
+                                                           current_dtype=CURRENT_DTYPE, timings=timings)
+                else:
+                    stage['bytes'] = session.byte_end - session.byte_offset
+                    data = record_core.load_record(file_path, progress=progress,
+                                                   byte_range=(session.byte_offset, session.byte_end),
+                                                   current_dtype=CURRENT_DTYPE, timings=timings)
+                stage['rows'] = len(data)
+            self.check_integrity(data, trace)
+            self.dataset_cache.put(file_path, data, part, key)
+            return data
+        except (record_core.RecordFileError, record_core.LoadCancelled):
+            raise
         except Exception as e:
             raise Exception(f"Data loading failed: {str(e)}")
     
+    def prepare_plot(self, data, trace, session_index=-1):
+        """取出所选会话（session_index >= 0 时 data 包含全部会话）并建立电流曲线的金字塔（工作线程）
+
+        返回 (数据, 金字塔) 交给 on_file_loaded，界面线程中只需切换数据。
+        """
+        if session_index >= 0:
+            with trace.stage('select_session') as stage:
+                data = data.select_session(session_index)
+                stage['rows'] = len(data)
+            self.check_integrity(data, trace)
+        with trace.stage('build_pyramids', rows=len(data)):
+            pyramids = build_pyramids(data)
+        return data, pyramids
+    
+    def check_integrity(self, data, trace):
+        """扫描数据完整性（工作线程），结果缓存在数据中供查询和界面使用"""
+        with trace.stage('scan_integrity', rows=len(data)):
+            data.integrity()
+        return data
+    
+    def start_trace(self, operation, **info):
+        """开始追踪一次操作；--profile 指定的操作只在下一次运行时启用 cProfile"""
+        profile = operation == self.profile_operation
+        if profile:
+            self.profile_operation = None
+        return OperationTrace(operation, self.trace_memory, profile, **info)
+    
+    def finish_trace(self, trace, error=None):
+        """结束追踪：保存 cProfile 统计并追加JSON追踪记录，返回状态栏摘要"""
+        trace.finish(error)
+        try:
+            if trace.profiler is not None:
+                trace.dump_profile(os.path.abspath(
+                    f"{trace.operation}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.prof"))
+            if self.trace_path:
+                append_trace(self.trace_path, trace)
+        except OSError as e:
+            return f"{trace.summary()} - failed to write trace: {e}"
+        return trace.summary()
+    
+    def apply_record_data(self, file_path, data, pyramids=None, appended=False):
+        """一次性切换到新加载的数据并更新界面
+
+        pyramids 为工作线程中建好的电流曲线金字塔；appended 表示跟踪模式下同一文件追加了新行。
+        """
+        self.data = data
+        self.is_dual_channel = data.is_dual_channel
+        self.file_path = file_path
+        
+        # 计算文件信息
+        self.start_utc = float(data['utc_timestamp'][0])
+        self.end_utc = float(data['utc_timestamp'][-1])
+        self.total_runtime = data.total_runtime()
+        
+        # 更新界面
+        self.session_label.setText(f"Sessions: {len(data.sessions)}")
+        self.file_path_label.setText(os.path.basename(file_path))
+        self.file_path_label.setToolTip(file_path)
+        
+        # 显示文件信息、完整性摘要和电流曲线
+        self.update_file_info()
+        self.update_integrity_info()
+        self.current_plot.set_data(data, pyramids, appended)
+        if not appended:
+            self.schedule_charge_preview()
+        
+        # 启用计算按钮
+        self.calculate_btn.setEnabled(True)
+    
     def update_file_info(self):
         """更新文件信息显示"""
         if self.data is None:
@@ -507,38 +953,52 @@ class CurrentRecordAnalyzer(QMainWindow):
         self.end_time_label.setText(f"End Time: {end_str}")
         self.total_runtime_label.setText(f"Total Runtime: {runtime_str}")
     
-    def calculate_charge(self):
-        """计算电荷量"""
+    def update_integrity_info(self):
+        """显示完整性扫描摘要，提示框中列出各类异常的位置"""
+        integrity = self.data.integrity()
+        self.integrity_label.setText(f"Integrity: {integrity.describe()}")
+        self.integrity_label.setStyleSheet("" if integrity.is_clean() else "color: #D84315;")
+        lines = []
+        labels = {'gaps': "Gap", 'backward_steps': "Backward time step",
+                  'duplicate_timestamps': "Duplicate timestamp", 'integral_resets': "Integral reset"}
+        for name, info in integrity.summary().items():
+            if not isinstance(info, dict):
+                continue
+            for example in info['examples']:
+                when = datetime.fromtimestamp(example['utc']).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+                extra = f" ({example['seconds']:.1f} s)" if 'seconds' in example else ""
+                lines.append(f"{labels[name]} at row {example['row'] + 1:,}, {when}{extra}")
+            if info['count'] > len(info['examples']):
+                lines.append(f"... {info['count'] - len(info['examples']):,} more {labels[name].lower()}s")
+        self.integrity_label.setToolTip("\n".join(lines))
+    
+    def calculate_charge(self, traced=True):
+        """计算电荷量；traced 为False时（跟踪模式的自动刷新）只计时，不写追踪记录"""
         if self.data is None:
             QMessageBox.warning(self, "Warning", "Please open a file first!")
             return
         
+        if traced:
+            trace = self.start_trace('calculate_charge', file=self.file_path)
+            finish_trace = self.finish_trace
+        else:
+            trace = OperationTrace('calculate_charge')
+            finish_trace = OperationTrace.finish
         try:
             # 确定时间范围
-            if self.full_time_radio.isChecked():
-                start_utc = self.start_utc
-                end_utc = self.end_utc
-            else:
-                # 自定义时间范围
-                start_utc = self.get_custom_time('start')
-                end_utc = self.get_custom_time('end')
-                
-                if start_utc is None or end_utc is None:
-                    QMessageBox.warning(self, "Warning", "Please enter valid start and end times!")
-                    return
-                
-                if start_utc >= end_utc:
-                    QMessageBox.warning(self, "Warning", "Start time must be less than end time!")
-                    return
+            with trace.stage('parse_inputs'):
+                time_range = self.get_time_range()
+            if time_range is None:
+                # 时间范围无效时也结束追踪，否则 --profile 指定的追踪被占用而不会保存
+                finish_trace(trace)
+                return
+            start_utc, end_utc = time_range
             
             # 计算电荷量
-            ch1_start_integral = self.interpolate_integral(start_utc, 'ch1_integral')
-            ch1_end_integral = self.interpolate_integral(end_utc, 'ch1_integral')
-            ch2_start_integral = self.interpolate_integral(start_utc, 'ch2_integral')
-            ch2_end_integral = self.interpolate_integral(end_utc, 'ch2_integral')
-            
-            ch1_total_charge = ch1_end_integral - ch1_start_integral
-            ch2_total_charge = ch2_end_integral - ch2_start_integral
+            with trace.stage('query_window_charges', rows=len(self.data)):
+                ch1_total_charge, ch2_total_charge = record_core.query_window_charges(self.data, start_utc,
+                                                                                      end_utc)
+            finish_trace(trace)
 
             # 显示结果到对应的文本框
             self.ch1_result_text.setText(f"{ch1_total_charge:.6f}")
@@ -551,12 +1011,269 @@ class CurrentRecordAnalyzer(QMainWindow):
 
             # 如果需要，可以在状态栏显示计算信息
             status_message = (f"Calculation completed - Time range: {start_dt.strftime('%H:%M:%S')} to "
-                         f"{end_dt.strftime('%H:%M:%S')} (duration {duration:.1f}s)")
+                         f"{end_dt.strftime('%H:%M:%S')} (duration {duration:.1f}s) "
+                         f"in {format_seconds(trace.totals()[0])}")
             self.statusBar().showMessage(status_message, 5000)  # 显示5秒   
 
         except Exception as e:
+            finish_trace(trace, e)
             QMessageBox.critical(self, "Error", f"Calculation failed: {str(e)}")
     
+    def calculate_batch_windows(self):
+        """批量计算窗口文件中所有时间窗口的电荷量"""
+        if self.data is None:
+            QMessageBox.warning(self, "Warning", "Please open a file first!")
+            return
+        if self.task is not None:
+            self.statusBar().showMessage("Another operation is still running", 3000)
+            return
+        
+        windows_path, _ = QFileDialog.getOpenFileName(
+            self, "Select Time Window List", "", "Window Files (*.csv *.json);;All Files (*)"
+        )
+        if not windows_path:
+            return
+        
+        data = self.data
+        record_start_utc = self.start_utc
+        
+        def compute(report):
+            # 解析窗口并一次性向量化计算
+            started = time.perf_counter()
+            table = record_core.read_window_file(windows_path)
+            start_utc = record_core.resolve_window_times(table, 'start', record_start_utc)
+            end_utc = record_core.resolve_window_times(table, 'end', record_start_utc)
+            invalid = np.flatnonzero(start_utc >= end_utc)
+            if len(invalid):
+                raise ValueError(f"Window {invalid[0] + 1}: start time must be less than end time!")
+            ch1_charge, ch2_charge = record_core.query_window_charges(data, start_utc, end_utc)
+            labels = [label or str(i + 1)
+                      for i, label in enumerate(table.get('label', [''] * len(start_utc)))]
+            return labels, start_utc, end_utc, ch1_charge, ch2_charge, time.perf_counter() - started
+        
+        self.run_task(compute, "Calculating batch windows...", self.on_batch_windows_done,
+                      lambda e: QMessageBox.critical(self, "Error", f"Batch calculation failed: {str(e)}"))
+    
+    def on_batch_windows_done(self, result):
+        """保存批量窗口计算结果"""
+        labels, start_utc, end_utc, ch1_charge, ch2_charge, elapsed = result
+        default_path = record_core.record_stem(self.file_path) + "_windows.csv"
+        result_path, _ = QFileDialog.getSaveFileName(
+            self, "Save Batch Results", default_path, "CSV Files (*.csv);;JSON Files (*.json)"
+        )
+        if not result_path:
+            return
+        
+        try:
+            record_core.write_window_results(result_path, labels, start_utc, end_utc, ch1_charge, ch2_charge)
+            self.statusBar().showMessage(
+                f"Batch calculation completed - {len(start_utc)} windows in {elapsed:.3f}s", 5000)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Batch calculation failed: {str(e)}")
+    
+    def get_time_range(self, warn=True):
+        """所选的时间范围 (开始UTC, 结束UTC)；自定义时间无效时返回None，warn 时弹出提示"""
+        if self.full_time_radio.isChecked():
+            return self.start_utc, self.end_utc
+        
+        # 自定义时间范围
+        start_utc = self.get_custom_time('start')
+        end_utc = self.get_custom_time('end')
+        
+        if start_utc is None or end_utc is None:
+            if warn:
+                QMessageBox.warning(self, "Warning", "Please enter valid start and end times!")
+            return None
+        
+        if start_utc >= end_utc:
+            if warn:
+                QMessageBox.warning(self, "Warning", "Start time must be less than end time!")
+            return None
+        return start_utc, end_utc
+    
+    def calculate_bins(self):
+        """按时间分箱统计所选时间范围内两个通道的电流和电荷量"""
+        if self.data is None:
+            QMessageBox.warning(self, "Warning", "Please open a file first!")
+            return
+        if self.task is not None:
+            self.statusBar().showMessage("Another operation is still running", 3000)
+            return
+        
+        time_range = self.get_time_range()
+        if time_range is None:
+            return
+        text, ok = QInputDialog.getText(self, "Aggregate Bins",
+                                        "Bin width (seconds, or e.g. 10s, 1min, 1h, 1d):",
+                                        text=self.bin_width_text)
+        if not ok:
+            return
+        try:
+            bin_width = record_aggregate.parse_duration(text)
+        except ValueError as e:
+            QMessageBox.warning(self, "Warning", str(e))
+            return
+        self.bin_width_text = text.strip()
+        
+        data = self.data
+        start_utc, end_utc = time_range
+        
+        def compute(report):
+            started = time.perf_counter()
+            table = record_aggregate.aggregate_bins(data, bin_width, start_utc, end_utc)
+            return table, time.perf_counter() - started
+        
+        self.run_task(compute, "Aggregating bins...", self.on_bins_done,
+                      lambda e: QMessageBox.critical(self, "Error", f"Aggregation failed: {str(e)}"))
+    
+    def on_bins_done(self, result):
+        """保存分箱统计结果"""
+        table, elapsed = result
+        default_path = record_core.record_stem(self.file_path) + "_bins.csv"
+        result_path, _ = QFileDialog.getSaveFileName(
+            self, "Save Bin Statistics", default_path, "CSV Files (*.csv);;JSON Files (*.json)"
+        )
+        if not result_path:
+            return
+        
+        try:
+            record_aggregate.write_bin_results(result_path, table)
+            self.statusBar().showMessage(
+                f"Aggregation completed - {len(table['rows'])} bins in {elapsed:.3f}s", 5000)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Aggregation failed: {str(e)}")
+    
+    def ask_beam_settings(self):
+        """束流检测设置对话框，返回 detect_beam_on 的参数字典，取消或输入无效时返回None"""
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Detect Beam-On Periods")
+        form = QtWidgets.QFormLayout()
+        
+        channel_combo = QtWidgets.QComboBox()
+        channel_combo.addItem("CH1", 'ch1')
+        if self.data.is_dual_channel:
+            channel_combo.addItem("CH2", 'ch2')
+        channel_combo.setCurrentIndex(max(channel_combo.findData(self.beam_settings['channel']), 0))
+        form.addRow("Channel:", channel_combo)
+        
+        inputs = {}
+        for key, label, placeholder in (('threshold', "Threshold (mA):", "beam on at or above"),
+                                        ('release', "Release level (mA):", "default: threshold"),
+                                        ('merge_gap', "Merge gaps up to:", "e.g. 10s"),
+                                        ('min_duration', "Minimum duration:", "e.g. 1min")):
+            inputs[key] = QLineEdit(self.beam_settings[key])
+            inputs[key].setPlaceholderText(placeholder)
+            form.addRow(label, inputs[key])
+        
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout = QVBoxLayout()
+        layout.addLayout(form)
+        layout.addWidget(buttons)
+        dialog.setLayout(layout)
+        if dialog.exec_() != QDialog.Accepted:
+            return None
+        
+        texts = {key: line_edit.text().strip() for key, line_edit in inputs.items()}
+        self.beam_settings.update(texts, channel=channel_combo.currentData())
+        
+        def duration(text):
+            # 空白或0表示不合并、不限制时长
+            return 0.0 if text in ("", "0") else record_aggregate.parse_duration(text)
+        
+        try:
+            return {'threshold': float(texts['threshold']),
+                    'channel': channel_combo.currentData(),
+                    'release': float(texts['release']) if texts['release'] else None,
+                    'merge_gap': duration(texts['merge_gap']),
+                    'min_duration': duration(texts['min_duration'])}
+        except ValueError as e:
+            QMessageBox.warning(self, "Warning", f"Invalid beam detection setting: {str(e)}")
+            return None
+    
+    def detect_beam_periods(self):
+        """检测所选时间范围内束流开启的时段，计算每个时段两个通道的电荷量"""
+        if self.data is None:
+            QMessageBox.warning(self, "Warning", "Please open a file first!")
+            return
+        if self.task is not None:
+            self.statusBar().showMessage("Another operation is still running", 3000)
+            return
+        
+        time_range = self.get_time_range()
+        if time_range is None:
+            return
+        settings = self.ask_beam_settings()
+        if settings is None:
+            return
+        
+        data = self.data
+        start_utc, end_utc = time_range
+        
+        def compute(report):
+            started = time.perf_counter()
+            table = record_beam.detect_beam_on(data, start_utc=start_utc, end_utc=end_utc, **settings)
+            return table, time.perf_counter() - started
+        
+        self.run_task(compute, "Detecting beam-on periods...", self.on_beam_periods_done,
+                      lambda e: QMessageBox.critical(self, "Error", f"Beam detection failed: {str(e)}"))
+    
+    def on_beam_periods_done(self, result):
+        """保存束流开启时段及其电荷量"""
+        table, elapsed = result
+        count = len(table['start_utc'])
+        summary = (f"{count} beam-on periods, {table['duration'].sum():.1f}s in total, "
+                   f"CH1 {table['ch1_charge'].sum():.6f} mC, CH2 {table['ch2_charge'].sum():.6f} mC")
+        if not count:
+            QMessageBox.information(self, "Beam-On Periods", "No beam-on periods found in the selected time range.")
+            return
+        default_path = record_core.record_stem(self.file_path) + "_beam.csv"
+        result_path, _ = QFileDialog.getSaveFileName(
+            self, "Save Beam-On Periods", default_path, "CSV Files (*.csv);;JSON Files (*.json)"
+        )
+        if not result_path:
+            return
+        
+        try:
+            record_core.write_window_results(result_path, record_beam.beam_labels(table), table['start_utc'],
+                                             table['end_utc'], table['ch1_charge'], table['ch2_charge'])
+            self.statusBar().showMessage(f"Beam detection completed - {summary} ({elapsed:.3f}s)", 10000)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Beam detection failed: {str(e)}")
+    
+    def export_archive(self):
+        """将当前加载的数据（含通道布局和会话）导出为 Parquet/Feather 归档文件"""
+        if self.data is None:
+            QMessageBox.warning(self, "Warning", "Please open a file first!")
+            return
+        if self.task is not None:
+            self.statusBar().showMessage("Another operation is still running", 3000)
+            return
+        
+        default_path = record_core.record_stem(self.file_path) + ".parquet"
+        archive_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Archive", default_path,
+            "Parquet Files (*.parquet);;Feather Files (*.feather *.arrow)"
+        )
+        if not archive_path:
+            return
+        if not record_archive.is_archive(archive_path):
+            archive_path += ".parquet"
+        
+        data = self.data
+        source = os.path.basename(self.file_path)
+        
+        def export(report):
+            started = time.perf_counter()
+            record_archive.export_record(data, archive_path, source=source, progress=report)
+            return time.perf_counter() - started
+        
+        self.run_task(export, f"Exporting {os.path.basename(archive_path)}...",
+                      lambda elapsed: self.statusBar().showMessage(
+                          f"Exported {len(data):,} rows to {archive_path} in {elapsed:.2f}s", 5000),
+                      lambda e: QMessageBox.critical(self, "Error", f"Export failed: {str(e)}"))
+    
     def get_custom_time(self, position):
         """获取自定义时间"""
         try:
@@ -585,37 +1302,6 @@ class CurrentRecordAnalyzer(QMainWindow):
         except (ValueError, TypeError):
             return None
     
-    def interpolate_integral(self, target_utc, column):
-        """插值计算指定时间点的积分值"""
-        # 查找最接近的两个数据点
-        data_utc = self.data['utc_timestamp'].values
-        data_integral = self.data[column].values
-        
-        # 如果目标时间在数据范围外，使用边界值
-        if target_utc <= data_utc[0]:
-            return data_integral[0]
-        if target_utc >= data_utc[-1]:
-            return data_integral[-1]
-        
-        # 查找插值点
-        for i in range(len(data_utc) - 1):
-            if data_utc[i] <= target_utc <= data_utc[i + 1]:
-                # 线性插值
-                t1, t2 = data_utc[i], data_utc[i + 1]
-                v1, v2 = data_integral[i], data_integral[i + 1]
-                
-                # 避免除零
-                if t2 == t1:
-                    return v1
-                
-                # 线性插值公式
-                interpolated_value = v1 + (v2 - v1) * (target_utc - t1) / (t2 - t1)
-                return interpolated_value
-        
-        # 如果没有找到合适的区间，返回最接近的值
-        idx = np.argmin(np.abs(data_utc - target_utc))
-        return data_integral[idx]
-    
     def show_about(self):
         """显示关于对话框"""
         about_dialog = QDialog(self)
@@ -765,26 +1451,23 @@ class CurrentRecordAnalyzer(QMainWindow):
             </body>
             </html>
             """
-        
-        text_browser.setHtml(tutorial_html)
-        
-        close_button = QPushButton("Close")
-        close_button.clicked.connect(tutorial_dialog.accept)
-        close_button.setStyleSheet("background-color: #4CAF50; color: white; font-weight: bold; padding: 8px;")
-        
-        layout.addWidget(text_browser)
-        
-        button_layout = QHBoxLayout()
-        button_layout.addStretch()
-        button_layout.addWidget(close_button)
-        button_layout.addStretch()
-        
-        layout.addLayout(button_layout)
-        tutorial_dialog.setLayout(layout)
-        tutorial_dialog.exec_()
 
 def main():
-    app = QApplication(sys.argv)
+    # 性能追踪和调试选项，其余参数交给Qt
+    parser = argparse.ArgumentParser(description="Current Record File Analyzer")
+    parser.add_argument('--trace', metavar='FILE',
+                        help="append a JSON trace of every operation to FILE (one JSON object per line)")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="record the peak memory allocation of each stage (slows down loading)")
+    parser.add_argument('--profile', choices=TRACED_OPERATIONS,
+                        help="capture a cProfile of the next run of this operation (saved as <operation>-<time>.prof)")
+    parser.add_argument('--cache-mb', type=float, default=DATASET_CACHE_MB,
+                        help=f"memory budget of the in-process dataset cache in MB (default {DATASET_CACHE_MB})")
+    args, qt_args = parser.parse_known_args()
+    if args.trace_memory:
+        tracemalloc.start()
+    
+    app = QApplication(sys.argv[:1] + qt_args)
     
     # 设置应用程序信息
     app.setApplicationName("Current Record File Analyzer")
@@ -798,9 +1481,12 @@ def main():
         app.setWindowIcon(icon)
     
     # 创建并显示主窗口
-    window = CurrentRecordAnalyzer()
+    window = CurrentRecordAnalyzer(args.trace, args.trace_memory, args.profile, args.cache_mb)
     window.show()
     
+    # 窗口显示后在后台导入 numpy 和分析模块，打开第一个文件时不必再等待
+    QtCore.QTimer.singleShot(0, lambda: preload(PRELOAD_MODULES))
+    
     # 运行应用程序
     sys.exit(app.exec_())
 
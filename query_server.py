@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 本地查询服务
+# 在本机提供HTTP/JSON查询接口（窗口电荷量、文件摘要、分箱统计）。所有请求共用一个已加载/已索引的
+# 数据集池，并发请求各由一个线程处理，一个请求中可以批量提交多个窗口或多个查询，例如：
+#   python query_server.py --root /data/campaign --port 8765
+#   curl -s localhost:8765/charge -d '{"file": "run.csv", "start_time": "20250727 15:41:15", "end_runtime": 600}'
+#   curl -s localhost:8765/charge -d '{"file": "run.csv", "windows": [{"start_runtime": 0, "end_runtime": 60}]}'
+#   curl -s localhost:8765/batch -d '{"queries": [{"op": "summary", "file": "run.csv"}, {"op": "aggregate", "file": "run.csv", "bin": "1h"}]}'
+
+import os
+import sys
+import json
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from record_core import RecordFileError, query_window_charges, resolve_window_times, window_table
+from record_cache import load_record_cached
+from record_index import open_time_index
+from record_archive import RecordArchive, is_archive, load_archive
+from record_aggregate import aggregate_bins, bin_result_columns, parse_duration
+from record_pool import DATASET_CACHE_MB, DatasetCache, stat_key
+from analyze import summarize
+
+DEFAULT_PORT = 8765
+MAX_REQUEST_BYTES = 16 * 1024 * 1024    # 请求体的最大字节数
+WINDOW_KEYS = ('label', 'start_utc', 'start_time', 'start_runtime', 'end_utc', 'end_time', 'end_runtime')
+
+
+class QueryError(Exception):
+    """无法处理的请求，status 为HTTP状态码"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class DatasetPool:
+    """所有请求共用的数据集池
+
+    完整加载的数据集（含完整性扫描结果）保存在 DatasetCache 中；稀疏时间索引（归档文件为其行组
+    统计）另外保存，文件变化后重新建立。同一文件同时被多个请求加载时只加载一次。
+    文件路径相对于 root，且不能指向 root 之外。
+    """
+
+    def __init__(self, root, budget_bytes=DATASET_CACHE_MB * 1000 * 1000):
+        self.root = os.path.realpath(root)
+        self.cache = DatasetCache(budget_bytes)
+        self.indexes = {}               # 路径 -> (文件校验信息, TimeIndex 或 RecordArchive)
+        self.sessions = {}              # (路径, 会话序号) -> (完整数据集, 该会话的数据集)
+        self.file_locks = {}            # 路径 -> 该文件的加载锁
+        self.lock = threading.Lock()
+
+    def resolve(self, file_path):
+        """将请求中的文件路径转换为 root 内的绝对路径"""
+        if not isinstance(file_path, str) or not file_path:
+            raise QueryError(400, "Missing 'file'")
+        path = os.path.realpath(os.path.join(self.root, file_path))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise QueryError(403, f"File is outside the served directory: {file_path}")
+        if not os.path.isfile(path):
+            raise QueryError(404, f"File not found: {file_path}")
+        return path
+
+    def file_lock(self, path):
+        with self.lock:
+            return self.file_locks.setdefault(path, threading.Lock())
+
+    def load(self, path):
+        """完整加载的数据集（共享，只读）"""
+        data = self.cache.get(path)
+        if data is not None:
+            return data
+        with self.file_lock(path):
+            # 等待期间其他请求可能已加载完成
+            data = self.cache.get(path)
+            if data is not None:
+                return data
+            key = stat_key(path)
+            data = load_archive(path) if is_archive(path) else load_record_cached(path)
+            data.integrity()
+            self.cache.put(path, data, file_key=key)
+            return data
+
+    def load_session(self, path, index):
+        """完整数据集中第 index 个会话的数据集（切片视图）
+
+        会话的完整性扫描结果随数据集一起保存，同一会话的请求不再重复扫描。完整数据集重新加载
+        （文件变化）或被淘汰后，其会话的数据集随之丢弃。
+        """
+        data = self.load(path)
+        with self.file_lock(path):
+            with self.lock:
+                entry = self.sessions.get((path, index))
+            if entry is not None and entry[0] is data:
+                return entry[1]
+            selected = data.select_session(index)
+            selected.integrity()
+            with self.lock:
+                paths = {other for other, _ in self.sessions if other != path}
+            # 其他文件只保留完整数据集仍在缓存中的会话，本文件只保留当前数据集的会话
+            stale = {other for other in paths if not self.cache.contains(other)}
+            with self.lock:
+                self.sessions = {key: value for key, value in self.sessions.items()
+                                 if key[0] not in stale and (key[0] != path or value[0] is data)}
+                self.sessions[(path, index)] = (data, selected)
+            return selected
+
+    def index(self, path):
+        """稀疏时间索引，归档文件直接按行组读取"""
+        key = stat_key(path)
+        with self.file_lock(path):
+            entry = self.indexes.get(path)
+            if entry is None or entry[0] != key:
+                entry = (key, RecordArchive(path) if is_archive(path) else open_time_index(path))
+                self.indexes[path] = entry
+            return entry[1]
+
+    def stats(self):
+        return {'datasets': self.cache.stats(), 'sessions': len(self.sessions), 'indexes': len(self.indexes)}
+
+
+def _session_number(query, sessions):
+    """query 中的 session（从1开始），未指定时为None"""
+    session = query.get('session')
+    if session is None:
+        return None
+    if not isinstance(session, int) or not 1 <= session <= len(sessions):
+        raise QueryError(400, f"Session {session} does not exist (file contains {len(sessions)} sessions)")
+    return session
+
+
+def open_dataset(pool, query):
+    """打开查询的文件，返回 (数据, 扫描函数, 会话列表)
+
+    完整加载时扫描函数为None；"index": true 时不加载，数据为None，由扫描函数只读取插值所需的行。
+    """
+    path = pool.resolve(query.get('file'))
+    if query.get('index'):
+        index = pool.index(path)
+        session = _session_number(query, index.sessions)
+        selected = None if session is None else session - 1
+
+        def scan(targets):
+            with pool.file_lock(path):
+                return index.scan(targets, selected)
+        return None, scan, index.sessions if session is None else [index.sessions[selected]]
+
+    data = pool.load(path)
+    session = _session_number(query, data.sessions)
+    if session is not None:
+        data = pool.load_session(path, session - 1)
+    return data, None, data.sessions
+
+
+def resolve_windows(windows, sessions):
+    """将窗口字典列表转换为 (标签, 开始UTC数组, 结束UTC数组)；未指定的边界为文件的开始/结束时间"""
+    if not isinstance(windows, list) or not windows or not all(isinstance(w, dict) for w in windows):
+        raise QueryError(400, "'windows' must be a non-empty list of objects")
+    first_utc, last_utc = sessions[0].first_utc, sessions[-1].last_utc
+    rows = []
+    for window in windows:
+        row = {key: window[key] for key in WINDOW_KEYS if window.get(key) not in (None, '')}
+        for position, default in (('start', first_utc), ('end', last_utc)):
+            if not any(key.startswith(position) for key in row):
+                row[f'{position}_utc'] = default
+        rows.append(row)
+    table = window_table(rows)
+    start_utc = resolve_window_times(table, 'start', first_utc)
+    end_utc = resolve_window_times(table, 'end', first_utc)
+    invalid = (start_utc >= end_utc).nonzero()[0]
+    if len(invalid):
+        raise ValueError(f"Window {invalid[0] + 1}: start time must be less than end time")
+    labels = [row.get('label') or str(i + 1) for i, row in enumerate(rows)]
+    return labels, start_utc, end_utc
+
+
+def charge_query(pool, query):
+    """窗口电荷量；"windows" 为窗口列表时批量计算，否则窗口边界直接写在查询中"""
+    data, scan, sessions = open_dataset(pool, query)
+    batched = 'windows' in query
+    labels, start_utc, end_utc = resolve_windows(query['windows'] if batched else [query], sessions)
+    if data is None:
+        data, _ = scan(np.concatenate((start_utc, end_utc)))
+    ch1_charge, ch2_charge = query_window_charges(data, start_utc, end_utc)
+    results = [{'label': label, 'start_utc': start, 'end_utc': end, 'duration': end - start,
+                'ch1_charge': ch1, 'ch2_charge': ch2}
+               for label, start, end, ch1, ch2 in zip(labels, start_utc.tolist(), end_utc.tolist(),
+                                                      ch1_charge.tolist(), ch2_charge.tolist())]
+    if batched:
+        return {'file': query['file'], 'windows': results}
+    result = results[0]
+    del result['label']
+    result['file'] = query['file']
+    return result
+
+
+def summary_query(pool, query):
+    """文件摘要（与 analyze.py --json 相同；使用索引时不含完整性扫描）"""
+    data, scan, sessions = open_dataset(pool, query)
+    if data is None:
+        data, sessions = scan([])
+        return summarize(query['file'], data, sessions)
+    return summarize(query['file'], data)
+
+
+def aggregate_query(pool, query):
+    """分箱统计："bin" 为箱宽（秒数或带单位，如 "1min"），可用窗口边界限定范围"""
+    if query.get('index'):
+        raise QueryError(400, "Aggregation needs the loaded data and cannot use the index")
+    if query.get('bin') is None:
+        raise QueryError(400, "Missing 'bin'")
+    bin_width = parse_duration(str(query['bin']))
+    data, _, sessions = open_dataset(pool, query)
+    _, start_utc, end_utc = resolve_windows([query], sessions)
+    table = aggregate_bins(data, bin_width, start_utc[0], end_utc[0])
+    keys = [key for key, _, _ in bin_result_columns(table)]
+    values = [table[key].tolist() for key in keys]
+    bins = [{key: None if value != value else value for key, value in zip(keys, row)} for row in zip(*values)]
+    return {'file': query['file'], 'bin_width': bin_width, 'bins': bins}
+
+
+QUERIES = {'charge': charge_query, 'summary': summary_query, 'aggregate': aggregate_query}
+
+
+def error_result(error):
+    """异常对应的 (HTTP状态码, 错误信息)"""
+    if isinstance(error, QueryError):
+        return error.status, str(error)
+    if isinstance(error, RecordFileError):
+        return 422, f"{error.title}: {error}"
+    if isinstance(error, (ValueError, KeyError, TypeError)):
+        return 400, str(error)
+    return 500, f"{type(error).__name__}: {error}"
+
+
+def batch_query(pool, request):
+    """批量查询："queries" 中每一项带 "op"，各项独立执行，出错的项返回 {"error": ...}"""
+    queries = request.get('queries')
+    if not isinstance(queries, list):
+        raise QueryError(400, "'queries' must be a list")
+    results = []
+    for query in queries:
+        try:
+            if not isinstance(query, dict) or query.get('op') not in QUERIES:
+                raise QueryError(400, f"Unknown op, expected one of: {', '.join(QUERIES)}")
+            results.append(QUERIES[query['op']](pool, query))
+        except Exception as e:
+            status, message = error_result(e)
+            results.append({'error': message, 'status': status})
+    return {'results': results}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """GET /health；POST /charge、/summary、/aggregate、/batch，请求和响应均为JSON"""
+
+    server_version = "CurrentRecordQuery/1.0"
+
+    def send_json(self, status, result):
+        body = json.dumps(result).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlsplit(self.path).path.rstrip('/') == '/health':
+            self.send_json(200, {'status': 'ok', **self.server.pool.stats()})
+        else:
+            self.send_json(404, {'error': "Unknown endpoint, use GET /health or POST /charge, /summary, "
+                                          "/aggregate or /batch"})
+
+    def do_POST(self):
+        op = urlsplit(self.path).path.strip('/')
+        try:
+            if op != 'batch' and op not in QUERIES:
+                raise QueryError(404, f"Unknown endpoint: /{op}")
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > MAX_REQUEST_BYTES:
+                raise QueryError(413, "Request too large")
+            try:
+                request = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                raise QueryError(400, "Request body is not valid JSON") from None
+            if not isinstance(request, dict):
+                raise QueryError(400, "Request body must be a JSON object")
+            pool = self.server.pool
+            result = batch_query(pool, request) if op == 'batch' else QUERIES[op](pool, request)
+        except Exception as e:
+            status, message = error_result(e)
+            self.send_json(status, {'error': message})
+            return
+        self.send_json(200, result)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(root='.', host='127.0.0.1', port=DEFAULT_PORT, cache_mb=DATASET_CACHE_MB, verbose=False):
+    """创建查询服务（port 为0时自动选择空闲端口，见 server.server_address）"""
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.pool = DatasetPool(root, int(cache_mb * 1000 * 1000))
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve charge, summary and aggregation queries on record files as HTTP/JSON.")
+    parser.add_argument('--root', default='.', help="directory the requested files are resolved in (default: .)")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"port (default {DEFAULT_PORT})")
+    parser.add_argument('--cache-mb', type=float, default=DATASET_CACHE_MB,
+                        help=f"memory budget of the shared dataset pool in MB (default {DATASET_CACHE_MB})")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    args = parser.parse_args(argv)
+
+    try:
+        server = make_server(args.root, args.host, args.port, args.cache_mb, args.verbose)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    host, port = server.server_address[:2]
+    print(f"Serving {server.pool.root} on http://{host}:{port} (Ctrl+C to stop)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
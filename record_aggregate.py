@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 分箱统计
+# 按固定时间宽度分箱，向量化计算每箱两个通道电流的平均值/最小值/最大值和电荷量，
+# 电荷量由积分值在箱边界处的插值之差得到，与 calculate_charge 的计算方式一致
+
+import csv
+import json
+import re
+import numpy as np
+
+from record_core import CURRENT_COLUMNS, query_window_charges
+
+# 时间宽度的单位
+DURATION_UNITS = {'': 1.0, 's': 1.0, 'sec': 1.0, 'min': 60.0, 'm': 60.0, 'h': 3600.0, 'd': 86400.0}
+MAX_BINS = 10_000_000                   # 分箱数上限（防止误用极小的箱宽耗尽内存）
+
+# 分箱结果表的列：(键, CSV列名, 格式)
+BIN_RESULT_COLUMNS = [
+    ('start_utc', "Start UTC", "{:.3f}"),
+    ('end_utc', "End UTC", "{:.3f}"),
+    ('rows', "Rows", "{:d}"),
+]
+CHANNEL_RESULT_COLUMNS = [
+    ('mean', "Mean Current (mA)", "{:.6f}"),
+    ('min', "Min Current (mA)", "{:.6f}"),
+    ('max', "Max Current (mA)", "{:.6f}"),
+    ('charge', "Charge (mC)", "{:.6f}"),
+]
+
+
+def parse_duration(text):
+    """解析时间宽度：秒数或带单位的数值，如 '60'、'10s'、'1min'、'1.5h'、'1d'"""
+    match = re.fullmatch(r'\s*([0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?)\s*([a-zA-Z]*)\s*', text)
+    if match is None or match.group(2).lower() not in DURATION_UNITS:
+        raise ValueError(f"Invalid duration: {text}")
+    seconds = float(match.group(1)) * DURATION_UNITS[match.group(2).lower()]
+    if seconds <= 0:
+        raise ValueError(f"Duration must be positive: {text}")
+    return seconds
+
+
+def _bin_extremes(bins, values, count):
+    """每箱的 (最小值, 最大值)，空箱为NaN；bins 为每行所在的箱号"""
+    if len(bins) > 1 and (bins[1:] < bins[:-1]).any():
+        # 时间不单调（如会话之间时钟回拨）时先按箱号排序
+        order = np.argsort(bins, kind='stable')
+        bins, values = bins[order], values[order]
+    starts = np.flatnonzero(np.diff(bins, prepend=-1))
+    mins = np.full(count, np.nan)
+    maxs = np.full(count, np.nan)
+    if len(starts):
+        mins[bins[starts]] = np.minimum.reduceat(values, starts)
+        maxs[bins[starts]] = np.maximum.reduceat(values, starts)
+    return mins, maxs
+
+
+def aggregate_bins(data, bin_width, start_utc=None, end_utc=None):
+    """按 bin_width 秒分箱统计 [start_utc, end_utc]（默认为整个文件）
+
+    箱边界对齐到 bin_width 的整数倍（如整分钟），首末两箱截断到统计范围。返回列字典：
+    start_utc、end_utc、rows（箱内的数据行数），以及每个通道的 chN_mean、chN_min、chN_max
+    （空箱为NaN）和 chN_charge（mC，各箱之和等于整个范围的电荷量）。单通道文件只有CH1的列。
+    """
+    utc = data['utc_timestamp']
+    start_utc = float(utc.min()) if start_utc is None else float(start_utc)
+    end_utc = float(utc.max()) if end_utc is None else float(end_utc)
+    if not end_utc > start_utc:
+        raise ValueError("Start time must be less than end time")
+    if not bin_width > 0:
+        raise ValueError("Bin width must be positive")
+
+    origin = np.floor(start_utc / bin_width) * bin_width
+    count = max(int(np.ceil((end_utc - origin) / bin_width)), 1)
+    if count > MAX_BINS:
+        raise ValueError(f"Too many bins ({count:,}), please use a larger bin width")
+    edges = origin + np.arange(count + 1) * bin_width
+    bin_start = np.maximum(edges[:-1], start_utc)
+    bin_end = np.minimum(edges[1:], end_utc)
+
+    # 每行所在的箱号（结束时间恰好在箱边界上的行归入最后一箱）
+    inside = (utc >= start_utc) & (utc <= end_utc)
+    bins = np.minimum(((utc[inside] - origin) // bin_width).astype(np.int64), count - 1)
+    rows = np.bincount(bins, minlength=count)
+
+    table = {'start_utc': bin_start, 'end_utc': bin_end, 'rows': rows}
+    charges = query_window_charges(data, bin_start, bin_end)
+    for prefix, name, charge in zip(('ch1', 'ch2'), CURRENT_COLUMNS, charges):
+        if name not in data:
+            continue
+        values = data[name][inside].astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            table[f'{prefix}_mean'] = np.bincount(bins, weights=values, minlength=count) / rows
+        table[f'{prefix}_min'], table[f'{prefix}_max'] = _bin_extremes(bins, values, count)
+        table[f'{prefix}_charge'] = charge
+    return table
+
+
+def bin_result_columns(table):
+    """结果表中实际存在的列：[(键, CSV列名, 格式)]"""
+    columns = list(BIN_RESULT_COLUMNS)
+    for prefix, channel in (('ch1', "Channel 1"), ('ch2', "Channel 2")):
+        columns += [(f'{prefix}_{key}', f"{channel} {title}", fmt)
+                    for key, title, fmt in CHANNEL_RESULT_COLUMNS if f'{prefix}_{key}' in table]
+    return columns
+
+
+def write_bin_results(output, table, as_json=None):
+    """将分箱统计结果写入CSV或JSON表格（空箱的统计值在CSV中为空，在JSON中为null）
+
+    output 为文件路径或文本流；as_json 为None时按扩展名判断（文本流默认CSV）。
+    """
+    if isinstance(output, str):
+        if as_json is None:
+            as_json = output.lower().endswith('.json')
+        with open(output, 'w', encoding='utf-8', newline='') as f:
+            write_bin_results(f, table, as_json)
+        return
+
+    columns = bin_result_columns(table)
+    values = [table[key].tolist() for key, _, _ in columns]
+    if as_json:
+        keys = [key for key, _, _ in columns]
+        rows = ([None if value != value else value for value in row] for row in zip(*values))
+        json.dump([dict(zip(keys, row)) for row in rows], output, indent=1)
+        return
+
+    writer = csv.writer(output)
+    writer.writerow([title for _, title, _ in columns])
+    formats = [fmt for _, _, fmt in columns]
+    writer.writerows([fmt.format(value) if value == value else "" for fmt, value in zip(formats, row)]
+                     for row in zip(*values))
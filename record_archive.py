@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 列式归档
+# 将记录数据（含通道布局、会话和连续段）导出为 Parquet/Feather 文件，并可直接打开这些文件；
+# 行组不跨越连续段，段内按 UTC 时间排列，窗口查询根据每个行组的时间范围统计只读取需要的行组
+# 需要 pyarrow
+
+import os
+import json
+import numpy as np
+
+from record_core import CURRENT_COLUMNS, RecordData, RecordFileError, RecordSession, query_window_charges
+
+ARCHIVE_SUFFIXES = ('.parquet', '.feather', '.arrow')  # 支持的归档文件扩展名
+ARCHIVE_VERSION = 1
+ARCHIVE_META_KEY = b'current_record'    # 结构元数据中保存通道布局、会话和连续段的键
+ARCHIVE_ROW_GROUP = 64 * 1024           # 每个行组的最大行数（窗口查询时读取的最小单位）
+ARCHIVE_COMPRESSION = 'zstd'
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet/Feather archives require pyarrow (pip install pyarrow)") from None
+    return pa, pq
+
+
+def is_archive(file_path):
+    """是否为列式归档文件（按扩展名判断）"""
+    return file_path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _is_parquet(file_path):
+    return file_path.lower().endswith('.parquet')
+
+
+def _row_groups(segments, row_group):
+    """行组的行范围 [start, stop)：每个连续段内每 row_group 行一组，行组不跨越连续段"""
+    return [(start, min(start + row_group, stop))
+            for first, stop in segments for start in range(first, stop, row_group)]
+
+
+def export_record(data, file_path, row_group=ARCHIVE_ROW_GROUP, source=None, progress=None):
+    """将完整加载的记录数据导出为 Parquet（.parquet）或 Feather（.feather/.arrow）文件
+
+    各列按原数据类型保存（界面中加载的电流列为 float32）；通道布局、会话和连续段保存在结构元数据中。
+    行组按连续段对齐，段内时间不减，每个行组的时间范围由 Parquet 的列统计（Feather 为元数据）给出。
+    progress(已写字节, 总字节, 已写行数) 在每个行组写入后调用（同 load_record）。先写入临时文件再替换，
+    失败时不留下不完整的文件。
+    """
+    if data.sparse:
+        raise ValueError("Only fully loaded records can be exported")
+    pa, pq = _import_pyarrow()
+    names = list(data.columns)
+    segments = [(int(start), int(stop)) for start, stop in data.segment_bounds()]
+    groups = _row_groups(segments, row_group)
+    utc = data['utc_timestamp']
+    row_bytes = sum(data[name].itemsize for name in names)
+    meta = {'version': ARCHIVE_VERSION, 'is_dual_channel': data.is_dual_channel, 'columns': names,
+            'rows': len(data), 'sessions': [session.to_dict() for session in data.sessions],
+            'segments': segments, 'source': source}
+    if not _is_parquet(file_path):
+        # Feather 没有列统计，在元数据中记录每个批次的时间范围
+        meta['groups'] = [[float(utc[start:stop].min()), float(utc[start:stop].max())]
+                          for start, stop in groups]
+    schema = pa.schema([(name, pa.from_numpy_dtype(data[name].dtype)) for name in names],
+                       metadata={ARCHIVE_META_KEY: json.dumps(meta).encode('utf-8')})
+
+    temp_path = file_path + '.tmp'
+    try:
+        if _is_parquet(file_path):
+            # 整个文件时间不减时（没有时间回退）声明按 utc_timestamp 排序
+            ordered = len(utc) < 2 or not (np.diff(utc) < 0).any()
+            # 各列都是浮点数：按字节拆分编码比字典编码的压缩率高得多
+            writer = pq.ParquetWriter(temp_path, schema, compression=ARCHIVE_COMPRESSION,
+                                      use_dictionary=False, column_encoding='BYTE_STREAM_SPLIT',
+                                      sorting_columns=[pq.SortingColumn(0)] if ordered else None)
+            write = lambda table: writer.write_table(table, row_group_size=len(table))
+        else:
+            writer = pa.ipc.new_file(temp_path, schema,
+                                     options=pa.ipc.IpcWriteOptions(compression=ARCHIVE_COMPRESSION))
+            write = lambda table: writer.write_batch(table.to_batches()[0])
+        with writer:
+            for start, stop in groups:
+                write(pa.Table.from_arrays([pa.array(data[name][start:stop]) for name in names],
+                                           schema=schema))
+                if progress is not None:
+                    progress(stop * row_bytes, len(data) * row_bytes, stop)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class RecordArchive:
+    """打开的列式归档文件：会话、连续段和每个行组的 (起始行, 行数, 最小UTC, 最大UTC)"""
+
+    def __init__(self, file_path):
+        self.pa, pq = _import_pyarrow()
+        self.file_path = file_path
+        try:
+            if _is_parquet(file_path):
+                self.reader = pq.ParquetFile(file_path)
+                schema = self.reader.schema_arrow
+            else:
+                self.reader = self.pa.ipc.open_file(self.pa.memory_map(file_path))
+                schema = self.reader.schema
+        except self.pa.ArrowInvalid as e:
+            raise RecordFileError("Format Error", f"Cannot read archive file: {e}") from None
+        raw = (schema.metadata or {}).get(ARCHIVE_META_KEY)
+        if raw is None:
+            raise RecordFileError("Format Error", "The file is not a current record archive "
+                                                  "(missing channel and session information).")
+        meta = json.loads(raw)
+        if meta.get('version') != ARCHIVE_VERSION:
+            raise RecordFileError("Format Error", f"Unsupported archive version: {meta.get('version')}")
+        self.schema = schema
+        self.names = meta['columns']
+        self.is_dual_channel = meta['is_dual_channel']
+        self.rows = meta['rows']
+        self.source = meta.get('source')
+        self.sessions = [RecordSession.from_dict(session) for session in meta['sessions']]
+        self.segments = [tuple(segment) for segment in meta['segments']]
+        self.groups = self._read_groups(meta)
+
+    def _read_groups(self, meta):
+        """每个行组的 [起始行, 行数, 最小UTC, 最大UTC]"""
+        if _is_parquet(self.file_path):
+            metadata = self.reader.metadata
+            utc_column = self.names.index('utc_timestamp')
+            ranges, sizes = [], []
+            for i in range(metadata.num_row_groups):
+                row_group = metadata.row_group(i)
+                stats = row_group.column(utc_column).statistics
+                # 没有统计信息的行组视为覆盖任意时间，总是读取
+                ranges.append((stats.min, stats.max) if stats is not None and stats.has_min_max
+                              else (-np.inf, np.inf))
+                sizes.append(row_group.num_rows)
+        else:
+            ranges = meta['groups']
+            sizes = [self.reader.get_batch(i).num_rows for i in range(self.reader.num_record_batches)]
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+        return np.column_stack((starts, np.array(sizes, dtype=np.int64),
+                                np.array(ranges, dtype=np.float64).reshape(-1, 2)))
+
+    def _read(self, indices, current_dtype=np.float64):
+        """读取指定的行组，返回列字典"""
+        if _is_parquet(self.file_path):
+            table = self.reader.read_row_groups(indices, columns=self.names)
+        else:
+            table = self.pa.Table.from_batches([self.reader.get_batch(i) for i in indices], self.schema)
+        columns = {}
+        for name in self.names:
+            column = table.column(name).to_numpy()
+            columns[name] = column.astype(current_dtype, copy=False) if name in CURRENT_COLUMNS else column
+        return columns
+
+    def load(self, current_dtype=np.float64):
+        """读取全部数据（current_dtype 同 load_record）"""
+        columns = self._read(list(range(len(self.groups))), current_dtype)
+        return RecordData(columns, self.is_dual_channel, list(self.sessions))
+
+    def _select(self, segment, targets):
+        """连续段中需要读取的行组：每个目标时间所在的行组及其前一个，以及首末两个行组"""
+        group_starts = self.groups[:, 0]
+        first = int(np.searchsorted(group_starts, segment[0], side='left'))
+        last = int(np.searchsorted(group_starts, segment[1], side='left')) - 1
+        # 段内时间不减，各行组的最大时间也不减：第一个 UTC >= t 的行位于第一个最大时间 >= t 的行组 k，
+        # 其前一行在行组 k 或 k-1 中
+        k = np.searchsorted(self.groups[first:last + 1, 3], targets, side='left')
+        count = last - first + 1
+        return np.unique(np.concatenate(([0, count - 1], np.clip(k - 1, 0, count - 1),
+                                         np.clip(k, 0, count - 1)))) + first
+
+    def scan(self, target_utc, session=None):
+        """只读取在 target_utc 处插值所需的行组，返回 (稀疏数据, 会话列表)，与 scan_record 相同
+
+        稀疏数据保留各连续段的范围，查询结果与完整加载时相同。session 为会话下标时只读取该会话。
+        """
+        targets = np.unique(np.asarray(target_utc, dtype=np.float64))
+        sessions = self.sessions if session is None else [self.sessions[session]]
+        selected, sparse_segments, sparse_sessions = [], [], []
+        sparse_rows = 0
+        for info in sessions:
+            session_start, session_rows = sparse_rows, 0
+            for segment in self.segments:
+                if not info.start_row <= segment[0] < info.start_row + info.rows:
+                    continue
+                indices = self._select(segment, targets)
+                rows = int(self.groups[indices, 1].sum())
+                selected.extend(indices.tolist())
+                sparse_segments.append((sparse_rows, sparse_rows + rows))
+                sparse_rows += rows
+                session_rows += rows
+            sparse_sessions.append(RecordSession(session_start, session_rows, info.byte_offset, info.byte_end,
+                                                 info.first_utc, info.last_utc, info.started))
+
+        data = RecordData(self._read(selected), self.is_dual_channel, sparse_sessions, sparse=True,
+                          segments=sparse_segments)
+        if session is not None:
+            info = sessions[0]
+            sessions = [RecordSession(0, info.rows, info.byte_offset, info.byte_end,
+                                      info.first_utc, info.last_utc, info.started)]
+        return data, sessions
+
+    def window_charges(self, start_utc, end_utc, session=None):
+        """计算一个或多个时间窗口内CH1/CH2的电荷量，返回 (ch1, ch2)，结果与完整加载时相同"""
+        start_utc = np.asarray(start_utc, dtype=np.float64)
+        end_utc = np.asarray(end_utc, dtype=np.float64)
+        data, _ = self.scan(np.concatenate((start_utc.ravel(), end_utc.ravel())), session)
+        return query_window_charges(data, start_utc, end_utc)
+
+
+def load_archive(file_path, current_dtype=np.float64):
+    """读取整个列式归档文件，返回 RecordData"""
+    return RecordArchive(file_path).load(current_dtype)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 束流时段检测
+# 按一个通道的电流阈值（带回差）找出所有束流开启的时间段，再合并短间断、去掉过短的时段，
+# 每个时段两个通道的电荷量按时间窗口计算，与 calculate_charge 的计算方式一致
+
+import numpy as np
+
+from record_core import query_window_charges
+
+BEAM_CHUNK_ROWS = 1 << 20               # 每次判断的行数（限制中间数组的内存，100M 行也只遍历一次）
+BEAM_CHANNELS = {'ch1': 'ch1_current', 'ch2': 'ch2_current'}
+
+
+def _beam_edges(current, on_level, off_level, state):
+    """一块数据中束流状态变化的行：电流 >= on_level 时开启，< off_level 时关闭，
+    其间（含NaN）保持之前的状态
+
+    state 为这一块之前的状态，返回 (变化的行号, 是否为开启, 块末的状态)。
+    """
+    above = current >= on_level
+    decided = above | (current < off_level)
+    if decided.all():
+        # 没有回差区间内的值时每行都能直接判断
+        rows, levels = None, above
+    else:
+        # 只有能直接判断的行可能改变状态
+        rows = np.flatnonzero(decided)
+        levels = above[rows]
+    if not len(levels):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool), state
+    # 行程编码：与前一个判断结果不同的位置
+    changes = np.flatnonzero(levels != np.concatenate(([state], levels[:-1])))
+    edges = changes if rows is None else rows[changes]
+    return edges, levels[changes], bool(levels[-1])
+
+
+def _segment_runs(current, utc, on_level, off_level, chunk_rows):
+    """一个连续段内开启状态的行程，返回 (开始时间, 结束时间)
+
+    行程 [a, b) 的时间范围为 utc[a] 到 utc[b]（第一个关闭行），正好包含这些行的电流对积分值的贡献；
+    持续到段末的行程结束于最后一行。
+    """
+    rows = len(current)
+    starts, stops = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    state = False
+    for lo in range(0, rows, chunk_rows):
+        edges, rising, state = _beam_edges(current[lo:lo + chunk_rows], on_level, off_level, state)
+        starts.append(edges[rising] + lo)
+        stops.append(edges[~rising] + lo)
+    starts, stops = np.concatenate(starts), np.concatenate(stops)
+    if state:
+        stops = np.append(stops, rows - 1)
+    return utc[starts], utc[stops]
+
+
+def detect_beam_on(data, threshold, channel='ch1', release=None, min_duration=0.0, merge_gap=0.0,
+                   start_utc=None, end_utc=None, chunk_rows=BEAM_CHUNK_ROWS):
+    """检测 channel（'ch1' 或 'ch2'）电流高于 threshold（mA）的时段
+
+    release 为关闭阈值（默认等于 threshold），电流在两个阈值之间时保持原状态，避免噪声引起的抖动。
+    各连续段分别检测；间隔不超过 merge_gap 秒的相邻时段合并，合并后短于 min_duration 秒的时段丢弃。
+    结果截取到 [start_utc, end_utc]（默认为整个文件）。返回列字典：start_utc、end_utc、duration、
+    ch1_charge、ch2_charge（mC，单通道文件的CH2为0）。
+    """
+    column = BEAM_CHANNELS.get(channel)
+    if column is None:
+        raise ValueError(f"Unknown channel: {channel}")
+    if column not in data:
+        raise ValueError(f"The file has no {channel.upper()} current")
+    release = threshold if release is None else release
+    if release > threshold:
+        raise ValueError("Release level must not be higher than the threshold")
+    if min_duration < 0 or merge_gap < 0:
+        raise ValueError("Minimum duration and merge gap must not be negative")
+
+    utc = data['utc_timestamp']
+    current = data[column]
+    runs = [_segment_runs(current[start:stop], utc[start:stop], threshold, release, chunk_rows)
+            for start, stop in data.segment_bounds() if stop > start]
+    starts = np.concatenate([run[0] for run in runs]) if runs else np.zeros(0)
+    ends = np.concatenate([run[1] for run in runs]) if runs else np.zeros(0)
+
+    if start_utc is not None:
+        starts = np.maximum(starts, start_utc)
+    if end_utc is not None:
+        ends = np.minimum(ends, end_utc)
+    inside = ends > starts
+    starts, ends = starts[inside], ends[inside]
+
+    if len(starts) > 1:
+        # 与前一个时段的间隔不超过 merge_gap 时合并（时间回退处不合并）
+        gaps = starts[1:] - ends[:-1]
+        first = np.flatnonzero(np.concatenate(([True], (gaps < 0) | (gaps > merge_gap))))
+        last = np.append(first[1:] - 1, len(starts) - 1)
+        starts, ends = starts[first], ends[last]
+
+    keep = ends - starts >= min_duration
+    starts, ends = starts[keep], ends[keep]
+    ch1_charge, ch2_charge = query_window_charges(data, starts, ends)
+    # 没有连续段时电荷量为标量0
+    zeros = np.zeros(len(starts))
+    return {'start_utc': starts, 'end_utc': ends, 'duration': ends - starts,
+            'ch1_charge': zeros + ch1_charge, 'ch2_charge': zeros + ch2_charge}
+
+
+def beam_labels(table):
+    """结果表中各时段的标签（Beam 1、Beam 2……），用于 write_window_results"""
+    return [f"Beam {i + 1}" for i in range(len(table['start_utc']))]
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 列缓存
+# 记录文件旁的二进制列缓存，再次打开时直接内存映射，不解析文本
+
+import os
+import json
+import time
+import hashlib
+import numpy as np
+
+from record_core import (CURRENT_COLUMNS, DUAL_CHANNEL_COLUMNS, SINGLE_CHANNEL_COLUMNS, RecordData,
+                         RecordSession, load_record)
+
+# 缓存目录：记录文件名加 .colcache，每列一个可内存映射的 .npy 文件
+COLUMN_CACHE_SUFFIX = ".colcache"
+COLUMN_CACHE_VERSION = 2
+HEADER_HASH_BYTES = 4096                # 参与校验的文件头字节数
+
+
+def _column_cache_key(file_path, version=COLUMN_CACHE_VERSION):
+    """边车文件的校验信息：格式版本、文件大小、修改时间和文件头哈希"""
+    stat = os.stat(file_path)
+    with open(file_path, 'rb') as f:
+        header_hash = hashlib.sha1(f.read(HEADER_HASH_BYTES)).hexdigest()
+    return {
+        'version': version,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'header_sha1': header_hash,
+    }
+
+
+def load_column_cache(file_path, current_dtype=np.float64):
+    """读取有效的列缓存（内存映射，不解析文本），缓存不存在或已过期时返回None
+
+    缓存中的电流列精度低于 current_dtype 时视为无效；高于时转换后返回。
+    """
+    cache_dir = file_path + COLUMN_CACHE_SUFFIX
+    try:
+        with open(os.path.join(cache_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('key') != _column_cache_key(file_path):
+            return None
+
+        names = DUAL_CHANNEL_COLUMNS if meta['is_dual_channel'] else SINGLE_CHANNEL_COLUMNS
+        columns = {name: np.load(os.path.join(cache_dir, name + '.npy'), mmap_mode='r')
+                   for name in names}
+        if any(len(column) != meta['rows'] for column in columns.values()):
+            return None
+        sessions = [RecordSession.from_dict(session) for session in meta['sessions']]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    for name in CURRENT_COLUMNS:
+        if name in columns and columns[name].dtype != current_dtype:
+            if columns[name].dtype.itemsize < np.dtype(current_dtype).itemsize:
+                return None
+            columns[name] = columns[name].astype(current_dtype)
+    return RecordData(columns, meta['is_dual_channel'], sessions)
+
+
+def save_column_cache(file_path, data, key):
+    """写入列缓存；meta.json 最后写入，写入失败时静默放弃"""
+    cache_dir = file_path + COLUMN_CACHE_SUFFIX
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    names = DUAL_CHANNEL_COLUMNS if data.is_dual_channel else SINGLE_CHANNEL_COLUMNS
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # 先使旧缓存失效，避免中途失败留下不一致的列
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for name in names:
+            column_path = os.path.join(cache_dir, name + '.npy')
+            np.save(column_path + '.tmp.npy', data[name])
+            os.replace(column_path + '.tmp.npy', column_path)
+        meta = {'key': key, 'rows': len(data), 'is_dual_channel': data.is_dual_channel,
+                'sessions': [session.to_dict() for session in data.sessions]}
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+    except OSError:
+        pass
+
+
+def load_record_cached(file_path, progress=None, current_dtype=np.float64, timings=None):
+    """优先从列缓存加载记录文件，缓存无效时解析文本并重建缓存
+
+    timings 与 load_record 相同，另记录 cache_read（读取缓存）和 cache_write（写入缓存）的耗时。
+    """
+    clock = time.perf_counter()
+    data = load_column_cache(file_path, current_dtype)
+    if timings is not None:
+        timings['cache_read'] = timings.get('cache_read', 0.0) + time.perf_counter() - clock
+    if data is not None:
+        if progress is not None:
+            size = os.path.getsize(file_path)
+            progress(size, size, len(data))
+        return data
+
+    # 解析前记录校验信息，解析期间文件若被修改则下次会重新生成
+    key = _column_cache_key(file_path)
+    data = load_record(file_path, progress=progress, current_dtype=current_dtype, timings=timings)
+    clock = time.perf_counter()
+    save_column_cache(file_path, data, key)
+    if timings is not None:
+        timings['cache_write'] = timings.get('cache_write', 0.0) + time.perf_counter() - clock
+    return data
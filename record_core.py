@@ -0,0 +1,963 @@
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 核心模块
+# 记录文件的加载、会话索引、时间解析和电荷量查询，不依赖PyQt5
+
+import os
+import re
+import sys
+import bz2
+import csv
+import gzip
+import json
+import lzma
+import time
+from contextlib import contextmanager
+from itertools import compress
+from datetime import datetime, timedelta
+import numpy as np
+
+# 记录文件格式
+DUAL_CHANNEL_HEADER = ("UTC Timestamp, Run Time (Seconds), Channel 1 Current (mA), Channel 2 Current (mA), "
+                       "Channel 1 Integral (mC), Channel 2 Integral (mC)")
+SINGLE_CHANNEL_HEADER = "UTC Timestamp, Run Time (Seconds), Current (mA), Integral Value (mC)"  # 兼容旧格式
+SESSION_MARKER = "New dual-channel monitoring session started at"
+
+# 各格式的列顺序
+DUAL_CHANNEL_COLUMNS = ['utc_timestamp', 'runtime', 'ch1_current', 'ch2_current', 'ch1_integral', 'ch2_integral']
+SINGLE_CHANNEL_COLUMNS = ['utc_timestamp', 'runtime', 'ch1_current', 'ch1_integral']
+
+READ_CHUNK_SIZE = 4 * 1024 * 1024       # 每次读取的字节数
+RECORD_SUFFIXES = ('.csv', '.csv.gz', '.csv.xz', '.csv.bz2')    # 支持的记录文件扩展名
+# 压缩的记录文件按扩展名边读边解压
+COMPRESSED_OPENERS = {
+    '.gz': lambda raw: gzip.GzipFile(fileobj=raw, mode='rb'),
+    '.xz': lzma.LZMAFile,
+    '.bz2': bz2.BZ2File,
+}
+CURRENT_COLUMNS = ('ch1_current', 'ch2_current')    # 可以用 float32 存储的列，时间和积分值始终为 float64
+
+# 完整性扫描
+GAP_FACTOR = 5.0                        # 时间间隔超过采样间隔中位数的倍数时视为数据缺失
+RESET_FACTOR = 4.0                      # 积分值下降超过 电流×时间间隔 的倍数时视为积分重置
+RESET_MIN_DROP = 1e-6                   # 视为积分重置的最小下降量 (mC)，忽略舍入误差
+INTEGRITY_BLOCK_ROWS = 4 * 1024 * 1024  # 分块扫描的行数，限制临时数组的内存
+INTEGRITY_SAMPLE_STEPS = 1024 * 1024    # 估计采样间隔中位数时最多抽取的时间间隔数
+INTEGRITY_EXAMPLES = 10                 # 摘要中每类异常列出的示例数
+
+# 支持的时间字符串格式
+TIME_FORMATS = [
+    "%Y%m%d %H:%M:%S.%f",
+    "%Y%m%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%d %H:%M:%S",
+]
+# 上述格式的常见写法，直接用正则表达式解析，避免逐个尝试 strptime
+TIME_PATTERN = re.compile(r'(\d{4})(-?)(\d{2})\2(\d{2}) (\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?')
+# 'YYYY-MM-DD HH:MM:SS' 中数字和分隔符的位置（批量解析窗口时间时使用，'YYYYMMDD' 写法先插入 '-'）
+TIME_DIGIT_COLUMNS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+TIME_SEPARATORS = ((4, '-'), (7, '-'), (10, ' '), (13, ':'), (16, ':'))
+
+# 批量窗口结果表的列
+WINDOW_RESULT_HEADER = ["Label", "Start UTC", "End UTC", "Duration (Seconds)",
+                        "Channel 1 Charge (mC)", "Channel 2 Charge (mC)"]
+
+
+class RecordFileError(Exception):
+    """记录文件格式错误，title 为提示框标题"""
+
+    def __init__(self, title, message):
+        super().__init__(message)
+        self.title = title
+
+
+class LoadCancelled(Exception):
+    """加载被用户取消"""
+
+
+class RecordSession:
+    """监控会话：Append模式文件中由会话标记分隔的一段连续记录"""
+
+    __slots__ = ('start_row', 'rows', 'byte_offset', 'byte_end', 'first_utc', 'last_utc', 'started')
+
+    def __init__(self, start_row, rows, byte_offset, byte_end, first_utc, last_utc, started=""):
+        self.start_row = start_row          # 在已加载数据中的起始行
+        self.rows = rows
+        self.byte_offset = byte_offset      # 在文件中的字节范围 [byte_offset, byte_end)
+        self.byte_end = byte_end
+        self.first_utc = first_utc
+        self.last_utc = last_utc
+        self.started = started              # 会话标记中记录的开始时间
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**values)
+
+    def describe(self):
+        """会话的简短描述"""
+        first = datetime.fromtimestamp(self.first_utc).strftime('%Y-%m-%d %H:%M:%S')
+        last = datetime.fromtimestamp(self.last_utc).strftime('%Y-%m-%d %H:%M:%S')
+        return f"{first} - {last} ({self.rows:,} rows)"
+
+
+class RecordData:
+    """按列存储的记录数据，每列为一维NumPy数组
+
+    只包含文件中实际存在的列：单通道文件没有 ch2_current 和 ch2_integral。
+    """
+
+    __slots__ = ('columns', 'is_dual_channel', 'sessions', 'sparse', 'segments', '_integrity')
+
+    def __init__(self, columns, is_dual_channel, sessions=None, sparse=False, segments=None):
+        self.columns = columns
+        self.is_dual_channel = is_dual_channel
+        if sessions is None:
+            utc = columns['utc_timestamp']
+            sessions = [RecordSession(0, len(utc), None, None, float(utc[0]), float(utc[-1]))]
+        self.sessions = sessions
+        self.sparse = sparse                # 只包含插值所需的行（流式扫描、稀疏索引），不做完整性扫描
+        self.segments = segments            # 稀疏数据已知的连续段行范围（来自列式归档），默认按会话
+        self._integrity = None
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __len__(self):
+        return len(self.columns['utc_timestamp'])
+
+    def session_bounds(self):
+        """各会话在数据中的行范围 [start, stop)"""
+        return [(session.start_row, session.start_row + session.rows) for session in self.sessions]
+
+    def integrity(self):
+        """完整性扫描结果（首次调用时扫描并缓存）"""
+        if self._integrity is None:
+            self._integrity = scan_integrity(self)
+        return self._integrity
+
+    def segment_bounds(self):
+        """连续段的行范围 [start, stop)：会话内再按时间回退和积分值重置分段"""
+        if self.segments is not None:
+            return self.segments
+        if self.sparse:
+            return self.session_bounds()
+        return self.integrity().segments
+
+    def nbytes(self):
+        """各列占用的内存字节数（内存映射的列按文件大小计）"""
+        return sum(column.nbytes for column in self.columns.values())
+
+    def total_runtime(self):
+        """各会话运行时间之和"""
+        runtime = self.columns['runtime']
+        return sum(float(runtime[stop - 1]) for _, stop in self.session_bounds())
+
+    def select_session(self, index):
+        """取出单个会话的数据（切片视图，不复制）"""
+        session = self.sessions[index]
+        stop = session.start_row + session.rows
+        columns = {name: column[session.start_row:stop] for name, column in self.columns.items()}
+        selected = RecordSession(0, session.rows, session.byte_offset, session.byte_end,
+                                 session.first_utc, session.last_utc, session.started)
+        segments = None if self.segments is None else [
+            (max(start, session.start_row) - session.start_row, min(end, stop) - session.start_row)
+            for start, end in self.segments if start < stop and end > session.start_row]
+        return RecordData(columns, self.is_dual_channel, [selected], self.sparse, segments)
+
+
+class IntegrityReport:
+    """完整性扫描结果：连续段的行范围和检测到的异常
+
+    异常用异常之后第一行的行号表示：gap_rows 之前缺失数据（缺失时长 gap_seconds），
+    backward_rows 的时间早于前一行，duplicate_rows 的时间与前一行相同，reset_rows 处积分值重置。
+    """
+
+    __slots__ = ('segments', 'median_interval', 'gap_rows', 'gap_seconds', 'backward_rows',
+                 'duplicate_rows', 'reset_rows', 'utc')
+
+    def __init__(self, segments, median_interval, gap_rows, gap_seconds, backward_rows, duplicate_rows,
+                 reset_rows, utc):
+        self.segments = segments
+        self.median_interval = median_interval
+        self.gap_rows = gap_rows
+        self.gap_seconds = gap_seconds
+        self.backward_rows = backward_rows
+        self.duplicate_rows = duplicate_rows
+        self.reset_rows = reset_rows
+        self.utc = utc
+
+    def anomalies(self):
+        """[(名称, 行号数组)]"""
+        return [('gaps', self.gap_rows), ('backward_steps', self.backward_rows),
+                ('duplicate_timestamps', self.duplicate_rows), ('integral_resets', self.reset_rows)]
+
+    def is_clean(self):
+        return not any(len(rows) for _, rows in self.anomalies())
+
+    def summary(self):
+        """JSON可序列化的摘要：每类异常的数量和前几个示例 (行号, UTC时间戳)"""
+        result = {'segments': len(self.segments), 'median_interval': self.median_interval}
+        for name, rows in self.anomalies():
+            examples = rows[:INTEGRITY_EXAMPLES]
+            result[name] = {'count': len(rows),
+                            'examples': [{'row': row, 'utc': utc}
+                                         for row, utc in zip(examples.tolist(), self.utc[examples].tolist())]}
+        if len(self.gap_rows):
+            result['gaps']['total_seconds'] = float(self.gap_seconds.sum())
+            result['gaps']['largest_seconds'] = float(self.gap_seconds.max())
+            for example, seconds in zip(result['gaps']['examples'], self.gap_seconds.tolist()):
+                example['seconds'] = seconds
+        return result
+
+    def describe(self):
+        """一行描述，如 '2 gaps (largest 35.0 s), 1 integral reset - 3 segments'"""
+        parts = []
+        if len(self.gap_rows):
+            parts.append(f"{len(self.gap_rows):,} gap{'s' if len(self.gap_rows) > 1 else ''} "
+                         f"(largest {self.gap_seconds.max():.1f} s)")
+        for rows, singular, plural in ((self.backward_rows, "backward time step", "backward time steps"),
+                                       (self.duplicate_rows, "duplicate timestamp", "duplicate timestamps"),
+                                       (self.reset_rows, "integral reset", "integral resets")):
+            if len(rows):
+                parts.append(f"{len(rows):,} {singular if len(rows) == 1 else plural}")
+        if not parts:
+            return "No anomalies"
+        return ", ".join(parts) + f" - {len(self.segments)} segment{'s' if len(self.segments) > 1 else ''}"
+
+
+def _integral_resets(columns, dt):
+    """相邻两行之间是否积分重置：积分值的下降超过电流在该间隔内可能造成的变化
+
+    columns 为连续若干行的 {列名: 数组}，dt 为这些行的时间间隔，返回长度为 len(dt) 的布尔数组。
+    """
+    resets = np.zeros(len(dt), dtype=bool)
+    for current_name, integral_name in (('ch1_current', 'ch1_integral'), ('ch2_current', 'ch2_integral')):
+        if integral_name not in columns:
+            continue
+        current = np.abs(columns[current_name])
+        allowed = RESET_FACTOR * np.maximum(current[:-1], current[1:]) * np.abs(dt) + RESET_MIN_DROP
+        resets |= np.diff(columns[integral_name]) < -allowed
+    return resets
+
+
+def segment_breaks(columns):
+    """连续若干行（同一会话内）中开始新连续段的位置：返回长度为行数-1的布尔数组，
+    第 i 项表示第 i+1 行的时间早于第 i 行或积分值在两行之间重置，与 scan_integrity 的分段相同
+    """
+    dt = np.diff(columns['utc_timestamp'])
+    return (dt < 0) | _integral_resets(columns, dt)
+
+
+def scan_integrity(data, block_rows=INTEGRITY_BLOCK_ROWS, previous=None):
+    """单次向量化扫描，检测数据缺失、时间回退、重复时间戳和积分值重置，返回 IntegrityReport
+
+    会话边界处不检测。时间回退和积分重置处把会话再分为连续段，查询时按段分别插值后求和；
+    数据缺失和重复时间戳不影响插值，只报告。分块处理，临时数组的内存与 block_rows 成正比。
+    previous 为同一数据追加新行之前的扫描结果（跟踪模式）：只扫描新增的行，沿用其采样间隔中位数。
+    """
+    utc = data['utc_timestamp']
+    n = len(utc)
+    session_starts = np.array([session.start_row for session in data.sessions[1:]], dtype=np.int64)
+
+    if previous is not None and previous.median_interval > 0:
+        median_interval = previous.median_interval
+    else:
+        # 采样间隔的中位数（行数很多时等间隔抽取相邻行的时间间隔估计）
+        step = max((n - 1) // INTEGRITY_SAMPLE_STEPS, 1)
+        sample = utc[1::step] - utc[:-1:step]
+        sample = sample[sample > 0]
+        median_interval = float(np.median(sample)) if len(sample) else 0.0
+
+    names = [name for name in data.columns if name != 'runtime']
+    found = {name: [] for name in ('gaps', 'gap_seconds', 'backward', 'duplicates', 'resets')}
+    scanned = 0
+    if previous is not None:
+        # 之前的行已检查过，从之前的最后一行开始
+        scanned = max(previous.segments[-1][1] - 1, 0)
+        for name, rows in zip(('gaps', 'backward', 'duplicates', 'resets'),
+                              (previous.gap_rows, previous.backward_rows, previous.duplicate_rows,
+                               previous.reset_rows)):
+            found[name].append(rows)
+        found['gap_seconds'].append(previous.gap_seconds)
+    for first in range(scanned, n - 1, block_rows):
+        # 本块检查 first .. last 行之间的 last - first 个时间间隔
+        last = min(first + block_rows, n - 1)
+        dt = np.diff(utc[first:last + 1])
+        checked = np.ones(len(dt), dtype=bool)
+        boundaries = session_starts[(session_starts > first) & (session_starts <= last)]
+        checked[boundaries - first - 1] = False
+
+        if median_interval > 0:
+            gaps = checked & (dt > GAP_FACTOR * median_interval)
+            found['gaps'].append(np.flatnonzero(gaps) + first + 1)
+            found['gap_seconds'].append(dt[gaps])
+        found['backward'].append(np.flatnonzero(checked & (dt < 0)) + first + 1)
+        found['duplicates'].append(np.flatnonzero(checked & (dt == 0)) + first + 1)
+
+        resets = _integral_resets({name: data[name][first:last + 1] for name in names}, dt)
+        found['resets'].append(np.flatnonzero(checked & resets) + first + 1)
+
+    def joined(name, dtype=np.int64):
+        return np.concatenate(found[name]).astype(dtype) if found[name] else np.empty(0, dtype)
+
+    backward_rows, reset_rows = joined('backward'), joined('resets')
+    starts = np.unique(np.concatenate(([0], session_starts, backward_rows, reset_rows)))
+    stops = np.append(starts[1:], n)
+    segments = list(zip(starts.tolist(), stops.tolist()))
+    return IntegrityReport(segments, median_interval, joined('gaps'), joined('gap_seconds', np.float64),
+                           backward_rows, joined('duplicates'), reset_rows, utc)
+
+def _parse_data_lines(lines, column_count):
+    """将数据行解析为 (行数, 列数) 的float64数组，跳过列数不足的行"""
+    try:
+        return np.loadtxt(lines, delimiter=',', usecols=range(column_count), ndmin=2, comments=None)
+    except ValueError:
+        # 存在列数不足的行，与逐行解析时一样跳过这些行；数值错误仍会抛出
+        lines = [line for line in lines if line.count(b',') >= column_count - 1]
+        if not lines:
+            return np.empty((0, column_count))
+        return np.loadtxt(lines, delimiter=',', usecols=range(column_count), ndmin=2, comments=None)
+
+
+def is_compressed(file_path):
+    """是否为压缩的记录文件（.gz/.xz/.bz2）"""
+    return os.path.splitext(file_path)[1].lower() in COMPRESSED_OPENERS
+
+
+def record_stem(file_path):
+    """去掉记录文件扩展名（含压缩扩展名）的路径，用于生成结果文件名"""
+    lower = file_path.lower()
+    for suffix in sorted(RECORD_SUFFIXES, key=len, reverse=True):
+        if lower.endswith(suffix):
+            return file_path[:-len(suffix)]
+    return os.path.splitext(file_path)[0]
+
+
+@contextmanager
+def open_record(file_path):
+    """以二进制方式打开记录文件，返回 (数据流, 原始文件)
+
+    压缩文件边读边解压，不写临时文件：数据流中的偏移是解压后的字节偏移，原始文件的读取位置
+    （压缩后的字节）用于显示进度。未压缩时两者是同一个文件对象。
+    """
+    with open(file_path, 'rb') as raw:
+        opener = COMPRESSED_OPENERS.get(os.path.splitext(file_path)[1].lower())
+        if opener is None:
+            yield raw, raw
+        else:
+            with opener(raw) as f:
+                yield f, raw
+
+
+def _stream_range(f, file_size, compressed, byte_range):
+    """数据部分要读取的字节范围 (起始, 结束)；压缩文件解压后的大小未知，结束位置不设上限"""
+    limit = sys.maxsize if compressed else file_size
+    start = f.tell() if byte_range is None else max(byte_range[0], f.tell())
+    stop = limit if byte_range is None else min(byte_range[1], limit)
+    return start, stop
+
+
+def _read_header(f):
+    """读取并校验表头（第一个非空行），返回 (列名列表, 表头字节串)"""
+    header_line = f.readline()
+    while header_line and not header_line.strip():
+        header_line = f.readline()
+    if not header_line:
+        raise RecordFileError("Format Error", "File content is incomplete!")
+
+    header = header_line.decode('utf-8').strip()
+    if header == DUAL_CHANNEL_HEADER:
+        return DUAL_CHANNEL_COLUMNS, header.encode('utf-8')
+    if header == SINGLE_CHANNEL_HEADER:
+        return SINGLE_CHANNEL_COLUMNS, header.encode('utf-8')
+    raise RecordFileError("Format Error",
+        "Incorrect file header format!\n"
+        f"Current file header: {header}\n"
+        "Please ensure this is a correct current monitoring record file.")
+
+
+def _iter_line_blocks(f, chunk_size, stop):
+    """从当前位置按块读取到 stop 为止，只返回完整的行：(块起始字节偏移, 块内容)"""
+    offset = f.tell()
+    pending = b''
+    while True:
+        size = min(chunk_size, stop - f.tell())
+        block = f.read(size) if size > 0 else b''
+        if block:
+            # 只处理完整的行，剩余部分留到下一块
+            block = pending + block
+            cut = block.rfind(b'\n') + 1
+            if cut == 0:
+                pending = block
+                continue
+            block, pending = block[:cut], block[cut:]
+        elif pending:
+            block, pending = pending, b''
+        else:
+            return
+        yield offset, block
+        offset += len(block)
+
+
+def _session_started(line, marker):
+    """会话标记行中记录的开始时间"""
+    return line.split(marker, 1)[1].strip().decode('utf-8', 'replace')
+
+
+class _ColumnBuilder:
+    """将整行组成的数据块解析并追加到可增长的列缓冲区
+
+    容量按比例增长并复制到新数组，追加为均摊O(1)，且已取出的列视图不会失效。
+    """
+
+    def __init__(self, names, header, byte_offset, size_hint=0, current_dtype=np.float64):
+        self.names = names
+        self.dtypes = [current_dtype if name in CURRENT_COLUMNS else np.float64 for name in names]
+        self.header = header
+        self.size_hint = size_hint          # 预计要解析的字节数，用于首次分配
+        self.columns = None
+        self.rows = 0
+        self.content_lines = 0
+        self.boundaries = [[0, byte_offset, ""]]    # 每个会话的 [起始行, 字节偏移, 开始时间]
+        self.convert_seconds = 0.0          # 数值转换和写入列的累计耗时（性能追踪用）
+        self.store_seconds = 0.0
+
+    def feed(self, offset, block):
+        """解析从 offset 开始的数据块（只包含完整的行）"""
+        marker = SESSION_MARKER.encode('utf-8')
+        lines = block.split(b'\n')
+        self.content_lines += len(lines) - lines.count(b'') - lines.count(b'\r')
+
+        # 含注释、会话标记或重复表头的块才逐行过滤
+        if b'#' in block or marker in block or self.header in block:
+            data_lines = []
+            line_offset = offset
+            for line in lines:
+                if marker in line:
+                    # 会话边界：先解析之前的数据行，保证边界行号准确
+                    self._append(data_lines, len(block))
+                    data_lines = []
+                    if self.rows > self.boundaries[-1][0]:
+                        self.boundaries.append([self.rows, line_offset, _session_started(line, marker)])
+                    else:
+                        self.boundaries[-1][2] = _session_started(line, marker)
+                elif not line.lstrip().startswith(b'#') and line.strip() != self.header:
+                    data_lines.append(line)
+                line_offset += len(line) + 1
+            lines = data_lines
+
+        self._append(lines, len(block))
+
+    def _append(self, lines, block_size):
+        """解析数据行并追加到各列"""
+        column_count = len(self.names)
+        clock = time.perf_counter()
+        values = _parse_data_lines(lines, column_count) if lines else np.empty((0, column_count))
+        converted = time.perf_counter()
+        self.convert_seconds += converted - clock
+        count = len(values)
+        if count == 0:
+            return
+        if self.columns is None:
+            # 按首块的平均行长预估总行数，一次分配（预估偏小时之后再增长）
+            capacity = max(int(self.size_hint * count / max(block_size, 1) * 1.02) + 1024, count)
+            self.columns = [np.empty(capacity, dtype) for dtype in self.dtypes]
+        elif self.rows + count > len(self.columns[0]):
+            capacity = max(self.rows + count, int(len(self.columns[0]) * 1.25))
+            self.columns = [self._grow(column, capacity) for column in self.columns]
+        for i, column in enumerate(self.columns):
+            column[self.rows:self.rows + count] = values[:, i]
+        self.rows += count
+        self.store_seconds += time.perf_counter() - converted
+
+    def _grow(self, column, capacity):
+        """复制到更大的数组"""
+        grown = np.empty(capacity, column.dtype)
+        grown[:self.rows] = column[:self.rows]
+        return grown
+
+    def extend(self, data):
+        """追加已解析的数据及其会话划分"""
+        base = self.rows
+        capacity = max(int((base + len(data)) * 1.25), 1024)
+        self.columns = [self._grow(column, capacity) if column is not None else np.empty(capacity, dtype)
+                        for column, dtype in zip(self.columns or [None] * len(self.names), self.dtypes)]
+        for name, column in zip(self.names, self.columns):
+            column[base:base + len(data)] = data[name]
+        self.rows += len(data)
+        for session in data.sessions:
+            if base + session.start_row > self.boundaries[-1][0]:
+                self.boundaries.append([base + session.start_row, session.byte_offset, session.started])
+            else:
+                self.boundaries[-1][2] = session.started
+
+    def to_record(self, byte_end, trim=False):
+        """生成 RecordData；trim 时就地释放多余容量（之后不可再追加）"""
+        if trim:
+            for column in self.columns:
+                column.resize(self.rows, refcheck=False)
+        data = {name: column[:self.rows] for name, column in zip(self.names, self.columns)}
+        utc = data['utc_timestamp']
+        sessions = []
+        for (row, byte_offset, started), (next_row, next_offset, _) in zip(
+                self.boundaries, self.boundaries[1:] + [[self.rows, byte_end, ""]]):
+            if next_row > row:
+                sessions.append(RecordSession(row, next_row - row, byte_offset, next_offset,
+                                              float(utc[row]), float(utc[next_row - 1]), started))
+        return RecordData(data, len(self.names) == 6, sessions)
+
+
+def load_record(file_path, chunk_size=READ_CHUNK_SIZE, progress=None, byte_range=None,
+                current_dtype=np.float64, timings=None):
+    """单次流式读取记录文件：校验表头、划分会话、跳过注释并直接解析为NumPy列
+
+    byte_range=(起始, 结束) 时只解析该字节范围（如 index_sessions 给出的某个会话）。
+    current_dtype=np.float32 时电流列以单精度存储，时间和积分值始终为 float64。
+    progress(已读字节, 总字节, 已解析行数) 在每块解析后调用，抛出 LoadCancelled 可中止加载。
+    timings 为字典时累加各步骤的耗时（秒）：read 读取（含解压）、split 分行和过滤、convert 数值转换、
+    store 写入列、assemble 生成结果。
+    压缩文件（.gz/.xz/.bz2）在同一遍读取中解压、校验表头、划分会话和解析，进度按压缩后的字节计算。
+    """
+    file_size = os.path.getsize(file_path)
+    compressed = is_compressed(file_path)
+
+    with open_record(file_path) as (f, raw):
+        names, header = _read_header(f)
+        start, stop = _stream_range(f, file_size, compressed, byte_range)
+        total = file_size if compressed else max(stop - start, 0)
+        f.seek(start)
+
+        builder = _ColumnBuilder(names, header, start, total, current_dtype)
+        read_seconds = feed_seconds = 0.0
+        clock = time.perf_counter()
+        for offset, block in _iter_line_blocks(f, chunk_size, stop):
+            fed = time.perf_counter()
+            read_seconds += fed - clock
+            builder.feed(offset, block)
+            clock = time.perf_counter()
+            feed_seconds += clock - fed
+            if progress is not None:
+                progress(raw.tell() if compressed else offset + len(block) - start, total, builder.rows)
+                clock = time.perf_counter()
+        byte_end = f.tell() if compressed else stop
+
+    if builder.content_lines < 2:
+        raise RecordFileError("Format Error", "File content is incomplete!")
+    if builder.rows == 0:
+        raise ValueError("No valid data rows found in file")
+    clock = time.perf_counter()
+    data = builder.to_record(byte_end, trim=True)
+    if timings is not None:
+        steps = {'read': read_seconds,
+                 'split': feed_seconds - builder.convert_seconds - builder.store_seconds,
+                 'convert': builder.convert_seconds, 'store': builder.store_seconds,
+                 'assemble': time.perf_counter() - clock}
+        for step, seconds in steps.items():
+            timings[step] = timings.get(step, 0.0) + seconds
+    return data
+
+
+class RecordFollower:
+    """跟踪仍在写入的记录文件：记住已解析到的字节位置，每次只读取新追加的完整行"""
+
+    def __init__(self, file_path, data=None, chunk_size=READ_CHUNK_SIZE, current_dtype=np.float64):
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.current_dtype = current_dtype
+        self.reset(data)
+
+    def reset(self, data=None):
+        """从头开始跟踪；data 为已完整加载的同一文件时直接沿用，不重新解析"""
+        if is_compressed(self.file_path):
+            raise RecordFileError("Follow Mode", "Compressed record files cannot be followed.")
+        with open(self.file_path, 'rb') as f:
+            names, header = _read_header(f)
+            data_start = f.tell()
+            self.builder = _ColumnBuilder(names, header, data_start, os.fstat(f.fileno()).st_size,
+                                          self.current_dtype)
+            self.offset = data_start
+            self.integrity = None       # 已读取数据的完整性扫描结果，新增行只扫描增量
+
+            if data is not None and data.sessions[0].byte_offset == data_start:
+                # 仅当加载恰好结束在完整的行尾时才能接着读取
+                byte_end = data.sessions[-1].byte_end
+                f.seek(byte_end - 1)
+                if f.read(1) == b'\n':
+                    self.builder.extend(data)
+                    self.offset = byte_end
+                    self.integrity = data.integrity()
+
+    def poll(self):
+        """读取新追加的完整行，返回新增行数；文件被截断或替换时从头重新读取并返回 -1"""
+        size = os.path.getsize(self.file_path)
+        if size < self.offset:
+            self.reset()
+            self.poll()
+            return -1
+        if size == self.offset:
+            return 0
+
+        rows = self.builder.rows
+        with open(self.file_path, 'rb') as f:
+            f.seek(self.offset)
+            for offset, block in _iter_line_blocks(f, self.chunk_size, size):
+                if not block.endswith(b'\n'):
+                    break       # 未写完的最后一行留到下次
+                self.builder.feed(offset, block)
+                self.offset = offset + len(block)
+        return self.builder.rows - rows
+
+    def snapshot(self):
+        """当前已读取数据的 RecordData（列为视图，不复制），完整性扫描只检查上次之后新增的行"""
+        if self.builder.rows == 0:
+            return None
+        data = self.builder.to_record(self.offset)
+        self.integrity = scan_integrity(data, previous=self.integrity)
+        data._integrity = self.integrity
+        return data
+
+
+def index_sessions(file_path, chunk_size=READ_CHUNK_SIZE, progress=None):
+    """单次扫描文件建立会话索引：每个会话的字节范围、首末UTC时间和行数
+
+    只按字节统计行，不做数值解析（仅解析每个会话首末行的时间戳）。压缩文件边读边解压。
+    """
+    marker = SESSION_MARKER.encode('utf-8')
+    file_size = os.path.getsize(file_path)
+    compressed = is_compressed(file_path)
+
+    with open_record(file_path) as (f, raw):
+        names, header = _read_header(f)
+        min_commas = len(names) - 1
+        start, stop = _stream_range(f, file_size, compressed, None)
+
+        sessions = []
+        total_rows = 0
+        # 当前会话：[起始行, 字节偏移, 开始时间, 首行, 末行, 行数]
+        current = [0, start, "", None, None, 0]
+
+        def finish(byte_end):
+            """结束当前会话"""
+            row, byte_offset, started, first_line, last_line, rows = current
+            if rows:
+                sessions.append(RecordSession(row, rows, byte_offset, byte_end,
+                                              float(first_line.split(b',', 1)[0]),
+                                              float(last_line.split(b',', 1)[0]), started))
+
+        for offset, block in _iter_line_blocks(f, chunk_size, stop):
+            if b'#' in block or marker in block or header in block:
+                line_offset = offset
+                for line in block.split(b'\n'):
+                    if marker in line:
+                        if current[5]:
+                            finish(line_offset)
+                            current = [total_rows, line_offset, _session_started(line, marker), None, None, 0]
+                        else:
+                            current[2] = _session_started(line, marker)
+                    elif (line.count(b',') >= min_commas and not line.lstrip().startswith(b'#')
+                          and line.strip() != header):
+                        if current[3] is None:
+                            current[3] = line
+                        current[4] = line
+                        current[5] += 1
+                        total_rows += 1
+                    line_offset += len(line) + 1
+                data_lines = 0
+            else:
+                body = block.rstrip(b'\r\n')
+                data_lines = body.count(b'\n') + 1 if body else 0
+                if (body[:1] in b'\r\n' or b'\n\n' in body or b'\n\r\n' in body
+                        or body.count(b',') != data_lines * min_commas):
+                    # 存在空行或列数不符的行，逐行判断
+                    lines = [line for line in body.split(b'\n') if line.count(b',') >= min_commas]
+                    data_lines = len(lines)
+                    first_line, last_line = (lines[0], lines[-1]) if lines else (None, None)
+                else:
+                    # 整块都是完整的数据行，只需计数和取首末行
+                    first_line = body[:body.find(b'\n')] if data_lines > 1 else body
+                    last_line = body[body.rfind(b'\n') + 1:]
+            if data_lines:
+                if current[3] is None:
+                    current[3] = first_line
+                current[4] = last_line
+                current[5] += data_lines
+                total_rows += data_lines
+            if progress is not None:
+                if compressed:
+                    progress(raw.tell(), file_size, total_rows)
+                else:
+                    progress(offset + len(block) - start, file_size - start, total_rows)
+
+        finish(f.tell() if compressed else file_size)
+
+    if not sessions:
+        raise ValueError("No valid data rows found in file")
+    return sessions
+
+
+def parse_time_string(time_str):
+    """解析时间字符串，无法识别时返回None
+
+    常见写法由正则表达式直接解析（编辑时间输入时每次按键都会调用），其余写法（如一位数的
+    月份或小时）再按 TIME_FORMATS 逐个尝试。
+    """
+    match = TIME_PATTERN.fullmatch(time_str)
+    if match is not None:
+        year, _, month, day, hour, minute, second, fraction = match.groups()
+        try:
+            return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second),
+                            int(fraction.ljust(6, '0')) if fraction else 0)
+        except ValueError:
+            return None
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(time_str, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def read_window_file(file_path):
+    """读取批量时间窗口文件（CSV或JSON），返回 {列名: 字符串列表}
+
+    列名为 label 以及 start_/end_ 加 utc、time、runtime 后缀，每个窗口的
+    开始和结束时间只需填写其中一种格式。
+    """
+    if file_path.lower().endswith('.json'):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            windows = json.load(f)
+        if isinstance(windows, dict):
+            windows = windows.get('windows', [])
+        return window_table(windows)
+
+    with open(file_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(line for line in f if line.strip() and not line.startswith('#'))
+        names = [name.strip().lower() for name in next(reader, [])]
+        rows = list(reader)
+    table = {name: [row[i].strip() if i < len(row) else '' for row in rows]
+             for i, name in enumerate(names)}
+    return _check_window_table(table)
+
+
+def window_table(windows):
+    """将窗口字典列表（键同窗口文件的列名）转换为 {列名: 字符串列表}，同 read_window_file"""
+    names = sorted({name for window in windows for name in window})
+    table = {name: [] for name in names}
+    for window in windows:
+        for name in names:
+            value = window.get(name)
+            table[name].append('' if value is None else str(value))
+    return _check_window_table(table)
+
+
+def _check_window_table(table):
+    if not any(f"{position}_{fmt}" in table for position in ('start', 'end')
+               for fmt in ('utc', 'time', 'runtime')):
+        raise ValueError("Window file must contain start_utc/start_time/start_runtime "
+                         "and end_utc/end_time/end_runtime columns")
+    return table
+
+
+def _common_time_rows(texts):
+    """texts（定长字符串数组）中 'YYYY-MM-DD HH:MM:SS[.ffffff]' 和 'YYYYMMDD HH:MM:SS[.ffffff]' 写法的行
+
+    返回 (行号, 这些行统一为前一种写法的字符串数组)，numpy 可以直接解析。
+    """
+    lengths = np.char.str_len(texts)
+    found_rows, found_codes = [], []
+    for width, dashes in ((19, False), (17, True)):
+        rows = np.flatnonzero((lengths == width) | ((lengths >= width + 2) & (lengths <= width + 7)))
+        codes = texts[rows].astype(f'U{width + 7}').view(np.uint32).reshape(len(rows), width + 7)
+        if dashes:
+            # 在日期中插入 '-'
+            dash = np.full((len(rows), 1), ord('-'), dtype=np.uint32)
+            codes = np.concatenate((codes[:, :4], dash, codes[:, 4:6], dash, codes[:, 6:]), axis=1)
+        digits = (codes >= ord('0')) & (codes <= ord('9'))
+        common = digits[:, TIME_DIGIT_COLUMNS].all(axis=1)
+        for column, char in TIME_SEPARATORS:
+            common &= codes[:, column] == ord(char)
+        # 小数部分：'.' 之后只有数字（不足26个字符的部分为0）
+        common &= (lengths[rows] == width) | ((codes[:, 19] == ord('.'))
+                                              & (digits[:, 20:] | (codes[:, 20:] == 0)).all(axis=1))
+        found_rows.append(rows[common])
+        found_codes.append(codes[common])
+    return np.concatenate(found_rows), np.concatenate(found_codes).view('U26')[:, 0]
+
+
+def _hour_offset(hour):
+    """1970年起第 hour 个小时（本地时间）的UTC时间戳与其本地时间秒数之差；该小时内时区偏移有变化时为NaN"""
+    start = datetime(1970, 1, 1) + timedelta(hours=hour)
+    try:
+        timestamp = start.timestamp()
+        if start.replace(minute=59, second=59).timestamp() - timestamp != 3599:
+            return np.nan
+    except (OverflowError, OSError):
+        return np.nan
+    return timestamp - hour * 3600
+
+
+def _time_string_timestamps(texts):
+    """将时间字符串列表转换为UTC时间戳数组，与逐个调用 parse_time_string 和 datetime.timestamp 的结果相同，
+    无法识别的为NaN
+
+    常见写法由 numpy 整列解析为本地时间，每个小时只换算一次时区偏移；其余写法、超出范围的值
+    和时区偏移变化的小时逐个解析。
+    """
+    values = np.full(len(texts), np.nan)
+    array = np.asarray(texts, dtype=str)
+    rows, common = _common_time_rows(array)
+    try:
+        seconds, micro = np.divmod(common.astype('datetime64[us]').astype(np.int64), 1000000)
+    except ValueError:
+        pass
+    else:
+        hours, inverse = np.unique(seconds // 3600, return_inverse=True)
+        offsets = np.array([_hour_offset(int(hour)) for hour in hours])
+        values[rows] = (seconds + offsets[inverse]) + micro / 1e6
+    for i in np.flatnonzero(np.isnan(values)):
+        dt = parse_time_string(texts[i])
+        try:
+            values[i] = np.nan if dt is None else dt.timestamp()
+        except (ValueError, OverflowError, OSError):
+            pass        # 超出平台支持的时间范围
+    return values
+
+
+def _window_floats(texts, rows):
+    """将 rows 选中的字符串一次转换为浮点数组（顺序同 rows 中为True的行）"""
+    if rows.all():
+        return np.asarray(texts, dtype=float)
+    return np.asarray(list(compress(texts, rows)), dtype=float)
+
+
+def resolve_window_times(table, position, record_start_utc):
+    """按UTC时间戳、时间格式、运行时间的优先级将窗口边界转换为UTC数组
+
+    UTC时间戳和运行时间整列一次转换，时间格式由 _time_string_timestamps 批量解析。
+    """
+    count = len(next(iter(table.values())))
+    empty = [''] * count
+    utc_texts = table.get(f'{position}_utc', empty)
+    time_texts = table.get(f'{position}_time', empty)
+    runtime_texts = table.get(f'{position}_runtime', empty)
+
+    # 每个窗口使用第一个非空的格式
+    def filled(texts):
+        return np.fromiter(map(bool, texts), dtype=bool, count=count)
+    use_utc = filled(utc_texts)
+    use_time = ~use_utc & filled(time_texts)
+    use_runtime = ~(use_utc | use_time) & filled(runtime_texts)
+    invalid = ~(use_utc | use_time | use_runtime)
+
+    values = np.empty(count)
+    for rows, texts, offset in ((use_utc, utc_texts, 0.0), (use_runtime, runtime_texts, record_start_utc)):
+        try:
+            values[rows] = offset + _window_floats(texts, rows)
+        except ValueError:
+            # 有无法转换的值时逐个转换，找出无效的窗口
+            for i in np.flatnonzero(rows):
+                try:
+                    values[i] = offset + float(texts[i])
+                except ValueError:
+                    invalid[i] = True
+    if use_time.any():
+        rows = np.flatnonzero(use_time)
+        values[rows] = _time_string_timestamps(list(compress(time_texts, use_time)))
+        invalid[rows] |= np.isnan(values[rows])
+    if invalid.any():
+        raise ValueError(f"Window {invalid.argmax() + 1}: invalid or missing {position} time")
+    return values
+
+
+def write_window_results(output, labels, start_utc, end_utc, ch1_charge, ch2_charge, as_json=None):
+    """将批量窗口结果写入CSV或JSON表格
+
+    output 为文件路径或文本流；as_json 为None时按扩展名判断（文本流默认CSV）。
+    """
+    if isinstance(output, str):
+        if as_json is None:
+            as_json = output.lower().endswith('.json')
+        with open(output, 'w', encoding='utf-8', newline='') as f:
+            write_window_results(f, labels, start_utc, end_utc, ch1_charge, ch2_charge, as_json)
+        return
+
+    if as_json:
+        keys = ['label', 'start_utc', 'end_utc', 'duration', 'ch1_charge', 'ch2_charge']
+        rows = zip(labels, start_utc.tolist(), end_utc.tolist(), (end_utc - start_utc).tolist(),
+                   ch1_charge.tolist(), ch2_charge.tolist())
+        json.dump([dict(zip(keys, row)) for row in rows], output, indent=1)
+        return
+
+    writer = csv.writer(output)
+    writer.writerow(WINDOW_RESULT_HEADER)
+    writer.writerows(zip(labels,
+                         (f"{v:.3f}" for v in start_utc.tolist()),
+                         (f"{v:.3f}" for v in end_utc.tolist()),
+                         (f"{v:.3f}" for v in (end_utc - start_utc).tolist()),
+                         (f"{v:.6f}" for v in ch1_charge.tolist()),
+                         (f"{v:.6f}" for v in ch2_charge.tolist())))
+
+
+def _locate_targets(data_utc, target_utc):
+    """二分查找目标时间所在的插值区间，返回 (目标时间, 区间右端下标)"""
+    targets = np.asarray(target_utc, dtype=np.float64)
+    # 第一个满足 data_utc[i] <= t <= data_utc[i + 1] 的区间
+    right = np.clip(np.searchsorted(data_utc, targets, side='left'), 1, max(len(data_utc) - 1, 1))
+    return targets, right
+
+
+def _interpolate_located(data_utc, data_integral, targets, right):
+    """在已定位的区间上线性插值，目标时间在数据范围外时使用边界值"""
+    if len(data_utc) == 1:
+        values = np.full(targets.shape, data_integral[0])
+        return values if values.ndim else values[()]
+
+    t1, t2 = data_utc[right - 1], data_utc[right]
+    v1, v2 = data_integral[right - 1], data_integral[right]
+
+    # 线性插值，t2 == t1 时取 v1 以避免除零
+    span = t2 - t1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.where(span == 0, v1, v1 + (v2 - v1) * (targets - t1) / span)
+
+    values = np.where(targets <= data_utc[0], data_integral[0], values)
+    values = np.where(targets >= data_utc[-1], data_integral[-1], values)
+    return values if values.ndim else values[()]
+
+
+def interpolate_integrals(data_utc, data_integral, target_utc):
+    """在有序时间列上二分查找并线性插值，支持标量或数组形式的目标时间"""
+    targets, right = _locate_targets(data_utc, target_utc)
+    return _interpolate_located(data_utc, data_integral, targets, right)
+
+
+def query_window_charges(data, start_utc, end_utc):
+    """计算一个或多个时间窗口内CH1/CH2的电荷量，返回 (ch1, ch2)
+
+    积分值在会话边界处重新开始，且会话内可能有时间回退或积分重置，因此按连续段分别插值
+    （窗口在段外的部分被钳位为0）后求和，不会跨段插值。
+    """
+    ch1_charge = ch2_charge = 0
+    for start, stop in data.segment_bounds():
+        data_utc = data['utc_timestamp'][start:stop]
+        # 每个边界只查找一次，两个通道共用
+        starts, start_right = _locate_targets(data_utc, start_utc)
+        ends, end_right = _locate_targets(data_utc, end_utc)
+        charges = []
+        for column in ('ch1_integral', 'ch2_integral'):
+            if column not in data:
+                # 单通道文件没有CH2，电荷量为0
+                charges.append(np.zeros(starts.shape)[()])
+                continue
+            data_integral = data[column][start:stop]
+            start_integral = _interpolate_located(data_utc, data_integral, starts, start_right)
+            end_integral = _interpolate_located(data_utc, data_integral, ends, end_right)
+            charges.append(end_integral - start_integral)
+        ch1_charge = ch1_charge + charges[0]
+        ch2_charge = ch2_charge + charges[1]
+    return ch1_charge, ch2_charge
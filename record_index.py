@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 稀疏时间索引
+# 记录文件旁的 .timeidx.npz 文件：每个连续段内每隔若干数据行记录一次 (UTC时间戳, 字节偏移)，
+# 查询时二分查找索引，只读取并解析窗口边界附近的几KB文本
+
+import os
+import json
+import numpy as np
+
+from record_core import (DUAL_CHANNEL_COLUMNS, DUAL_CHANNEL_HEADER, SESSION_MARKER, SINGLE_CHANNEL_COLUMNS,
+                         SINGLE_CHANNEL_HEADER, READ_CHUNK_SIZE, RecordData, RecordFileError, RecordSession,
+                         _ColumnBuilder, _iter_line_blocks, _parse_data_lines, _read_header, _session_started,
+                         is_compressed, query_window_charges, segment_breaks)
+from record_cache import _column_cache_key
+
+TIME_INDEX_SUFFIX = ".timeidx.npz"
+TIME_INDEX_VERSION = 2                  # 2: 按连续段建立索引项
+TIME_INDEX_STRIDE = 128                 # 每隔多少个数据行记录一个索引项
+
+
+class _TimeIndexBuilder:
+    """逐块解析数据行，记录每个连续段的首行、末行和每隔 stride 行的时间和偏移
+
+    会话内按时间回退和积分重置再分为连续段（判断方法与 scan_integrity 相同），每个连续段单独建立
+    索引项，查询时按段分别读取和插值。
+    """
+
+    def __init__(self, names, header, byte_offset, stride):
+        self.names = names
+        self.header = header
+        self.min_commas = len(names) - 1
+        self.stride = stride
+        self.utc = []
+        self.offsets = []
+        self.sessions = []
+        self.total_rows = 0
+        # 当前会话：{起始行, 字节偏移, 开始时间, 连续段列表}；当前连续段：[起始行, 首个索引项, 行数, 末行偏移, 末行]
+        self.current = {'start_row': 0, 'byte_offset': byte_offset, 'started': "", 'segments': []}
+        self.segment = None
+
+    def _add_entries(self, offsets, utc):
+        self.utc.extend(utc.tolist())
+        self.offsets.extend(offsets.tolist())
+
+    def _finish_segment(self, byte_end):
+        """结束当前连续段：末行不在索引中时补充索引项"""
+        if self.segment is None:
+            return
+        row, entry, rows, last_offset, last = self.segment
+        if (rows - 1) % self.stride:
+            self._add_entries(np.array([last_offset]), last[:, 0])
+        self.current['segments'].append({'start_row': row, 'rows': rows, 'entry_start': entry,
+                                         'entry_stop': len(self.utc), 'byte_end': byte_end})
+        self.segment = None
+
+    def finish_session(self, byte_end):
+        """结束当前会话，没有数据行时返回False"""
+        self._finish_segment(byte_end)
+        segments = self.current['segments']
+        if not segments:
+            return False
+        first, last = segments[0], segments[-1]
+        self.sessions.append({'start_row': first['start_row'],
+                              'rows': last['start_row'] + last['rows'] - first['start_row'],
+                              'byte_offset': self.current['byte_offset'], 'byte_end': byte_end,
+                              'first_utc': self.utc[first['entry_start']], 'last_utc': self.utc[-1],
+                              'started': self.current['started'], 'segments': segments})
+        return True
+
+    def _add_rows(self, offsets, lines):
+        """解析同一会话中的若干数据行（offsets 为各行的字节偏移），按连续段记录索引项"""
+        if not lines:
+            return
+        values = _parse_data_lines(lines, len(self.names))
+        if len(values) != len(lines):
+            # 有列数不足的行（解析时被跳过），先去掉这些行使偏移与数据对应
+            keep = [line.count(b',') >= self.min_commas for line in lines]
+            offsets = offsets[np.array(keep, dtype=bool)]
+            values = _parse_data_lines([line for line, kept in zip(lines, keep) if kept], len(self.names))
+        count = len(values)
+        if count == 0:
+            return
+        # 与同一会话中的上一行一起判断段边界
+        previous = values[:0] if self.segment is None else self.segment[4]
+        rows = np.concatenate((previous, values))
+        breaks = np.flatnonzero(segment_breaks({name: rows[:, i] for i, name in enumerate(self.names)}))
+        cuts = (breaks + 1 - len(previous)).tolist()
+        for first, stop in zip([0] + cuts, cuts + [count]):
+            if first == stop:
+                continue
+            if self.segment is None or first in cuts:
+                self._finish_segment(int(offsets[first]))
+                self.segment = [self.total_rows + first, len(self.utc), 0, None, None]
+            # 段内每隔 stride 行一个索引项
+            done = self.segment[2]
+            picks = np.arange((-done) % self.stride, stop - first, self.stride) + first
+            self._add_entries(offsets[picks], values[picks, 0])
+            self.segment[2] += stop - first
+            self.segment[3], self.segment[4] = int(offsets[stop - 1]), values[stop - 1:stop]
+        self.total_rows += count
+
+    def feed(self, offset, block):
+        """处理从 offset 开始的数据块（只包含完整的行）"""
+        marker = SESSION_MARKER.encode('utf-8')
+        body = block.rstrip(b'\r\n')
+        line_count = body.count(b'\n') + 1 if body else 0
+        if (b'#' in block or marker in block or self.header in block or body[:1] in b'\r\n'
+                or b'\n\n' in body or b'\n\r\n' in body or body.count(b',') != line_count * self.min_commas):
+            # 含注释、会话标记、空行或列数不符的块逐行处理
+            line_offset = offset
+            offsets, lines = [], []
+            for line in block.split(b'\n'):
+                if marker in line:
+                    self._add_rows(np.array(offsets, dtype=np.int64), lines)
+                    offsets, lines = [], []
+                    if self.finish_session(line_offset):
+                        self.current = {'start_row': self.total_rows, 'byte_offset': line_offset,
+                                        'started': _session_started(line, marker), 'segments': []}
+                    else:
+                        self.current['started'] = _session_started(line, marker)
+                elif (line.count(b',') >= self.min_commas and not line.lstrip().startswith(b'#')
+                      and line.strip() != self.header):
+                    offsets.append(line_offset)
+                    lines.append(line)
+                line_offset += len(line) + 1
+            self._add_rows(np.array(offsets, dtype=np.int64), lines)
+            return
+        if not line_count:
+            return
+
+        # 整块都是完整的数据行
+        starts = np.flatnonzero(np.frombuffer(body, dtype=np.uint8) == ord('\n')) + 1
+        starts = np.concatenate(([0], starts))
+        self._add_rows(starts + offset, body.split(b'\n'))
+
+
+class TimeIndex:
+    """稀疏时间索引：每个连续段内按行号等间隔的 (UTC时间戳, 字节偏移)，另含每个连续段的首行和末行"""
+
+    def __init__(self, file_path, utc, offsets, meta):
+        self.file_path = file_path
+        self.utc = utc
+        self.offsets = offsets
+        self.is_dual_channel = meta['is_dual_channel']
+        # 每个会话的连续段：{起始行, 行数, 索引项范围, 结束字节偏移}
+        self.session_segments = [session.pop('segments') for session in meta['sessions']]
+        self.sessions = [RecordSession.from_dict(session) for session in meta['sessions']]
+
+    def _ranges(self, segment, target_utc):
+        """连续段中需要读取的字节范围：每个目标时间前后相邻的两段，以及首段和末段"""
+        entry_start, entry_stop = segment['entry_start'], segment['entry_stop']
+        utc = self.utc[entry_start:entry_stop]
+        last = len(utc) - 1
+        # 第一个 UTC >= t 的行位于索引项 k-1 和 k 之间，其前一行不早于索引项 k-1
+        k = np.searchsorted(utc, target_utc, side='left')
+        segments = np.unique(np.concatenate(([0, last], np.clip(k - 1, 0, last), np.clip(k, 0, last))))
+        offsets = self.offsets[entry_start:entry_stop].tolist() + [segment['byte_end']]
+
+        # 合并相邻的段，每个范围只读取一次
+        ranges = []
+        for segment in segments.tolist():
+            start, stop = offsets[segment], offsets[segment + 1]
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = stop
+            else:
+                ranges.append([start, stop])
+        return ranges
+
+    def scan(self, target_utc, session=None):
+        """读取在 target_utc 处插值所需的行，返回 (稀疏数据, 会话列表)，与 scan_record 相同
+
+        稀疏数据保留各连续段的范围，查询结果与完整加载时相同。session 为会话下标时只读取该会话。
+        """
+        targets = np.unique(np.asarray(target_utc, dtype=np.float64))
+        names, header = ((DUAL_CHANNEL_COLUMNS, DUAL_CHANNEL_HEADER) if self.is_dual_channel
+                         else (SINGLE_CHANNEL_COLUMNS, SINGLE_CHANNEL_HEADER))
+        indices = range(len(self.sessions)) if session is None else [session]
+
+        parts, sparse_segments, sparse_sessions, sessions = [], [], [], []
+        sparse_rows = 0
+        with open(self.file_path, 'rb') as f:
+            for index in indices:
+                rows = 0
+                for segment in self.session_segments[index]:
+                    segment_start = sparse_rows + rows
+                    for start, stop in self._ranges(segment, targets):
+                        f.seek(start)
+                        builder = _ColumnBuilder(names, header.encode('utf-8'), start, stop - start)
+                        builder.feed(start, f.read(stop - start))
+                        if builder.rows:
+                            parts.append(np.column_stack([column[:builder.rows]
+                                                          for column in builder.columns]))
+                            rows += builder.rows
+                    sparse_segments.append((segment_start, sparse_rows + rows))
+                session_info = self.sessions[index]
+                sparse_sessions.append(RecordSession(sparse_rows, rows, session_info.byte_offset,
+                                                     session_info.byte_end, session_info.first_utc,
+                                                     session_info.last_utc, session_info.started))
+                sessions.append(session_info if session is None else
+                                RecordSession(0, session_info.rows, session_info.byte_offset,
+                                              session_info.byte_end, session_info.first_utc,
+                                              session_info.last_utc, session_info.started))
+                sparse_rows += rows
+
+        values = np.vstack(parts)
+        data = {name: values[:, i] for i, name in enumerate(names)}
+        return (RecordData(data, self.is_dual_channel, sparse_sessions, sparse=True, segments=sparse_segments),
+                sessions)
+
+    def window_charges(self, start_utc, end_utc, session=None):
+        """计算一个或多个时间窗口内CH1/CH2的电荷量，返回 (ch1, ch2)，结果与完整加载时相同"""
+        start_utc = np.asarray(start_utc, dtype=np.float64)
+        end_utc = np.asarray(end_utc, dtype=np.float64)
+        data, _ = self.scan(np.concatenate((start_utc.ravel(), end_utc.ravel())), session)
+        return query_window_charges(data, start_utc, end_utc)
+
+
+def build_time_index(file_path, stride=TIME_INDEX_STRIDE, chunk_size=READ_CHUNK_SIZE, progress=None):
+    """单次扫描文件建立稀疏时间索引，返回 (UTC数组, 偏移数组, 元数据)
+
+    需要解析每一行以检测时间回退和积分重置，耗时与完整加载相当，但只保存索引项，内存与文件大小无关。
+    """
+    if is_compressed(file_path):
+        # 压缩文件无法按偏移随机读取
+        raise RecordFileError("Index Error", "The time index needs an uncompressed record file, "
+                                             "use streaming for compressed files.")
+    with open(file_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        names, header = _read_header(f)
+        start = f.tell()
+        builder = _TimeIndexBuilder(names, header, start, stride)
+        for offset, block in _iter_line_blocks(f, chunk_size, file_size):
+            builder.feed(offset, block)
+            if progress is not None:
+                progress(offset + len(block) - start, file_size - start, builder.total_rows)
+        builder.finish_session(file_size)
+
+    if not builder.sessions:
+        raise ValueError("No valid data rows found in file")
+    meta = {'is_dual_channel': len(names) == 6, 'stride': stride, 'rows': builder.total_rows,
+            'sessions': builder.sessions}
+    return np.array(builder.utc), np.array(builder.offsets, dtype=np.int64), meta
+
+
+def load_time_index(file_path):
+    """读取有效的稀疏时间索引，不存在或已过期时返回None"""
+    try:
+        with np.load(file_path + TIME_INDEX_SUFFIX) as archive:
+            meta = json.loads(str(archive['meta']))
+            if meta.get('key') != _column_cache_key(file_path, TIME_INDEX_VERSION):
+                return None
+            return TimeIndex(file_path, archive['utc'], archive['offsets'], meta)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def open_time_index(file_path, progress=None):
+    """打开文件的稀疏时间索引，不存在或已过期时扫描文件建立并保存（保存失败时静默放弃）"""
+    index = load_time_index(file_path)
+    if index is not None:
+        return index
+
+    # 扫描前记录校验信息，扫描期间文件若被修改则下次会重新建立
+    key = _column_cache_key(file_path, TIME_INDEX_VERSION)
+    utc, offsets, meta = build_time_index(file_path, progress=progress)
+    meta['key'] = key
+    index_path = file_path + TIME_INDEX_SUFFIX
+    try:
+        with open(index_path + '.tmp', 'wb') as f:
+            np.savez(f, utc=utc, offsets=offsets, meta=np.array(json.dumps(meta)))
+        os.replace(index_path + '.tmp', index_path)
+    except OSError:
+        pass
+    return TimeIndex(file_path, utc, offsets, meta)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 数据集缓存
+# 进程内的已解析数据集LRU缓存：按 (路径, 部分) 保存，取出时用文件大小和修改时间校验，
+# 总内存超过预算时按最久未使用的顺序淘汰；可在多个线程中共用
+
+import os
+import threading
+from collections import OrderedDict
+
+DATASET_CACHE_MB = 1024                 # 默认内存预算 (MB)
+
+
+def stat_key(file_path):
+    """文件的 (大小, 修改时间)，文件不存在时为None"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class DatasetCache:
+    """已解析数据集的LRU缓存
+
+    part 区分同一文件的不同部分（如整个文件为None，单个会话为其字节范围）。文件大小或修改时间
+    变化后旧的数据集视为失效并丢弃。单个超过预算的数据集不缓存。
+    """
+
+    def __init__(self, budget_bytes=DATASET_CACHE_MB * 1000 * 1000):
+        self.budget_bytes = budget_bytes
+        self.entries = OrderedDict()    # (绝对路径, part) -> (文件校验信息, 数据, 字节数)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def _drop(self, key):
+        _, _, size = self.entries.pop(key)
+        self.size -= size
+
+    def get(self, file_path, part=None):
+        """取出有效的数据集，没有或已失效时返回None"""
+        key = (os.path.abspath(file_path), part)
+        file_key = stat_key(file_path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] != file_key:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def contains(self, file_path, part=None):
+        """是否有有效的数据集（不计入命中统计，不改变使用顺序）"""
+        key = (os.path.abspath(file_path), part)
+        file_key = stat_key(file_path)
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and entry[0] == file_key
+
+    def put(self, file_path, data, part=None, file_key=None):
+        """保存数据集并按预算淘汰最久未使用的数据集
+
+        file_key 为加载前记录的文件校验信息（默认取当前值），加载期间文件被修改时下次取出会失效。
+        """
+        key = (os.path.abspath(file_path), part)
+        file_key = stat_key(file_path) if file_key is None else file_key
+        size = data.nbytes()
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            if file_key is None or size > self.budget_bytes:
+                return
+            while self.entries and self.size + size > self.budget_bytes:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+            self.entries[key] = (file_key, data, size)
+            self.size += size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """缓存统计（JSON可序列化）"""
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.size, 'budget_bytes': self.budget_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def describe(self):
+        """状态栏用的简短统计"""
+        stats = self.stats()
+        return (f"Cache: {stats['entries']} datasets, {stats['bytes'] / 1e6:.0f}/"
+                f"{stats['budget_bytes'] / 1e6:.0f} MB, {stats['hits']} hits, {stats['misses']} misses")
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 最小/最大值抽取金字塔
+# 按行数分箱逐级保存每箱的最小值和最大值，任意缩放级别下只需取出与屏幕像素数相当的点
+
+import numpy as np
+
+PYRAMID_BASE_BIN = 16                   # 第一级每箱的行数
+PYRAMID_FACTOR = 4                      # 相邻两级的箱大小之比
+PYRAMID_TOP_BINS = 1024                 # 最高一级不超过的箱数
+
+
+def _fold(blocks, ufunc):
+    """将 (箱数, 箱大小) 的数组两两折半合并为每箱一个值（箱大小为2的幂），比沿短轴归约快"""
+    while blocks.shape[1] > 1:
+        half = blocks.shape[1] // 2
+        blocks = ufunc(blocks[:, :half], blocks[:, half:])
+    return blocks[:, 0]
+
+
+def _reduce_bins(mins, maxs, size):
+    """每 size 个相邻元素合并为一箱（最后一箱可以不满），返回 (最小值, 最大值)"""
+    full = len(mins) // size * size
+    bin_mins = _fold(mins[:full].reshape(-1, size), np.minimum)
+    bin_maxs = _fold(maxs[:full].reshape(-1, size), np.maximum)
+    if full < len(mins):
+        bin_mins = np.append(bin_mins, mins[full:].min())
+        bin_maxs = np.append(bin_maxs, maxs[full:].max())
+    return bin_mins, bin_maxs
+
+
+class MinMaxPyramid:
+    """一列数据的最小/最大值金字塔
+
+    第 k 级（k >= 1）每箱包含 PYRAMID_BASE_BIN * PYRAMID_FACTOR**(k-1) 行。追加数据时只重算最后一个
+    不满的箱及之后的部分，适用于跟踪模式下不断增长的文件。
+    """
+
+    def __init__(self, values):
+        self.rows = 0
+        self.levels = []            # 每级的 [箱大小, 最小值数组, 最大值数组]
+        self.update(values)
+
+    def update(self, values):
+        """数据增长后（已有部分不变）更新金字塔"""
+        old_rows, self.rows = self.rows, len(values)
+        self.values = values
+        size, source_mins, source_maxs = 1, values, values
+        changed = old_rows          # 上一级中发生变化的第一个元素
+        level = 0
+        while True:
+            bin_size = PYRAMID_BASE_BIN if level == 0 else PYRAMID_FACTOR
+            if level == len(self.levels):
+                if len(source_mins) <= PYRAMID_TOP_BINS:
+                    break
+                self.levels.append([size * bin_size, source_mins[:0], source_maxs[:0]])
+                changed = 0
+            first = changed // bin_size
+            mins, maxs = _reduce_bins(source_mins[first * bin_size:], source_maxs[first * bin_size:], bin_size)
+            entry = self.levels[level]
+            entry[1] = np.concatenate((entry[1][:first], mins))
+            entry[2] = np.concatenate((entry[2][:first], maxs))
+            size, source_mins, source_maxs = entry
+            changed = first
+            level += 1
+
+    def nbytes(self):
+        """金字塔占用的内存字节数（不含原始数据）"""
+        return sum(mins.nbytes + maxs.nbytes for _, mins, maxs in self.levels)
+
+    def select(self, start, stop, max_points):
+        """取出行范围 [start, stop) 的抽样：不超过 max_points 行时返回原始行，否则选择箱数不超过
+        max_points // 2 的最细一级
+
+        返回 (起始行号数组, 最小值, 最大值)：原始行的最小值和最大值相同。
+        """
+        if stop - start <= max_points:
+            rows = np.arange(start, stop)
+            values = self.values[start:stop]
+            return rows, values, values
+        for size, mins, maxs in self.levels:
+            if (stop - start) / size <= max_points // 2 or size == self.levels[-1][0]:
+                first, last = start // size, -(-stop // size)
+                return np.arange(first, last) * size, mins[first:last], maxs[first:last]
+        rows = np.arange(start, stop)
+        values = self.values[start:stop]
+        return rows, values, values
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 多文件运行
+# 长时间的测量常按大小或日期轮转为多个连续的记录文件。按首行UTC时间排序组成一条虚拟时间线，
+# 查询时只加载与窗口有重叠的文件，内存中最多保留少量文件；每个文件的积分值重新开始，
+# 电荷量在各文件内分别插值后求和，不跨文件插值
+
+from collections import OrderedDict
+
+import numpy as np
+
+from record_core import load_record, query_window_charges
+from record_cache import load_record_cached
+from record_stream import read_record_end, read_record_start
+from record_archive import RecordArchive, is_archive, load_archive
+
+RUN_MAX_LOADED = 2                      # 内存中最多同时保留的文件数
+
+
+def _file_extent(file_path, last=False):
+    """文件首行（last 时为末行）的UTC时间戳，归档文件从元数据中读取"""
+    if is_archive(file_path):
+        sessions = RecordArchive(file_path).sessions
+        return sessions[-1].last_utc if last else sessions[0].first_utc
+    return read_record_end(file_path) if last else read_record_start(file_path)
+
+
+class RecordRun:
+    """多个记录文件组成的一次运行，按首行UTC时间排序
+
+    文件的时间范围取首行和末行的时间；末行时间在第一次需要时读取（非压缩文件只读文件末尾）。
+    各文件在查询中的贡献与把它们作为会话写入同一个文件时相同，时间范围互相重叠的文件（如重复的
+    文件）会被重复计入，可用 overlaps 检查。
+    """
+
+    def __init__(self, files, max_loaded=RUN_MAX_LOADED, current_dtype=np.float64, use_cache=True):
+        if not files:
+            raise ValueError("No record files given")
+        starts = [_file_extent(file_path) for file_path in files]
+        order = sorted(range(len(files)), key=lambda i: (starts[i], files[i]))
+        self.files = [files[i] for i in order]
+        self.first_utc = np.array([starts[i] for i in order], dtype=np.float64)
+        self._last_utc = [None] * len(files)
+        self.max_loaded = max(int(max_loaded), 1)
+        self.current_dtype = current_dtype
+        self.use_cache = use_cache
+        self.loaded = OrderedDict()     # 文件下标 -> RecordData，按最近使用排序
+        self.loads = 0                  # 累计加载文件的次数
+
+    def __len__(self):
+        return len(self.files)
+
+    def last_utc(self, index):
+        """文件末行的UTC时间戳（已加载时直接取自数据）"""
+        if self._last_utc[index] is None:
+            data = self.loaded.get(index)
+            self._last_utc[index] = (float(data['utc_timestamp'][-1]) if data is not None
+                                     else _file_extent(self.files[index], last=True))
+        return self._last_utc[index]
+
+    def extents(self):
+        """各文件的 (首行UTC, 末行UTC)"""
+        return [(float(first), self.last_utc(i)) for i, first in enumerate(self.first_utc)]
+
+    def overlaps(self):
+        """时间范围与前一个文件重叠的文件下标"""
+        return [i for i in range(1, len(self.files)) if self.first_utc[i] <= self.last_utc(i - 1)]
+
+    def load(self, index):
+        """加载文件数据，超过 max_loaded 时释放最久未使用的文件"""
+        data = self.loaded.get(index)
+        if data is not None:
+            self.loaded.move_to_end(index)
+            return data
+        # 先释放再加载，峰值内存不超过 max_loaded 个文件
+        while len(self.loaded) >= self.max_loaded:
+            self.loaded.popitem(last=False)
+        file_path = self.files[index]
+        if is_archive(file_path):
+            data = load_archive(file_path, self.current_dtype)
+        elif self.use_cache:
+            data = load_record_cached(file_path, current_dtype=self.current_dtype)
+        else:
+            data = load_record(file_path, current_dtype=self.current_dtype)
+        self.loaded[index] = data
+        self.loads += 1
+        self._last_utc[index] = float(data['utc_timestamp'][-1])
+        return data
+
+    def window_charges(self, start_utc, end_utc):
+        """计算一个或多个时间窗口内CH1/CH2的电荷量，返回 (ch1, ch2)
+
+        窗口与文件的时间范围没有重叠时该文件的贡献为0，不加载；按时间顺序逐个加载涉及的文件，
+        整个运行范围的查询也只需每个文件加载一次。
+        """
+        start_utc, end_utc = np.broadcast_arrays(np.asarray(start_utc, dtype=np.float64),
+                                                 np.asarray(end_utc, dtype=np.float64))
+        ch1_charge = np.zeros(start_utc.shape)
+        ch2_charge = np.zeros(start_utc.shape)
+        for index in range(len(self.files)):
+            # 首行时间晚于所有窗口结束时间的文件不必读取末行时间
+            inside = end_utc >= self.first_utc[index]
+            if not inside.any():
+                break
+            inside &= start_utc <= self.last_utc(index)
+            if not inside.any():
+                continue
+            ch1, ch2 = query_window_charges(self.load(index), start_utc[inside], end_utc[inside])
+            ch1_charge[inside] += ch1
+            ch2_charge[inside] += ch2
+        return ch1_charge[()], ch2_charge[()]
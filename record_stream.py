@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 流式电荷量计算
+# 不加载整个文件：逐块扫描，只保留窗口边界两侧的行和每个会话的首末行，内存占用与文件大小无关
+
+import os
+import numpy as np
+
+from record_core import (RecordData, RecordSession, RecordFileError, _ColumnBuilder, _iter_line_blocks,
+                         _parse_data_lines, _read_header, _stream_range, is_compressed, open_record,
+                         query_window_charges, segment_breaks)
+
+STREAM_CHUNK_SIZE = 1024 * 1024         # 流式扫描每次读取的字节数
+
+
+class _WindowScanner(_ColumnBuilder):
+    """逐块解析但不保存数据列，只保留插值需要的行
+
+    会话内按时间回退和积分重置再分为连续段（判断方法与 scan_integrity 相同）。对每个连续段和每个
+    目标时间保留第一个 UTC >= 目标时间的行及其前一行，另加每个连续段的首末行。在这些行组成的稀疏
+    数据上按段二分查找得到的插值区间与完整数据相同，结果逐位一致。
+    """
+
+    def __init__(self, names, header, byte_offset, target_utc):
+        super().__init__(names, header, byte_offset)
+        self.targets = np.unique(np.asarray(target_utc, dtype=np.float64))
+        self.next_target = 0        # 当前连续段中第一个尚未定位的目标
+        self.kept = []              # 保留的行（二维数组，按文件顺序）
+        self.kept_rows = 0
+        self.last_kept = -1         # 最后保留的行在文件中的行号
+        self.last = None            # 当前连续段已解析的最后一行
+        self.sessions = []          # 每个会话的 [稀疏数据起始行, 文件起始行]
+        self.segments = []          # 每个连续段在稀疏数据中的起始行
+
+    def _keep(self, values, rows):
+        """保留文件行号为 rows 的若干行（只保留尚未保留的）"""
+        fresh = rows > self.last_kept
+        if fresh.any():
+            self.kept.append(values[fresh].copy())
+            self.kept_rows += int(fresh.sum())
+            self.last_kept = int(rows[fresh][-1])
+
+    def _end_segment(self, row):
+        """连续段在文件行号 row 之前结束，保留其最后一行"""
+        if self.last is not None:
+            self._keep(self.last, np.array([row - 1]))
+            self.last = None
+
+    def _start_segment(self, values, row):
+        """从文件行号 row（values 的首行）开始新的连续段"""
+        self._end_segment(row)
+        self.segments.append(self.kept_rows)
+        self.next_target = 0
+        self._keep(values[:1], np.array([row]))
+
+    def _locate(self, values, base):
+        """定位落在本段数据内的目标时间，values 为同一连续段中文件行号从 base 开始的若干行"""
+        # 段内时间不减，不大于最后时间的目标都在这里找到区间右端
+        utc = values[:, 0]
+        stop = np.searchsorted(self.targets, utc[-1], side='right')
+        if stop > self.next_target:
+            right = np.searchsorted(utc, self.targets[self.next_target:stop], side='left')
+            local = np.unique(np.concatenate((right - 1, right)))
+            if local[0] < 0 and self.last is not None:
+                # 区间左端是上一块的最后一行
+                self._keep(self.last, np.array([base - 1]))
+            local = local[local >= 0]
+            self._keep(values[local], base + local)
+            self.next_target = stop
+        self.last = values[-1:].copy()
+
+    def _append(self, lines, block_size):
+        """解析数据行，按连续段定位落在本块内的目标时间"""
+        column_count = len(self.names)
+        values = _parse_data_lines(lines, column_count) if lines else np.empty((0, column_count))
+        count = len(values)
+        if count == 0:
+            return
+        base = self.rows
+        if len(self.boundaries) > len(self.sessions):
+            # 新会话：积分值重新开始，上一会话的最后一行属于上一会话
+            self._end_segment(base)
+            self.sessions.append([self.kept_rows, base])
+            self._start_segment(values, base)
+            previous = values[:0]
+        else:
+            previous = self.last
+
+        # 与同一会话中的上一行一起判断段边界
+        rows = np.concatenate((previous, values))
+        breaks = np.flatnonzero(segment_breaks({name: rows[:, i] for i, name in enumerate(self.names)}))
+        cuts = (breaks + 1 - len(previous)).tolist()
+        for first, stop in zip([0] + cuts, cuts + [count]):
+            if first == stop:
+                continue
+            if first in cuts:
+                self._start_segment(values[first:], base + first)
+            self._locate(values[first:stop], base + first)
+        self.rows += count
+
+    def to_scan(self, byte_end):
+        """结束扫描，返回 (稀疏数据, 文件中的会话列表)"""
+        self._end_segment(self.rows)
+        kept = np.vstack(self.kept)
+        data = {name: kept[:, i] for i, name in enumerate(self.names)}
+
+        utc = data['utc_timestamp']
+        sparse_sessions, sessions = [], []
+        bounds = self.sessions + [[self.kept_rows, self.rows]]
+        for i, ((start, row), (next_start, next_row)) in enumerate(zip(bounds, bounds[1:])):
+            byte_offset, started = self.boundaries[i][1], self.boundaries[i][2]
+            next_offset = self.boundaries[i + 1][1] if i + 1 < len(self.boundaries) else byte_end
+            first_utc, last_utc = float(utc[start]), float(utc[next_start - 1])
+            sparse_sessions.append(RecordSession(start, next_start - start, byte_offset, next_offset,
+                                                 first_utc, last_utc, started))
+            sessions.append(RecordSession(row, next_row - row, byte_offset, next_offset,
+                                          first_utc, last_utc, started))
+        segments = list(zip(self.segments, self.segments[1:] + [self.kept_rows]))
+        return RecordData(data, len(self.names) == 6, sparse_sessions, sparse=True, segments=segments), sessions
+
+
+def scan_record(file_path, target_utc, chunk_size=STREAM_CHUNK_SIZE, progress=None, byte_range=None):
+    """流式扫描记录文件，只保留在 target_utc 处插值所需的行
+
+    返回 (稀疏数据, 会话列表)：稀疏数据可直接用于 query_window_charges，结果与完整加载时相同；
+    会话列表中的行号和行数是文件中的实际值。byte_range 和 progress 与 load_record 相同，
+    压缩文件同样边读边解压。
+    """
+    file_size = os.path.getsize(file_path)
+    compressed = is_compressed(file_path)
+
+    with open_record(file_path) as (f, raw):
+        names, header = _read_header(f)
+        start, stop = _stream_range(f, file_size, compressed, byte_range)
+        total = file_size if compressed else max(stop - start, 0)
+        f.seek(start)
+
+        scanner = _WindowScanner(names, header, start, target_utc)
+        for offset, block in _iter_line_blocks(f, chunk_size, stop):
+            scanner.feed(offset, block)
+            if progress is not None:
+                progress(raw.tell() if compressed else offset + len(block) - start, total, scanner.rows)
+        if compressed:
+            stop = f.tell()
+
+    if scanner.content_lines < 2:
+        raise RecordFileError("Format Error", "File content is incomplete!")
+    if scanner.rows == 0:
+        raise ValueError("No valid data rows found in file")
+    return scanner.to_scan(stop)
+
+
+def stream_window_charges(file_path, start_utc, end_utc, chunk_size=STREAM_CHUNK_SIZE,
+                          progress=None, byte_range=None):
+    """不加载整个文件，计算一个或多个时间窗口内CH1/CH2的电荷量，返回 (ch1, ch2)"""
+    start_utc = np.asarray(start_utc, dtype=np.float64)
+    end_utc = np.asarray(end_utc, dtype=np.float64)
+    data, _ = scan_record(file_path, np.concatenate((start_utc.ravel(), end_utc.ravel())),
+                          chunk_size, progress, byte_range)
+    return query_window_charges(data, start_utc, end_utc)
+
+
+def read_record_start(file_path, chunk_size=64 * 1024):
+    """只读取到第一条数据行，返回其UTC时间戳（用于按运行时间指定的窗口）"""
+    file_size = os.path.getsize(file_path)
+    with open_record(file_path) as (f, _):
+        names, header = _read_header(f)
+        start, stop = _stream_range(f, file_size, is_compressed(file_path), None)
+        builder = _ColumnBuilder(names, header, start, chunk_size)
+        for offset, block in _iter_line_blocks(f, chunk_size, stop):
+            builder.feed(offset, block)
+            if builder.rows:
+                return float(builder.columns[0][0])
+    raise ValueError("No valid data rows found in file")
+
+
+def read_record_end(file_path, chunk_size=64 * 1024):
+    """只读取文件末尾，返回最后一条数据行的UTC时间戳；压缩文件无法从末尾读取，需流式扫描整个文件"""
+    if is_compressed(file_path):
+        _, sessions = scan_record(file_path, [])
+        return sessions[-1].last_utc
+    with open(file_path, 'rb') as f:
+        names, header = _read_header(f)
+        data_start = f.tell()
+        file_size = os.fstat(f.fileno()).st_size
+        size = chunk_size
+        while True:
+            # 从末尾向前读取，跳过开头可能不完整的行；没有数据行时读取范围加倍
+            start = max(file_size - size, data_start)
+            f.seek(start)
+            block = f.read(file_size - start)
+            if start > data_start:
+                cut = block.find(b'\n') + 1
+                start, block = start + cut, block[cut:]
+            builder = _ColumnBuilder(names, header, start, len(block))
+            builder.feed(start, block)
+            if builder.rows:
+                return float(builder.columns[0][builder.rows - 1])
+            if start <= data_start:
+                raise ValueError("No valid data rows found in file")
+            size *= 2
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# Current Record File Analyzer - 性能追踪
+# 记录一次操作（打开文件、计算电荷量等）中每个阶段的耗时、行数/字节数和内存分配峰值，
+# 生成状态栏用的简短摘要或追加写入JSON追踪文件；调试时可对单次操作启用 cProfile
+
+import json
+import time
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+
+def format_seconds(seconds):
+    """耗时的简短显示：1秒以下用毫秒"""
+    return f"{seconds * 1e3:.1f} ms" if seconds < 1 else f"{seconds:.2f} s"
+
+
+class OperationTrace:
+    """一次操作的阶段追踪
+
+    各阶段可以在不同线程中依次运行（如界面线程校验、工作线程加载）。memory=True 时用
+    tracemalloc 记录每个阶段的内存分配峰值，会明显拖慢逐行解析，只在需要时开启；
+    profile=True 时各阶段运行期间启用 cProfile，结束后用 dump_profile 保存。
+    """
+
+    def __init__(self, operation, memory=False, profile=False, **info):
+        self.operation = operation
+        self.info = info
+        self.stages = []
+        self.started = time.time()
+        self.elapsed = None
+        self.error = None
+        self.profile_path = None
+        self.profiler = cProfile.Profile() if profile else None
+        # 只停止由本追踪启动的 tracemalloc
+        self.memory = memory
+        self._own_tracemalloc = memory and not tracemalloc.is_tracing()
+        if self._own_tracemalloc:
+            tracemalloc.start()
+        self._clock = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, rows=0, size=0):
+        """记录一个阶段；返回的字典可在阶段内补充 rows、bytes 和各步骤耗时 parts"""
+        record = {'name': name, 'seconds': 0.0, 'rows': rows, 'bytes': size}
+        if self.memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        if self.profiler is not None:
+            self.profiler.enable()
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - started
+            if self.profiler is not None:
+                self.profiler.disable()
+            if self.memory:
+                record['peak_bytes'] = max(tracemalloc.get_traced_memory()[1] - baseline, 0)
+            self.stages.append(record)
+
+    def finish(self, error=None):
+        """结束追踪（重复调用无效）"""
+        if self.elapsed is not None:
+            return
+        self.elapsed = time.perf_counter() - self._clock
+        self.error = None if error is None else str(error)
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+
+    def dump_profile(self, path):
+        """保存 cProfile 统计（可用 pstats 或 snakeviz 查看）"""
+        self.profiler.dump_stats(path)
+        self.profile_path = path
+
+    def totals(self):
+        """(各阶段总耗时, 行数, 字节数, 内存峰值)：行数和字节数取各阶段的最大值"""
+        seconds = sum(stage['seconds'] for stage in self.stages)
+        rows = max((stage['rows'] for stage in self.stages), default=0)
+        size = max((stage['bytes'] for stage in self.stages), default=0)
+        peak = max((stage.get('peak_bytes', 0) for stage in self.stages), default=0)
+        return seconds, rows, size, peak
+
+    def summary(self):
+        """状态栏用的一行摘要"""
+        seconds, rows, size, peak = self.totals()
+        parts = ", ".join(f"{stage['name']} {format_seconds(stage['seconds'])}" for stage in self.stages)
+        text = f"{self.operation} {format_seconds(seconds)} ({parts})"
+        if rows:
+            text += f" - {rows:,} rows, {rows / max(seconds, 1e-12):,.0f} rows/s"
+        if size:
+            text += f", {size / 1e6 / max(seconds, 1e-12):.1f} MB/s"
+        if self.memory:
+            text += f", peak {peak / 1e6:.1f} MB"
+        if self.profile_path:
+            text += f" - profile: {self.profile_path}"
+        return text
+
+    def to_dict(self):
+        """完整的追踪记录（JSON可序列化）"""
+        seconds, rows, size, peak = self.totals()
+        stages = []
+        for stage in self.stages:
+            stage = dict(stage)
+            stage['rows_per_s'] = stage['rows'] / max(stage['seconds'], 1e-12)
+            stage['mb_per_s'] = stage['bytes'] / 1e6 / max(stage['seconds'], 1e-12)
+            stages.append(stage)
+        result = {'operation': self.operation,
+                  'started': datetime.fromtimestamp(self.started).isoformat(timespec='milliseconds'),
+                  'elapsed': self.elapsed, 'seconds': seconds, 'rows': rows, 'bytes': size,
+                  'rows_per_s': rows / max(seconds, 1e-12), 'mb_per_s': size / 1e6 / max(seconds, 1e-12)}
+        if self.memory:
+            result['peak_bytes'] = peak
+        result.update(self.info)
+        result['stages'] = stages
+        if self.error is not None:
+            result['error'] = self.error
+        if self.profile_path:
+            result['profile'] = self.profile_path
+        return result
+
+
+def append_trace(path, trace):
+    """将追踪记录作为一行JSON追加到文件（JSON Lines）"""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(trace.to_dict(), ensure_ascii=False) + "\n")